@@ -1,3 +1,4 @@
+import logging
 import os
 import sys
 from pathlib import Path
@@ -13,15 +14,19 @@ for p in (PROJECT_ROOT, CODE_ROOT):
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
 from code.api.routes import (
     data_router,
     metrics_router,
     microscopy_router,
     region_counts_router,
     scrna_router,
+    tiles_router,
+    zarr_router,
 )
+from code.api.services.zarr_store import ZarrStaticFiles
 from code.config import FRONTEND_URL, FRONTEND_PORT
+from code.database.connect import get_engine
+from code.database.hash_filter import known_hashes
 
 DATA_DIR = Path(__file__).resolve().parents[2] / "data"
 
@@ -44,7 +49,18 @@ app.add_middleware(
 # Serve data directory for OME-Zarr viewer access
 # Use html=False to prevent directory listing, but allow file access
 # check_dir=False allows serving files even if parent directories don't exist as files
-app.mount("/data", StaticFiles(directory=DATA_DIR, html=False, check_dir=False), name="data")
+# Stores skip all-fill-value chunks on write, so missing chunk keys are answered with a fill chunk
+# Viewers should prefer the cached /zarr/{version}/... route (zarr_router); this mount stays for plain files
+app.mount("/data", ZarrStaticFiles(directory=DATA_DIR, html=False, check_dir=False), name="data")
+
+
+@app.on_event("startup")
+def load_known_hashes():
+    """Warm the per-worker duplicate pre-check filter; if the DB is down it loads on first use."""
+    try:
+        known_hashes.load(get_engine())
+    except Exception as exc:  # startup must not fail on an unreachable database
+        logging.getLogger(__name__).warning("Known-hash filter not loaded: %s", exc)
 
 
 @app.get("/")
@@ -59,3 +75,5 @@ app.include_router(metrics_router)
 app.include_router(microscopy_router)
 app.include_router(region_counts_router)
 app.include_router(scrna_router)
+app.include_router(tiles_router)
+app.include_router(zarr_router)
@@ -15,6 +15,15 @@ class MicroscopyFile(BaseModel):
     sha256: Optional[str] = None
 
 
+class NearDuplicate(BaseModel):
+    file_id: int
+    session_id: str
+    run: Optional[int] = None
+    hemisphere: Optional[str] = None
+    path: str
+    distance: int
+
+
 class RegionCountSummary(BaseModel):
     subject_id: str
     region_id: int
@@ -28,6 +37,11 @@ class HashesPayload(BaseModel):
     hashes: List[str]
 
 
+class ChunkBatchRequest(BaseModel):
+    level: str = "0"
+    keys: List[str]
+
+
 class RegionLoadSummary(BaseModel):
     region: str
     hemisphere: str
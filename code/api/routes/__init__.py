@@ -6,6 +6,8 @@ from code.api.routes.metrics import router as metrics_router
 from code.api.routes.microscopy import router as microscopy_router
 from code.api.routes.region_counts import router as region_counts_router
 from code.api.routes.scrna import router as scrna_router
+from code.api.routes.tiles import router as tiles_router
+from code.api.routes.zarr import router as zarr_router
 
 __all__ = [
     "data_router",
@@ -13,4 +15,6 @@ __all__ = [
     "microscopy_router",
     "region_counts_router",
     "scrna_router",
+    "tiles_router",
+    "zarr_router",
 ]
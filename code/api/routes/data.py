@@ -8,6 +8,9 @@ from fastapi import APIRouter, Query
 from pydantic import BaseModel
 
 from code.api.dependencies import fetch_all
+from code.api.services.zarr_store import read_omero, url_version
+from code.common.paths import resolve_store_path
+from code.common.intensity import contrast_summary
 from code.config import DATA_DIR
 
 router = APIRouter(prefix="/api/v1", tags=["data"])
@@ -89,6 +92,7 @@ def list_microscopy_stacks():
             mf.run,
             mf.hemisphere,
             mf.path,
+            mf.sha256,
             subj.experiment_type
         FROM microscopy_files mf
         JOIN sessions s ON mf.session_id = s.session_id
@@ -146,6 +150,13 @@ def list_microscopy_stacks():
                 exp_type = row.get("experiment_type", "unknown")
                 exp_label = "Rabies" if exp_type == "rabies" else "Dual Injection"
                 name = f"{subject_id} ({exp_label})"
+                preview_base = f"/api/v1/microscopy-files/{row.get('file_id', 0)}/previews"
+                version = (row.get("sha256") or "").strip()[:16]
+                store = resolve_store_path(path_str)
+                data_url = url
+                if url.startswith("/data/"):
+                    # Cached chunk route; the version changes with the pixels or the store layout, so chunks can be immutable
+                    url = f"/zarr/{url_version(store)}/{url[len('/data/'):]}"
                 
                 stacks.append({
                     "id": f"{subject_id}_run{row.get('run', 0)}",
@@ -156,7 +167,13 @@ def list_microscopy_stacks():
                     "hemisphere": row.get("hemisphere"),
                     "name": name,
                     "url": url,
+                    "data_url": data_url,
                     "path": path_str,
+                    # Sprite sheet + index written at ingest; ?v= busts immutable caches on re-ingest
+                    "preview_url": f"{preview_base}/sprite.webp?v={version}",
+                    "preview_index_url": f"{preview_base}/index.json?v={version}",
+                    # Channel windows from the omero block so the first tile renders with correct contrast
+                    "contrast": contrast_summary(read_omero(store)),
                 })
             except Exception:
                 continue
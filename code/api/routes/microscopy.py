@@ -7,11 +7,20 @@ import tempfile
 import shutil
 from pathlib import Path
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Body, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, UploadFile, File, Form, Body, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from code.api.dependencies import get_engine, require_role
 from code.api.services import uploads as upload_service
-from code.api.models import MicroscopyFile, DuplicateCheckResponse, HashesPayload
+from code.api.services import projections, rendering, roi, zarr_store
+from code.api.models import MicroscopyFile, DuplicateCheckResponse, HashesPayload, NearDuplicate
 from code.api.utils import api_error
+from code.common.intensity import contrast_summary
+from code.common.paths import resolve_store_path
+from code.common.previews import INDEX_NAME, PREVIEW_DIR, SPRITE_NAME
+from code.common.phash import store_hashes
+from code.config import PHASH_MAX_DISTANCE, RENDER_MAX_SIZE, VIEWER_TILE_SIZE
+from code.database.near_duplicates import find_near_duplicates, stored_phash
 from code.database.etl.subject_map import SUBJECT_MAP
 
 
@@ -62,30 +71,37 @@ def _stage_images(files: List[UploadFile]):
 
 @router.post("/microscopy-files", status_code=201)
 async def create_microscopy_files(
+    background_tasks: BackgroundTasks,
     subject_id: Optional[str] = Form(None, description="Optional subject id; auto-assigned if omitted."),
     session_id: str = Form("auto", description="BIDS session id (e.g., ses-dbl or 'auto')"),
     hemisphere: str = Form("bilateral", regex="^(left|right|bilateral)$"),
     pixel_size_um: float = Form(1.0),
     experiment_type: str = Form("double_injection", regex="^(double_injection|rabies)$"),
     comments: Optional[str] = Form(None, description="Optional notes/comments for this upload"),
+    volume: bool = Form(False, description="Assemble all files (or multi-page TIFF pages) into one z-stack"),
+    z_spacing_um: Optional[float] = Form(None, description="Slice spacing in micrometers for volume uploads"),
     files: List[UploadFile] = File(...),
     _user = Depends(require_role("lab_user")),
 ):
     """
     Parameters:
+        background_tasks (BackgroundTasks): Injected by FastAPI; runs tile/projection warm-up after the response.
         subject_id (str | None): Optional BIDS subject id; auto-assigned when omitted.
         session_id (str): BIDS session label or "auto".
         hemisphere (str): Hemisphere label (left/right/bilateral).
         pixel_size_um (float): Pixel size in micrometers.
         experiment_type (str): Experiment type (double_injection|rabies).
         comments (str | None): Optional notes to persist on the session.
+        volume (bool): Ingest all files as one ordered z-stack instead of one run per file.
+        z_spacing_um (float | None): Slice spacing for volume uploads (defaults to pixel size).
         files (list[UploadFile]): Microscopy image uploads.
 
     Returns:
         dict: Upload status with subject_id, session_id, ingested files, and processed filenames.
 
     Does:
-        Stages uploads, runs duplicate checks, ingests microscopy files into OME-Zarr + DB, and cleans temp storage.
+        Stages uploads, runs duplicate checks, ingests microscopy files into OME-Zarr + DB, cleans temp storage,
+        and schedules overview tile and projection rendering once all bookkeeping has committed.
     """
     tmpdir, saved_paths = _stage_images(files)
     engine = get_engine()
@@ -115,7 +131,10 @@ async def create_microscopy_files(
             comments=comments,
             raw_batch_checksum=raw_batch_checksum,
             file_shas=file_shas,
+            volume=volume,
+            z_spacing_um=z_spacing_um,
         )
+        background_tasks.add_task(upload_service.warm_store_caches, [Path(p) for p in ingested["ingested"]])
         return ingested
     finally:
         shutil.rmtree(tmpdir, ignore_errors=True)
@@ -186,3 +205,219 @@ async def get_microscopy_file(file_id: int):
     if not row:
         raise HTTPException(status_code=404, detail="Microscopy file not found")
     return row
+
+
+@router.get("/microscopy-files/{file_id}/near-duplicates", status_code=200, response_model=List[NearDuplicate])
+async def get_microscopy_near_duplicates(file_id: int, max_distance: int = Query(PHASH_MAX_DISTANCE, ge=0, le=32)):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        max_distance (int): Hamming radius in bits between 64-bit perceptual hashes.
+
+    Returns:
+        list[NearDuplicate]: Other files whose pHash lies within the radius, nearest first.
+
+    Does:
+        Looks the file's perceptual hash up in the per-worker BK-tree (hashing the store on the fly for legacy rows).
+    """
+    engine = get_engine()
+    row = upload_service.get_microscopy_file(engine, file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    h = stored_phash(engine, file_id)
+    if h is None:
+        try:
+            h, _ = store_hashes(resolve_store_path(row["path"]))
+        except (KeyError, ValueError, OSError):
+            raise HTTPException(status_code=404, detail="No perceptual hash for this file")
+    return find_near_duplicates(engine, h, max_distance, exclude_file_id=file_id)
+
+
+@router.get("/microscopy-files/{file_id}/previews/{name}", status_code=200)
+async def get_microscopy_preview(file_id: int, name: str, request: Request):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        name (str): "sprite.webp" (packed per-slice thumbnails) or "index.json" (sprite layout).
+        request (Request): Incoming request, used for If-None-Match.
+
+    Returns:
+        Response: The preview file with immutable cache headers (ETag keyed by store digest), or 304.
+
+    Does:
+        Serves the thumbnails written at ingest so viewers can show previews in one request.
+    """
+    media_types = {SPRITE_NAME: "image/webp", INDEX_NAME: "application/json"}
+    if name not in media_types:
+        raise HTTPException(status_code=404, detail="Unknown preview file")
+    engine = get_engine()
+    row = upload_service.get_microscopy_file(engine, file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    path = resolve_store_path(row["path"]) / PREVIEW_DIR / name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="No previews for this file")
+    etag = f"{(row.get('sha256') or '').strip() or path.stat().st_mtime_ns}-{name}"
+    return zarr_store.cached_file_response(request, path, etag, media_types[name])
+
+
+@router.get("/microscopy-files/{file_id}/intensity-stats", status_code=200)
+async def get_microscopy_intensity_stats(file_id: int, histograms: bool = True):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        histograms (bool): Include per-channel/per-slice histograms; False returns only channel windows.
+
+    Returns:
+        dict: The store's omero block (or its compact channel windows when histograms is False).
+
+    Does:
+        Serves the intensity statistics precomputed at write time so viewers can set contrast before fetching tiles.
+    """
+    engine = get_engine()
+    row = upload_service.get_microscopy_file(engine, file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    omero = zarr_store.read_omero(resolve_store_path(row["path"]))
+    if not omero:
+        raise HTTPException(status_code=404, detail="No intensity statistics for this file")
+    return omero if histograms else contrast_summary(omero)
+
+
+@router.get("/microscopy/{file_id}/slice/{z}", status_code=200)
+def render_microscopy_slice(
+    file_id: int,
+    z: int,
+    request: Request,
+    level: Optional[int] = Query(None, ge=0),
+    x: int = Query(0, ge=0),
+    y: int = Query(0, ge=0),
+    w: Optional[int] = Query(None, ge=1),
+    h: Optional[int] = Query(None, ge=1),
+    size: int = Query(VIEWER_TILE_SIZE, ge=1, le=RENDER_MAX_SIZE),
+    fmt: str = Query("webp", regex="^(png|webp|jpeg)$"),
+):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        z (int): Slice index.
+        request (Request): Incoming request, used for If-None-Match.
+        level (int | None): Pyramid level; omitted picks the coarsest level adequate for `size`.
+        x, y, w, h (int): Region in full-resolution pixels; w/h default to the rest of the slice.
+        size (int): Longest edge of the output image.
+        fmt (str): png | webp | jpeg.
+
+    Returns:
+        Response: Encoded image with immutable cache headers (ETag keyed by store digest and parameters), or 304.
+
+    Does:
+        Renders a slice region server-side with the stored contrast limits, reusing the on-disk render cache.
+    """
+    engine = get_engine()
+    row = upload_service.get_microscopy_file(engine, file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    store = resolve_store_path(row["path"])
+    if not store.is_dir():
+        raise HTTPException(status_code=404, detail="Store not found on disk")
+    digest = (row.get("sha256") or "").strip() or str(zarr_store.store_version(store))
+    region = rendering.Region(x, y, w or 1 << 31, h or 1 << 31)
+    try:
+        path, key = rendering.render_slice(store, digest, z, region=region, level=level, size=size, fmt=fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return zarr_store.cached_file_response(request, path, key, rendering.FORMATS[fmt][1])
+
+
+@router.get("/microscopy/{file_id}/roi", status_code=200)
+def extract_microscopy_roi(
+    file_id: int,
+    z0: Optional[int] = Query(None, ge=0),
+    z1: Optional[int] = Query(None, ge=1),
+    y0: Optional[int] = Query(None, ge=0),
+    y1: Optional[int] = Query(None, ge=1),
+    x0: Optional[int] = Query(None, ge=0),
+    x1: Optional[int] = Query(None, ge=1),
+    level: int = Query(0, ge=0),
+    format: str = Query("npy", regex="^(npy|tiff|zarr\\.zip)$"),
+):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        z0, z1, y0, y1, x0, x1 (int | None): Half-open crop bounds in full-resolution pixels; omitted means the full extent.
+        level (int): Pyramid level to read (y/x bounds are scaled to it).
+        format (str): npy | tiff | zarr.zip.
+
+    Returns:
+        StreamingResponse: The encoded crop as an attachment.
+
+    Does:
+        Streams a subvolume read plane by plane from the intersecting chunks; at most ROI_MAX_CONCURRENT
+        extractions run at once (503 otherwise) and crops above ROI_MAX_BYTES are rejected (413).
+    """
+    row = upload_service.get_microscopy_file(get_engine(), file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    store = resolve_store_path(row["path"])
+    if not store.is_dir():
+        raise HTTPException(status_code=404, detail="Store not found on disk")
+    try:
+        crop = roi.resolve_roi(store, level, z=(z0, z1), y=(y0, y1), x=(x0, x1))
+    except roi.RoiTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    lease = roi.acquire_slot()
+    if lease is None:
+        raise HTTPException(status_code=503, detail="Too many ROI extractions in progress", headers={"Retry-After": "5"})
+    try:
+        media_type, suffix = roi.FORMATS[format]
+        filename = f"{store.name.split('.')[0]}_roi_l{level}{suffix}"
+        # The stream releases the slot when it ends; the background task covers a body that never starts
+        return StreamingResponse(
+            roi.stream_roi(crop, format, release=lease),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Roi-Shape": ",".join(map(str, crop.shape))},
+            background=BackgroundTask(lease.release),
+        )
+    except Exception:
+        lease.release()
+        raise
+
+
+@router.get("/microscopy/{file_id}/projection", status_code=200)
+def get_microscopy_projection(
+    file_id: int,
+    request: Request,
+    method: str = Query("max", regex="^(max|mean|sum)$"),
+    axis: str = Query("z", regex="^(z|y|x)$"),
+    level: Optional[int] = Query(None, ge=0),
+    fmt: str = Query("png", regex="^(png|npy)$"),
+):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        request (Request): Incoming request, used for If-None-Match.
+        method (str): max | mean | sum.
+        axis (str): Axis to project along (z, y or x).
+        level (int | None): Pyramid level; omitted picks the coarsest level covering PROJECTION_SIZE.
+        fmt (str): png (contrast-stretched) | npy (raw values).
+
+    Returns:
+        Response: The projection with immutable cache headers (ETag keyed by store digest and parameters), or 304.
+
+    Does:
+        Serves a whole-volume projection computed once with dask and cached on disk.
+    """
+    row = upload_service.get_microscopy_file(get_engine(), file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    store = resolve_store_path(row["path"])
+    if not store.is_dir():
+        raise HTTPException(status_code=404, detail="Store not found on disk")
+    digest = (row.get("sha256") or "").strip() or str(zarr_store.store_version(store))
+    try:
+        path, key = projections.get_projection(store, digest, method, axis, level, fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return zarr_store.cached_file_response(request, path, key, projections.FORMATS[fmt])
@@ -13,6 +13,7 @@ from code.api.dependencies import get_engine, resolve_session_id, require_role
 from code.common.hashing import file_sha256
 from code.api.utils import api_error
 from code.database.etl.subject_map import SUBJECT_MAP
+from code.database.hash_filter import known_hashes
 from code.api.services import uploads as upload_service
 from code.api.models import RegionCountSummary, DuplicateCheckResponse
 
@@ -115,6 +116,7 @@ async def create_region_counts(
                             ),
                             {"p": str(path), "c": chk, "r": rows, "s": "success", "m": f"upload {sess}"},
                         )
+                    known_hashes.add(chk)
             except ValueError as e:
                 raise api_error(400, "validation_error", str(e))
         return {"status": "ok", "rows_ingested": rows}
@@ -0,0 +1,106 @@
+"""
+Deep-zoom tile endpoints for off-the-shelf tiled viewers (OpenSeadragon via DZI, Leaflet-style
+clients via TileJSON). Tiles are fixed-size, rendered lazily and cached on disk.
+"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+from code.api.dependencies import get_engine
+from code.api.services import rendering, tiles, zarr_store
+from code.api.services import uploads as upload_service
+from code.common.paths import resolve_store_path
+from code.config import TILE_FORMAT
+
+router = APIRouter(prefix="/tiles", tags=["tiles"])
+
+
+def _store_for(file_id: int):
+    """(store path, digest) for a microscopy file, or 404."""
+    row = upload_service.get_microscopy_file(get_engine(), file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    store = resolve_store_path(row["path"])
+    if not store.is_dir():
+        raise HTTPException(status_code=404, detail="Store not found on disk")
+    return store, (row.get("sha256") or "").strip() or str(zarr_store.store_version(store))
+
+
+def _tile_response(request: Request, file_id: int, z: int, level: int, col: int, row: int, fmt: str):
+    if fmt not in rendering.FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown tile format")
+    store, digest = _store_for(file_id)
+    try:
+        path, key = tiles.render_tile(store, digest, z, level, col, row, fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return zarr_store.cached_file_response(request, path, key, rendering.FORMATS[fmt][1])
+
+
+@router.get("/{file_id}/{z}/{level}/{col}/{row}.{fmt}")
+def get_tile(file_id: int, z: int, level: int, col: int, row: int, fmt: str, request: Request):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        z (int): Slice index.
+        level (int): DZI level (0 is 1x1, the top level is full resolution).
+        col (int): Tile column.
+        row (int): Tile row.
+        fmt (str): png | webp | jpeg.
+        request (Request): Incoming request, used for If-None-Match.
+
+    Returns:
+        Response: Tile image with immutable cache headers, or 304.
+
+    Does:
+        Serves one deep-zoom tile, rendering it on first request.
+    """
+    return _tile_response(request, file_id, z, level, col, row, fmt)
+
+
+@router.get("/{file_id}/{z}_files/{level}/{col}_{row}.{fmt}")
+def get_dzi_tile(file_id: int, z: int, level: int, col: int, row: int, fmt: str, request: Request):
+    """Same tile under the path layout DZI clients derive from the descriptor URL."""
+    return _tile_response(request, file_id, z, level, col, row, fmt)
+
+
+@router.get("/{file_id}/{z}.dzi")
+def get_dzi(file_id: int, z: int):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        z (int): Slice index the descriptor's tiles belong to.
+
+    Returns:
+        Response: Deep Zoom Image XML descriptor.
+
+    Does:
+        Describes the slice's tile pyramid; tiles resolve to /tiles/{file_id}/{z}_files/....
+    """
+    store, _ = _store_for(file_id)
+    n_z, height, width = tiles.image_shape(store)
+    if not 0 <= z < n_z:
+        raise HTTPException(status_code=404, detail=f"z must be in [0, {n_z - 1}]")
+    return Response(content=tiles.dzi_descriptor(height, width), media_type="application/xml")
+
+
+@router.get("/{file_id}/{z}/tilejson.json")
+def get_tilejson(file_id: int, z: int, request: Request):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        z (int): Slice index.
+        request (Request): Incoming request (used to build absolute tile URLs).
+
+    Returns:
+        dict: TileJSON 3.0 document with a {z}/{x}/{y} tile template for the slice.
+
+    Does:
+        Describes the slice's tile pyramid for XYZ tile clients.
+    """
+    store, _ = _store_for(file_id)
+    n_z, height, width = tiles.image_shape(store)
+    if not 0 <= z < n_z:
+        raise HTTPException(status_code=404, detail=f"z must be in [0, {n_z - 1}]")
+    base = str(request.base_url).rstrip("/")
+    template = f"{base}/tiles/{file_id}/{z}/{{z}}/{{x}}/{{y}}.{TILE_FORMAT}"
+    return tiles.tilejson_descriptor(height, width, template)
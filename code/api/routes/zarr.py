@@ -0,0 +1,97 @@
+"""
+Zarr chunk route: serves chunks and metadata documents of OME-Zarr stores under DATA_DIR from an
+in-memory LRU with immutable caching. URLs carry a version segment (digest + metadata hash, see
+zarr_store.url_version) so a re-ingested or re-converted store gets new URLs:
+/zarr/{version}/{path inside DATA_DIR}. Only the store's current version is served as immutable;
+"_" and stale or unknown versions are cached only briefly.
+"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+from code.api.dependencies import get_engine
+from code.api.models import ChunkBatchRequest
+from code.api.services import uploads as upload_service
+from code.api.services import zarr_store
+from code.common.paths import resolve_store_path
+from code.config import DATA_DIR, ZARR_BATCH_MAX_KEYS, ZARR_CACHE_SECONDS, ZARR_UNVERSIONED_CACHE_SECONDS
+
+router = APIRouter(tags=["zarr"])
+chunk_cache = zarr_store.ChunkCache()
+
+
+@router.api_route("/zarr/{version}/{path:path}", methods=["GET", "HEAD"])
+def get_zarr_file(version: str, path: str, request: Request):
+    """
+    Parameters:
+        version (str): Store version token from /microscopy-stacks; immutable caching only when it matches the store.
+        path (str): Path of a chunk or metadata document inside a *.zarr store, relative to DATA_DIR.
+        request (Request): Incoming request (If-None-Match, Range, HEAD).
+
+    Returns:
+        Response: Chunk/metadata bytes (200/206/304/416); missing chunk keys return the encoded fill-value chunk.
+
+    Does:
+        Serves store files from the shared chunk cache, reading from disk only on a miss.
+    """
+    located = zarr_store.find_store(DATA_DIR, path)
+    if not located:
+        raise HTTPException(status_code=404, detail="Not a Zarr store path")
+    store, key = located
+    entry = chunk_cache.fetch(store, key)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    body, etag = entry
+    is_metadata = key.rsplit("/", 1)[-1] in zarr_store.METADATA_KEYS
+    media_type = "application/json" if is_metadata else "application/octet-stream"
+    current = chunk_cache.url_version(store)
+    if version == zarr_store.UNVERSIONED or version != current:
+        # Stale or made-up tokens still get the current bytes, but never an immutable copy
+        return zarr_store.bytes_response(request, body, etag, media_type=media_type,
+                                         max_age=ZARR_UNVERSIONED_CACHE_SECONDS, immutable=False)
+    return zarr_store.bytes_response(request, body, etag, media_type=media_type, max_age=ZARR_CACHE_SECONDS)
+
+
+@router.post("/api/v1/zarr/{file_id}/chunks", status_code=200)
+def get_zarr_chunk_batch(file_id: int, payload: ChunkBatchRequest):
+    """
+    Parameters:
+        file_id (int): Microscopy file primary key.
+        payload (ChunkBatchRequest): Pyramid level path and the chunk keys wanted from it.
+
+    Returns:
+        Response: Length-prefixed frames (see zarr_store.pack_chunks) in request order; missing keys have length -1.
+
+    Does:
+        Replaces a viewport's worth of chunk GETs with one request, reading the chunks concurrently via the chunk cache.
+    """
+    if not payload.keys:
+        raise HTTPException(status_code=400, detail="No chunk keys requested")
+    if len(payload.keys) > ZARR_BATCH_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"At most {ZARR_BATCH_MAX_KEYS} keys per request")
+    bad = [k for k in payload.keys if not zarr_store.CHUNK_KEY_RE.match(k)]
+    if bad or not zarr_store.CHUNK_KEY_RE.match(payload.level):
+        raise HTTPException(status_code=400, detail=f"Invalid level or chunk keys: {bad[:5]}")
+    row = upload_service.get_microscopy_file(get_engine(), file_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Microscopy file not found")
+    store = resolve_store_path(row["path"])
+    if chunk_cache.fetch(store, f"{payload.level}/.zarray") is None:
+        raise HTTPException(status_code=404, detail=f"Level {payload.level} not found")
+    bodies = zarr_store.fetch_chunks(chunk_cache, store, payload.level, payload.keys)
+    return Response(
+        content=zarr_store.pack_chunks(payload.keys, bodies),
+        media_type=zarr_store.CHUNK_BATCH_MEDIA_TYPE,
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+@router.get("/api/v1/zarr-cache/stats", status_code=200)
+def zarr_cache_stats():
+    """
+    Returns:
+        dict: Cache occupancy and per-store hit/miss counters (stores keyed by path relative to DATA_DIR).
+
+    Does:
+        Exposes chunk cache effectiveness for tuning ZARR_CACHE_MAX_BYTES.
+    """
+    return chunk_cache.stats(DATA_DIR.resolve())
@@ -0,0 +1,87 @@
+"""
+Size-bounded on-disk LRU for rendered artifacts (slice images, tiles, projections).
+Recency is the file mtime, refreshed on every hit; eviction removes the oldest files once the
+directory grows past its byte budget.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+def cache_key(*parts) -> str:
+    """Stable hex key for a tuple of parameters (store digest first by convention)."""
+    return hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+class DiskLRU:
+    """
+    Files live at <directory>/<key[:2]>/<key><suffix>. Writes are atomic (temp file + rename), so
+    concurrent readers never see partial files; the byte total is tracked in memory and rebuilt
+    from a directory scan on first use.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, low_water: float = 0.9):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str, suffix: str = "") -> Path:
+        return self.directory / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str, suffix: str = "") -> Optional[Path]:
+        """Path of a cached file (marking it recently used), or None."""
+        path = self.path_for(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, data: bytes, suffix: str = "") -> Path:
+        """Store data under key, evicting least recently used files past max_bytes."""
+        path = self.path_for(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_bytes()
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _files(self):
+        return [p for p in self.directory.glob("*/*") if p.is_file() and p.suffix != ".tmp"]
+
+    def _scan_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self._files())
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.low_water
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except FileNotFoundError:
+                continue
+        self._bytes = total
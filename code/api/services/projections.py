@@ -0,0 +1,128 @@
+"""
+Max / mean / sum projections of stored volumes along z, y or x. Computed chunk-parallel with
+dask at one pyramid level and cached on disk (raw .npy and rendered PNG) keyed by store digest.
+"""
+import io
+from pathlib import Path
+from typing import Optional, Tuple
+
+import dask.array as da
+import numpy as np
+import zarr
+
+from code.api.services import rendering
+from code.api.services.disk_cache import cache_key
+from code.common.omezarr import read_multiscales
+from code.config import PROJECTION_PRECOMPUTE, PROJECTION_SIZE
+
+METHODS = ("max", "mean", "sum")
+AXES = ("z", "y", "x")
+FORMATS = {"png": "image/png", "npy": "application/octet-stream"}
+
+
+def compute_projection(store: Path, method: str, axis: str, level: Optional[int] = None) -> Tuple[np.ndarray, str, int]:
+    """
+    Parameters:
+        store (Path): OME-Zarr store directory.
+        method (str): "max", "mean" or "sum".
+        axis (str): "z", "y" or "x".
+        level (int | None): Pyramid level; None picks the coarsest level covering PROJECTION_SIZE.
+
+    Returns:
+        tuple[np.ndarray, str, int]: (projection, remaining axes such as "cyx", level used).
+
+    Raises:
+        ValueError: For unknown methods/axes, an axis the store lacks, or a bad level.
+
+    Does:
+        Reduces the level chunk by chunk with dask; mean is float32 and sum is widened to avoid overflow.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}'. Use one of {METHODS}.")
+    if axis not in AXES:
+        raise ValueError(f"Unknown axis '{axis}'. Use one of {AXES}.")
+    group = zarr.open_group(str(store), mode="r")
+    axes, paths = read_multiscales(group)
+    if axis not in axes:
+        raise ValueError(f"Store has no '{axis}' axis (axes: {axes})")
+    shapes = [tuple(group[p].shape[-2:]) for p in paths]
+    if level is None:
+        level = rendering.choose_level(shapes, rendering.Region(0, 0, shapes[0][1], shapes[0][0]), PROJECTION_SIZE)
+    elif not 0 <= level < len(paths):
+        raise ValueError(f"level must be in [0, {len(paths) - 1}]")
+
+    data = da.from_zarr(group[paths[level]])
+    # Drop any leading axes other than c/z/y/x (e.g. t) by taking their first index
+    keep = [i for i, ax in enumerate(axes) if ax in "czyx"]
+    data = data[tuple(slice(None) if i in keep else 0 for i in range(data.ndim))]
+    axes = "".join(axes[i] for i in keep)
+    ax_idx = axes.index(axis)
+    if method == "max":
+        result = data.max(axis=ax_idx)
+    elif method == "mean":
+        result = data.mean(axis=ax_idx, dtype=np.float64).astype(np.float32)
+    else:
+        wide = np.float64 if np.issubdtype(data.dtype, np.floating) else np.uint64
+        result = data.sum(axis=ax_idx, dtype=wide)
+    return result.compute(), axes.replace(axis, ""), level
+
+
+def render_png(projection: np.ndarray, axes: str) -> bytes:
+    """Contrast-stretched PNG of a projection (percentile windows; stored limits do not apply to sums/means)."""
+    block = projection if "c" in axes else projection[np.newaxis]
+    image = rendering.colorize(block, [])
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def get_projection(store: Path, digest: str, method: str = "max", axis: str = "z", level: Optional[int] = None, fmt: str = "png") -> Tuple[Path, str]:
+    """
+    Parameters:
+        store (Path): OME-Zarr store directory.
+        digest (str): Store content digest (cache namespace).
+        method (str): "max", "mean" or "sum".
+        axis (str): "z", "y" or "x".
+        level (int | None): Pyramid level; None picks the default projection level.
+        fmt (str): "png" (rendered) or "npy" (raw values).
+
+    Returns:
+        tuple[Path, str]: (cached file path, cache key usable as an ETag).
+
+    Does:
+        Serves from the on-disk cache, computing the projection once per (digest, method, axis, level) for both formats.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Use one of {tuple(FORMATS)}.")
+    cache = rendering.render_cache
+    # Requests without a level share the entry of the level it resolves to
+    key_level = "auto" if level is None else level
+    key = cache_key(digest, "projection", method, axis, key_level, fmt)
+    cached = cache.get(key, f".{fmt}")
+    if cached is not None:
+        return cached, key
+    raw_key = cache_key(digest, "projection", method, axis, key_level, "npy")
+    raw_path = cache.get(raw_key, ".npy")
+    if raw_path is not None:
+        projection = np.load(raw_path)
+    else:
+        projection, _, _ = compute_projection(store, method, axis, level)
+        buf = io.BytesIO()
+        np.save(buf, projection)
+        raw_path = cache.put(raw_key, buf.getvalue(), ".npy")
+    if fmt == "npy":
+        return raw_path, raw_key
+    # Projections keep the channel axis first when the store has one
+    return cache.put(key, render_png(projection, "cyx" if projection.ndim == 3 else "yx"), ".png"), key
+
+
+def precompute_projections(store: Path, digest: str) -> int:
+    """Render PROJECTION_PRECOMPUTE (method, axis) pairs the store supports; returns how many were cached."""
+    group = zarr.open_group(str(store), mode="r")
+    axes, _ = read_multiscales(group)
+    done = 0
+    for method, axis in PROJECTION_PRECOMPUTE:
+        if axis in axes:
+            get_projection(store, digest, method, axis)
+            done += 1
+    return done
@@ -0,0 +1,231 @@
+"""
+Server-side rendering of OME-Zarr slices to PNG/WebP/JPEG for clients that cannot decode chunks.
+Reads only the chunks overlapping the requested region at the coarsest adequate pyramid level,
+applies the stored contrast limits, and caches encoded images on disk.
+"""
+import io
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import zarr
+from PIL import Image
+
+from code.api.services.disk_cache import DiskLRU, cache_key
+from code.common.omezarr import read_multiscales
+from code.common.previews import to_uint8
+from code.config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, RENDER_MAX_SIZE, RENDER_QUALITY
+
+FORMATS = {"png": ("PNG", "image/png"), "webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+
+render_cache = DiskLRU(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES)
+
+
+@dataclass(frozen=True)
+class Region:
+    """Rectangle in full-resolution (level 0) pixel coordinates."""
+
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+def clip_region(region: Region, height: int, width: int) -> Region:
+    """
+    Parameters:
+        region (Region): Requested rectangle (level 0 pixels).
+        height (int): Level 0 image height.
+        width (int): Level 0 image width.
+
+    Returns:
+        Region: The rectangle clipped to the image.
+
+    Raises:
+        ValueError: When nothing of the rectangle lies inside the image.
+    """
+    x0, y0 = max(region.x, 0), max(region.y, 0)
+    x1, y1 = min(region.x + region.w, width), min(region.y + region.h, height)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError("Requested region lies outside the image")
+    return Region(x0, y0, x1 - x0, y1 - y0)
+
+
+def choose_level(level_shapes: Sequence[Tuple[int, int]], region: Region, size: int) -> int:
+    """
+    Parameters:
+        level_shapes (list[tuple[int, int]]): (height, width) of each pyramid level, full resolution first.
+        region (Region): Requested rectangle in level 0 pixels.
+        size (int): Longest edge of the output image.
+
+    Returns:
+        int: Coarsest level whose copy of the region still has at least `size` pixels on its long edge.
+    """
+    base_h, base_w = level_shapes[0]
+    needed = min(size, max(region.w, region.h))
+    chosen = 0
+    for i, (h, w) in enumerate(level_shapes):
+        factor = max(base_h / h, base_w / w)
+        if max(region.w, region.h) / factor < needed:
+            break
+        chosen = i
+    return chosen
+
+
+def level_for_downsample(level_shapes: Sequence[Tuple[int, int]], downsample: float) -> int:
+    """
+    Parameters:
+        level_shapes (list[tuple[int, int]]): (height, width) of each pyramid level, full resolution first.
+        downsample (float): Output pixels per level 0 pixel, inverted (2 means half resolution).
+
+    Returns:
+        int: Coarsest level that is not coarser than the requested downsampling.
+    """
+    base_h, base_w = level_shapes[0]
+    chosen = 0
+    for i, (h, w) in enumerate(level_shapes):
+        if max(base_h / h, base_w / w) > downsample * (1 + 1e-6):
+            break
+        chosen = i
+    return chosen
+
+
+def read_region(arr: zarr.Array, axes: str, z: int, region: Region, factor: float) -> np.ndarray:
+    """
+    Parameters:
+        arr (zarr.Array): One pyramid level.
+        axes (str): Axis names such as "czyx".
+        z (int): Slice index (ignored without a z axis).
+        region (Region): Rectangle in level 0 pixels.
+        factor (float): Downsampling factor of this level relative to level 0.
+
+    Returns:
+        np.ndarray: (c, h, w) block; zarr decodes only the chunks the selection overlaps.
+    """
+    y0, x0 = int(region.y // factor), int(region.x // factor)
+    y1 = max(y0 + 1, min(arr.shape[-2], int(np.ceil((region.y + region.h) / factor))))
+    x1 = max(x0 + 1, min(arr.shape[-1], int(np.ceil((region.x + region.w) / factor))))
+    sel = []
+    for ax in axes[:-2]:
+        if ax == "z":
+            sel.append(z)
+        elif ax == "c":
+            sel.append(slice(None))
+        else:
+            sel.append(0)
+    block = np.asarray(arr[tuple(sel) + (slice(y0, y1), slice(x0, x1))])
+    return block if "c" in axes else block[np.newaxis]
+
+
+def colorize(block: np.ndarray, channels: List[dict]) -> Image.Image:
+    """
+    Parameters:
+        block (np.ndarray): (c, h, w) pixel data.
+        channels (list[dict]): omero channel entries (window start/end, hex color); may be empty.
+
+    Returns:
+        Image.Image: "L" for one channel, "RGB" for three (as stored) or a color composite otherwise.
+
+    Does:
+        Applies each channel's contrast window; without stored windows falls back to 0.1/99.9 percentiles.
+    """
+    scaled = []
+    for c in range(block.shape[0]):
+        window = channels[c].get("window", {}) if c < len(channels) else {}
+        if "start" in window and "end" in window:
+            lo, hi = window["start"], window["end"]
+        else:
+            lo, hi = (float(v) for v in np.percentile(block[c], [0.1, 99.9]))
+        scaled.append(to_uint8(block[c], lo, hi))
+    if len(scaled) == 1:
+        return Image.fromarray(scaled[0], mode="L")
+    if len(scaled) == 3:
+        return Image.fromarray(np.stack(scaled, axis=-1), mode="RGB")
+    rgb = np.zeros(scaled[0].shape + (3,), dtype=np.float32)
+    for c, plane in enumerate(scaled):
+        color = (channels[c].get("color") if c < len(channels) else None) or "FFFFFF"
+        weights = np.array([int(color[i:i + 2], 16) / 255.0 for i in (0, 2, 4)], dtype=np.float32)
+        rgb += plane[..., np.newaxis].astype(np.float32) * weights
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), mode="RGB")
+
+
+def render_slice(
+    store: Path,
+    digest: str,
+    z: int,
+    region: Optional[Region] = None,
+    level: Optional[int] = None,
+    size: int = 512,
+    fmt: str = "webp",
+    quality: int = RENDER_QUALITY,
+    downsample: Optional[float] = None,
+) -> Tuple[Path, str]:
+    """
+    Parameters:
+        store (Path): OME-Zarr store directory.
+        digest (str): Store content digest (cache namespace; changes when the store is re-ingested).
+        z (int): Slice index.
+        region (Region | None): Rectangle in level 0 pixels; defaults to the whole slice.
+        level (int | None): Pyramid level to read; None picks the coarsest level adequate for `size`.
+        size (int): Longest edge of the output image.
+        fmt (str): "png", "webp" or "jpeg".
+        quality (int): Lossy encoder quality.
+        downsample (float | None): Fixed output scale (region pixels / downsample) instead of `size`; used for tiles.
+
+    Returns:
+        tuple[Path, str]: (cached image path, cache key usable as an ETag).
+
+    Raises:
+        ValueError: For unknown formats, out-of-range z/level, a region outside the image, or an explicit
+            level at which the region exceeds RENDER_MAX_SIZE pixels per side.
+
+    Does:
+        Renders (or reuses from the on-disk LRU) one slice region with the stored contrast limits.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Use one of {tuple(FORMATS)}.")
+    group = zarr.open_group(str(store), mode="r")
+    axes, paths = read_multiscales(group)
+    arrays = [group[p] for p in paths]
+    shapes = [tuple(a.shape[-2:]) for a in arrays]
+    n_z = arrays[0].shape[axes.index("z")] if "z" in axes else 1
+    if not 0 <= z < n_z:
+        raise ValueError(f"z must be in [0, {n_z - 1}]")
+    region = clip_region(region or Region(0, 0, shapes[0][1], shapes[0][0]), *shapes[0])
+    if downsample is not None:
+        out_size = (max(1, int(np.ceil(region.w / downsample))), max(1, int(np.ceil(region.h / downsample))))
+    if level is None:
+        level = level_for_downsample(shapes, downsample) if downsample is not None else choose_level(shapes, region, size)
+    elif not 0 <= level < len(arrays):
+        raise ValueError(f"level must be in [0, {len(arrays) - 1}]")
+    else:
+        # `size` only shrinks the output; cap what an explicit level reads into memory
+        factor = max(shapes[0][0] / shapes[level][0], shapes[0][1] / shapes[level][1])
+        read_w, read_h = int(np.ceil(region.w / factor)), int(np.ceil(region.h / factor))
+        if max(read_w, read_h) > RENDER_MAX_SIZE:
+            raise ValueError(
+                f"Region is {read_w}x{read_h} pixels at level {level}; at most {RENDER_MAX_SIZE} per side. "
+                "Request a coarser level or a smaller region."
+            )
+
+    key = cache_key(digest, z, level, region.x, region.y, region.w, region.h, size, fmt, quality, downsample)
+    suffix = f".{fmt}"
+    cached = render_cache.get(key, suffix)
+    if cached is not None:
+        return cached, key
+
+    factor = max(shapes[0][0] / shapes[level][0], shapes[0][1] / shapes[level][1])
+    block = read_region(arrays[level], axes, z, region, factor)
+    image = colorize(block, (group.attrs.get("omero") or {}).get("channels") or [])
+    if downsample is not None:
+        if image.size != out_size:
+            image = image.resize(out_size, Image.BILINEAR)
+    else:
+        scale = min(1.0, size / max(image.size))
+        if scale < 1.0:
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BILINEAR)
+    buf = io.BytesIO()
+    pil_format = FORMATS[fmt][0]
+    image.save(buf, format=pil_format, **({} if pil_format == "PNG" else {"quality": quality}))
+    return render_cache.put(key, buf.getvalue(), suffix), key
@@ -0,0 +1,193 @@
+"""
+Region-of-interest extraction from OME-Zarr stores as .npy, multi-page TIFF or zipped Zarr.
+Crops are read one (y, x) plane at a time so memory stays bounded by a single plane, and encoded
+output is streamed; a semaphore caps how many extractions run at once, and each extraction holds
+its slot through a SlotLease that every exit path may release.
+"""
+import io
+import itertools
+import json
+import tempfile
+import threading
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import tifffile
+import zarr
+from numpy.lib import format as npy_format
+
+from code.common.omezarr import read_multiscales
+from code.config import ROI_MAX_BYTES, ROI_MAX_CONCURRENT
+
+FORMATS = {
+    "npy": ("application/octet-stream", ".npy"),
+    "tiff": ("image/tiff", ".tif"),
+    "zarr.zip": ("application/zip", ".zarr.zip"),
+}
+STREAM_BLOCK = 1024 * 1024
+
+extraction_slots = threading.BoundedSemaphore(ROI_MAX_CONCURRENT)
+
+
+class RoiTooLarge(ValueError):
+    """Requested crop exceeds ROI_MAX_BYTES."""
+
+
+class SlotLease:
+    """One acquired extraction slot; release() is idempotent, so the stream and the response may both call it."""
+
+    def __init__(self, slots: threading.Semaphore):
+        self._slots = slots
+        self._held = True
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        self._slots.release()
+
+
+def acquire_slot(slots: Optional[threading.Semaphore] = None) -> Optional[SlotLease]:
+    """A lease on a free extraction slot (default: extraction_slots), or None when all are busy."""
+    slots = extraction_slots if slots is None else slots
+    return SlotLease(slots) if slots.acquire(blocking=False) else None
+
+
+@dataclass(frozen=True)
+class Roi:
+    """Crop of one pyramid level: per-axis half-open bounds in that level's pixels."""
+
+    array: zarr.Array
+    axes: str
+    bounds: Tuple[Tuple[int, int], ...]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(hi - lo for lo, hi in self.bounds)
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape, dtype=np.int64)) * self.array.dtype.itemsize
+
+    def planes(self) -> Iterator[np.ndarray]:
+        """(y, x) crops in C order of the leading axes; zarr decodes only intersecting chunks."""
+        lead, (ys, xs) = self.bounds[:-2], self.bounds[-2:]
+        for idx in itertools.product(*(range(lo, hi) for lo, hi in lead)):
+            yield np.asarray(self.array[idx + (slice(*ys), slice(*xs))])
+
+
+def resolve_roi(
+    store: Path,
+    level: int = 0,
+    z: Optional[Tuple[Optional[int], Optional[int]]] = None,
+    y: Optional[Tuple[Optional[int], Optional[int]]] = None,
+    x: Optional[Tuple[Optional[int], Optional[int]]] = None,
+) -> Roi:
+    """
+    Parameters:
+        store (Path): OME-Zarr store directory.
+        level (int): Pyramid level to crop from.
+        z, y, x (tuple | None): (start, stop) in full-resolution pixels; None or None ends mean the full extent.
+
+    Returns:
+        Roi: Crop bounds mapped onto the level (y/x scaled by the level's downsampling; channels kept whole).
+
+    Raises:
+        ValueError: For an unknown level or an empty crop.
+        RoiTooLarge: When the crop would exceed ROI_MAX_BYTES.
+    """
+    group = zarr.open_group(str(store), mode="r")
+    axes, paths = read_multiscales(group)
+    if not 0 <= level < len(paths):
+        raise ValueError(f"level must be in [0, {len(paths) - 1}]")
+    base, arr = group[paths[0]], group[paths[level]]
+    requested = {"z": z, "y": y, "x": x}
+    bounds = []
+    for i, ax in enumerate(axes):
+        n = arr.shape[i]
+        factor = base.shape[i] / n if ax in "yx" else 1
+        lo, hi = requested.get(ax) or (None, None)
+        lo = 0 if lo is None else int(lo // factor)
+        hi = n if hi is None else int(np.ceil(hi / factor))
+        lo, hi = max(lo, 0), min(hi, n)
+        if hi <= lo:
+            raise ValueError(f"Empty {ax} range")
+        bounds.append((lo, hi))
+    roi = Roi(arr, axes, tuple(bounds))
+    if roi.nbytes > ROI_MAX_BYTES:
+        raise RoiTooLarge(f"Crop is {roi.nbytes} bytes; limit is {ROI_MAX_BYTES}")
+    return roi
+
+
+def _stream_file(path: Path) -> Iterator[bytes]:
+    with open(path, "rb") as fh:
+        while block := fh.read(STREAM_BLOCK):
+            yield block
+
+
+def iter_npy(roi: Roi) -> Iterator[bytes]:
+    """Stream a .npy file: header for the full crop shape, then planes in C order."""
+    header = {"descr": npy_format.dtype_to_descr(roi.array.dtype), "fortran_order": False, "shape": roi.shape}
+    buf = io.BytesIO()
+    npy_format.write_array_header_2_0(buf, header)
+    yield buf.getvalue()
+    for plane in roi.planes():
+        yield np.ascontiguousarray(plane).tobytes()
+
+
+def iter_tiff(roi: Roi) -> Iterator[bytes]:
+    """Stream a BigTIFF with one page per plane (the writer needs a seekable temp file)."""
+    description = json.dumps({"axes": roi.axes, "shape": list(roi.shape)})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "roi.tif"
+        with tifffile.TiffWriter(path, bigtiff=True) as tw:
+            for i, plane in enumerate(roi.planes()):
+                tw.write(plane, contiguous=True, metadata=None, description=description if i == 0 else None)
+        yield from _stream_file(path)
+
+
+def iter_zarr_zip(roi: Roi) -> Iterator[bytes]:
+    """
+    Stream a zipped Zarr array of the crop, chunked like the source level. Planes are written to a
+    temporary directory store first (a ZipStore cannot rewrite a chunk shared by several planes).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "roi.zarr"
+        chunks = tuple(min(c, s) for c, s in zip(roi.array.chunks, roi.shape))
+        out = zarr.open_array(str(src), mode="w", shape=roi.shape, chunks=chunks, dtype=roi.array.dtype,
+                              compressor=roi.array.compressor, fill_value=roi.array.fill_value)
+        out.attrs["axes"] = roi.axes
+        out.attrs["source_bounds"] = [list(b) for b in roi.bounds]
+        for idx, plane in zip(itertools.product(*(range(n) for n in roi.shape[:-2])), roi.planes()):
+            out[idx] = plane
+        path = Path(tmp) / "roi.zarr.zip"
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for item in sorted(src.rglob("*")):
+                if item.is_file():
+                    zf.write(item, item.relative_to(src).as_posix())
+        yield from _stream_file(path)
+
+
+ENCODERS = {"npy": iter_npy, "tiff": iter_tiff, "zarr.zip": iter_zarr_zip}
+
+
+def stream_roi(roi: Roi, fmt: str, release: Optional[SlotLease] = None) -> Iterator[bytes]:
+    """
+    Parameters:
+        roi (Roi): Crop to encode.
+        fmt (str): "npy", "tiff" or "zarr.zip".
+        release (SlotLease | None): Extraction slot released once streaming ends (or fails).
+
+    Returns:
+        Iterator[bytes]: Encoded output blocks.
+    """
+    try:
+        yield from ENCODERS[fmt](roi)
+    finally:
+        if release is not None:
+            release.release()
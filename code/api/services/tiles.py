@@ -0,0 +1,139 @@
+"""
+Deep-zoom tile pyramid over the multiscale arrays. Tile levels follow the DZI convention
+(level 0 is 1x1, the top level is full resolution, each level halves the one above); tiles are
+rendered lazily through the slice renderer and share its on-disk cache.
+"""
+import math
+from pathlib import Path
+from typing import Dict, Tuple
+
+import zarr
+
+from code.api.services import rendering
+from code.common.omezarr import read_multiscales
+from code.config import TILE_FORMAT, TILE_PREGENERATE_LEVELS, TILE_SIZE
+
+
+def image_shape(store: Path) -> Tuple[int, int, int]:
+    """(slices, height, width) of a store's full-resolution array."""
+    group = zarr.open_group(str(store), mode="r")
+    axes, paths = read_multiscales(group)
+    shape = group[paths[0]].shape
+    n_z = shape[axes.index("z")] if "z" in axes else 1
+    return n_z, shape[-2], shape[-1]
+
+
+def max_level(height: int, width: int) -> int:
+    """DZI top (full-resolution) level: ceil(log2(longest edge))."""
+    return max(0, math.ceil(math.log2(max(height, width, 1))))
+
+
+def level_grid(height: int, width: int, level: int, tile_size: int = TILE_SIZE) -> Tuple[int, int, int, int]:
+    """(level height, level width, columns, rows) of one DZI level."""
+    factor = 2 ** (max_level(height, width) - level)
+    h, w = math.ceil(height / factor), math.ceil(width / factor)
+    return h, w, math.ceil(w / tile_size), math.ceil(h / tile_size)
+
+
+def tile_region(height: int, width: int, level: int, col: int, row: int, tile_size: int = TILE_SIZE) -> Tuple[rendering.Region, int]:
+    """
+    Parameters:
+        height (int): Full-resolution image height.
+        width (int): Full-resolution image width.
+        level (int): DZI level.
+        col (int): Tile column.
+        row (int): Tile row.
+        tile_size (int): Tile edge in pixels.
+
+    Returns:
+        tuple[Region, int]: Level 0 rectangle covered by the tile and the level's downsampling factor.
+
+    Raises:
+        ValueError: When the level or tile index is outside the pyramid.
+    """
+    top = max_level(height, width)
+    if not 0 <= level <= top:
+        raise ValueError(f"level must be in [0, {top}]")
+    _, _, cols, rows = level_grid(height, width, level, tile_size)
+    if not (0 <= col < cols and 0 <= row < rows):
+        raise ValueError(f"tile ({col}, {row}) outside the {cols}x{rows} grid of level {level}")
+    factor = 2 ** (top - level)
+    span = tile_size * factor
+    return rendering.clip_region(rendering.Region(col * span, row * span, span, span), height, width), factor
+
+
+def render_tile(store: Path, digest: str, z: int, level: int, col: int, row: int, fmt: str = TILE_FORMAT) -> Tuple[Path, str]:
+    """
+    Parameters:
+        store (Path): OME-Zarr store directory.
+        digest (str): Store content digest (cache namespace).
+        z (int): Slice index.
+        level (int): DZI level.
+        col (int): Tile column.
+        row (int): Tile row.
+        fmt (str): Image format.
+
+    Returns:
+        tuple[Path, str]: (cached tile path, cache key usable as an ETag).
+
+    Does:
+        Renders one fixed-size tile (edge tiles are cropped) from the coarsest adequate pyramid level.
+    """
+    _, height, width = image_shape(store)
+    region, factor = tile_region(height, width, level, col, row)
+    return rendering.render_slice(store, digest, z, region=region, fmt=fmt, downsample=factor)
+
+
+def dzi_descriptor(height: int, width: int, fmt: str = TILE_FORMAT, tile_size: int = TILE_SIZE) -> str:
+    """Deep Zoom Image XML; tiles are expected at <name>_files/<level>/<col>_<row>.<fmt>."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{fmt}" '
+        f'Overlap="0" TileSize="{tile_size}">\n'
+        f'  <Size Height="{height}" Width="{width}"/>\n'
+        "</Image>\n"
+    )
+
+
+def tilejson_descriptor(height: int, width: int, tile_url: str, fmt: str = TILE_FORMAT, tile_size: int = TILE_SIZE) -> Dict:
+    """
+    TileJSON 3.0 document for a non-geographic image: zoom levels are DZI levels, minzoom is the
+    level where the image fits one tile. `tile_url` is the template with {z}/{x}/{y} placeholders.
+    """
+    return {
+        "tilejson": "3.0.0",
+        "tiles": [tile_url],
+        "minzoom": single_tile_level(height, width, tile_size),
+        "maxzoom": max_level(height, width),
+        "tileSize": tile_size,
+        "format": fmt,
+        "width": width,
+        "height": height,
+    }
+
+
+def single_tile_level(height: int, width: int, tile_size: int = TILE_SIZE) -> int:
+    """Highest DZI level whose whole image fits in one tile."""
+    top = max_level(height, width)
+    return max(0, top - max(0, math.ceil(math.log2(max(height, width, 1) / tile_size))))
+
+
+def pregenerate_tiles(store: Path, digest: str, levels: int = TILE_PREGENERATE_LEVELS, fmt: str = TILE_FORMAT) -> int:
+    """
+    Render every tile of the single-tile level and the next `levels` finer levels (the overview
+    tiles a viewer requests first) for every slice. Returns the number of tiles written or reused.
+    """
+    if levels <= 0:
+        return 0
+    n_z, height, width = image_shape(store)
+    first = single_tile_level(height, width)
+    last = min(max_level(height, width), first + levels)
+    count = 0
+    for z in range(n_z):
+        for level in range(first, last + 1):
+            _, _, cols, rows = level_grid(height, width, level)
+            for row in range(rows):
+                for col in range(cols):
+                    render_tile(store, digest, z, level, col, row, fmt)
+                    count += 1
+    return count
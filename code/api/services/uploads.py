@@ -2,10 +2,14 @@ import logging
 from pathlib import Path
 from typing import List, Optional
 
-from sqlalchemy import text, types as satypes
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 
+from code.database.bulk_load import REGION_COUNTS_CONFLICT, copy_merge
 from code.database.deduplication import check_microscopy_duplicate, register_batch
-from code.common.hashing import combine_hashes, combine_hex_hashes, file_sha256
+from code.database.hash_filter import known_hashes
+from code.api.services import projections, tiles
+from code.common.hashing import combine_hashes, combine_hex_hashes, file_sha256, sidecar_sha256
 from code.config import ALLOWED_SUBJECT_PREFIXES, DUPLICATE_MESSAGE
 from code.database.etl.counts_helper import prepare_counts_dataframe
 
@@ -146,6 +150,26 @@ def get_region_counts_for_file(engine, file_id: int, limit: int = 1000):
     return [dict(r._mapping) for r in rows]
 
 
+def definitely_new(engine, hashes: List[str]) -> bool:
+    """
+    Parameters:
+        engine: SQLAlchemy engine.
+        hashes (list[str]): File/batch hashes that any duplicate rule would have to match.
+
+    Returns:
+        bool: True when the known-hash Bloom filter rules every hash out; False means "ask Postgres".
+
+    Does:
+        Refreshes the per-worker filter if due; a failed refresh falls back to the database check.
+    """
+    try:
+        known_hashes.refresh(engine)
+    except SQLAlchemyError as exc:
+        logger.warning("Known-hash filter refresh failed: %s", exc)
+        return False
+    return not known_hashes.may_contain_any(hashes)
+
+
 def check_dup_by_hashes(engine, hashes: List[str]):
     """
     Parameters:
@@ -156,12 +180,15 @@ def check_dup_by_hashes(engine, hashes: List[str]):
         str | None: Duplicate reason if found; None otherwise.
 
     Does:
-        Computes batch checksum and checks microscopy duplicate tables/logs.
+        Computes batch checksum and checks microscopy duplicate tables/logs, skipping the
+        database when the known-hash filter has never seen the batch or any of its files.
     """
     hashes = [h for h in hashes or [] if h]
     if not hashes:
         return None
     batch_checksum = combine_hex_hashes(hashes)
+    if definitely_new(engine, [batch_checksum, *hashes]):
+        return None
     return check_microscopy_duplicate(engine, batch_checksum, hashes)
 
 
@@ -206,12 +233,14 @@ def check_counts_dup_by_hashes(engine, hashes: List[str]):
         str | None: Duplicate message if seen; None otherwise.
 
     Does:
-        Uses combined hash to check ingest_log for prior successful CSV ingests.
+        Uses combined hash to check ingest_log for prior successful CSV ingests (after the known-hash filter).
     """
     hashes = [h for h in hashes or [] if h]
     if not hashes:
         return None
     batch_checksum = combine_hex_hashes(hashes)
+    if definitely_new(engine, [batch_checksum]):
+        return None
     with engine.connect() as conn:
         dup = conn.execute(
             text("SELECT 1 FROM ingest_log WHERE checksum = :chk AND status = 'success' LIMIT 1"),
@@ -236,51 +265,12 @@ def ingest_counts_csv(engine, csv_path: Path, subject_id: str, session_id: str,
         int: Number of rows inserted.
 
     Does:
-        Normalizes a quant CSV via prepare_counts_dataframe, stages it, and inserts into region_counts with conflict handling.
+        Normalizes a quant CSV via prepare_counts_dataframe, streams it through COPY, and inserts into region_counts with conflict handling.
     """
     df_counts = prepare_counts_dataframe(engine, csv_path, subject_id, session_id, hemisphere)
-    temp_table = "_region_counts_upload_stage"
     with engine.begin() as conn:
-        df_counts.to_sql(
-            temp_table,
-            con=conn,
-            if_exists="replace",
-            index=False,
-            method="multi",
-            dtype={
-                "subject_id": satypes.String(50),
-                "region_id": satypes.Integer(),
-                "file_id": satypes.Integer(),
-                "region_pixels": satypes.BigInteger(),
-                "region_area_mm": satypes.Float(),
-                "object_count": satypes.Integer(),
-                "object_pixels": satypes.BigInteger(),
-                "object_area_mm": satypes.Float(),
-                "load": satypes.Float(),
-                "norm_load": satypes.Float(),
-                "hemisphere": satypes.String(20),
-                "region_pixels_unit_id": satypes.Integer(),
-                "region_area_unit_id": satypes.Integer(),
-                "object_count_unit_id": satypes.Integer(),
-                "object_pixels_unit_id": satypes.Integer(),
-                "object_area_unit_id": satypes.Integer(),
-                "load_unit_id": satypes.Integer(),
-            },
-        )
-        inserted = conn.execute(
-            text(
-                f"""
-                INSERT INTO region_counts (subject_id, region_id, file_id, region_pixels, region_area_mm, object_count, object_pixels, object_area_mm, load, norm_load, hemisphere,
-                                          region_pixels_unit_id, region_area_unit_id, object_count_unit_id, object_pixels_unit_id, object_area_unit_id, load_unit_id)
-                SELECT subject_id, region_id, file_id, region_pixels, region_area_mm, object_count, object_pixels, object_area_mm, load, norm_load, hemisphere,
-                       region_pixels_unit_id, region_area_unit_id, object_count_unit_id, object_pixels_unit_id, object_area_unit_id, load_unit_id
-                FROM {temp_table}
-                ON CONFLICT (subject_id, region_id, hemisphere) DO NOTHING;
-                """
-            )
-        ).rowcount
-        conn.execute(text(f"DROP TABLE IF EXISTS {temp_table};"))
-    return inserted or 0
+        inserted = copy_merge(conn, df_counts, "region_counts", REGION_COUNTS_CONFLICT)
+    return inserted
 
 
 class DuplicateUpload(Exception):
@@ -332,6 +322,28 @@ def prepare_microscopy_upload(
     return resolved_subject, session_id, raw_batch_checksum, file_shas
 
 
+def warm_store_caches(stores: List[Path]):
+    """
+    Parameters:
+        stores (list[Path]): OME-Zarr stores registered by an upload.
+
+    Returns:
+        None
+
+    Does:
+        Renders the coarse overview tiles and whole-brain projections reviews open first. Runs after
+        the upload response as a background task; failures are logged per store and step and never
+        reach the client.
+    """
+    for store in stores:
+        digest = sidecar_sha256(store) or ""
+        for name, warm in (("Tile pregeneration", tiles.pregenerate_tiles), ("Projection precompute", projections.precompute_projections)):
+            try:
+                warm(store, digest)
+            except Exception:
+                logger.exception("%s failed for %s", name, store)
+
+
 def ingest_microscopy_files(
     engine,
     subject_id: str,
@@ -343,6 +355,8 @@ def ingest_microscopy_files(
     comments: Optional[str],
     raw_batch_checksum: str,
     file_shas: List[str],
+    volume: bool = False,
+    z_spacing_um: Optional[float] = None,
 ):
     """
     Parameters:
@@ -356,6 +370,8 @@ def ingest_microscopy_files(
         comments (str | None): Optional notes to persist on session.
         raw_batch_checksum (str): Batch checksum for logging.
         file_shas (list[str]): Per-file hashes.
+        volume (bool): Assemble the files into a single z-stack store.
+        z_spacing_um (float | None): Slice spacing for volume mode.
 
     Returns:
         dict: Upload result with subject_id, session_id, and ingested file paths.
@@ -372,6 +388,8 @@ def ingest_microscopy_files(
         files=file_paths,
         pixel_size_um=pixel_size_um,
         experiment_type=experiment_type,
+        volume=volume,
+        z_spacing_um=z_spacing_um,
     )
     if comments:
         with engine.begin() as conn:
@@ -394,6 +412,7 @@ def ingest_microscopy_files(
                 "m": f"microscopy upload {session_id}",
             },
         )
+    known_hashes.add(raw_batch_checksum, *(sidecar_sha256(store) for store in ingested))
     return {
         "status": "ok",
         "subject_id": subject_id,
@@ -0,0 +1,554 @@
+"""
+Zarr store helpers for the /data mount, the /zarr chunk route and per-store API endpoints.
+Stores are written without fill-value chunks, so missing chunk keys are answered here with an
+encoded fill-value chunk instead of a 404.
+"""
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numcodecs
+import numpy as np
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException
+
+from code.common.hashing import sidecar_sha256
+from code.common.paths import resolve_store_path  # noqa: F401  (re-exported)
+from code.config import (
+    PREVIEW_CACHE_SECONDS,
+    ZARR_CACHE_MAX_BYTES,
+    ZARR_CACHE_MAX_ITEM_BYTES,
+    ZARR_BATCH_WORKERS,
+    ZARR_CACHE_REVALIDATE_SECONDS,
+)
+
+# Chunk keys are dot- or slash-separated chunk indices (dimension_separator "." or "/")
+CHUNK_KEY_RE = re.compile(r"^\d+([./]\d+)*$")
+# Zarr v2 metadata documents (JSON); everything else in a store is a binary chunk
+METADATA_KEYS = (".zattrs", ".zarray", ".zgroup", ".zmetadata")
+# Media type of the batched chunk response (see pack_chunks)
+CHUNK_BATCH_MEDIA_TYPE = "application/x-zarr-chunk-batch"
+# Single byte range; multi-range requests are answered with the full body
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# /zarr URL version for stores without a pixel digest or readable metadata (short-lived caching)
+UNVERSIONED = "_"
+
+
+def locate_chunk(root: Path, rel_path: str) -> Optional[Tuple[Path, str]]:
+    """
+    Parameters:
+        root (Path): Directory served by the mount.
+        rel_path (str): Request path relative to root.
+
+    Returns:
+        tuple[Path, str] | None: (array directory, chunk key) when rel_path addresses a chunk of a Zarr array.
+
+    Does:
+        Walks up from the requested path to the nearest directory holding a .zarray inside a *.zarr store.
+    """
+    root = root.resolve()
+    target = (root / rel_path).resolve()
+    if root not in target.parents:
+        return None
+    parent = target.parent
+    while parent != root and root in parent.parents:
+        if (parent / ".zarray").is_file():
+            key = target.relative_to(parent).as_posix()
+            if not CHUNK_KEY_RE.match(key) or not any(p.suffix == ".zarr" for p in (parent, *parent.parents)):
+                return None
+            return parent, key
+        parent = parent.parent
+    return None
+
+
+@lru_cache(maxsize=256)
+def _fill_chunk_cached(zarray_path: str, mtime_ns: int) -> Optional[Tuple[bytes, tuple]]:
+    meta = json.loads(Path(zarray_path).read_text())
+    if meta.get("fill_value") is None:
+        return None
+    chunk = np.full(meta["chunks"], meta["fill_value"], dtype=np.dtype(meta["dtype"]), order=meta.get("order", "C"))
+    buf = chunk.tobytes(order=meta.get("order", "C"))
+    for flt in meta.get("filters") or []:
+        buf = numcodecs.get_codec(flt).encode(buf)
+    if meta.get("compressor"):
+        buf = numcodecs.get_codec(meta["compressor"]).encode(buf)
+    grid = tuple(-(-int(s) // int(c)) for s, c in zip(meta["shape"], meta["chunks"]))
+    return bytes(buf), grid
+
+
+def fill_chunk(array_dir: Path, key: str) -> Optional[bytes]:
+    """
+    Parameters:
+        array_dir (Path): Zarr array directory (holds .zarray).
+        key (str): Chunk key such as "0.3.7".
+
+    Returns:
+        bytes | None: Encoded fill-value chunk, or None if the key is outside the chunk grid or the array has no fill value.
+
+    Does:
+        Builds (and caches per .zarray version) the encoded chunk a reader would get for an unwritten key.
+    """
+    zarray = array_dir / ".zarray"
+    cached = _fill_chunk_cached(str(zarray), zarray.stat().st_mtime_ns)
+    if cached is None:
+        return None
+    body, grid = cached
+    idx = [int(i) for i in re.split(r"[./]", key)]
+    if len(idx) != len(grid) or any(i >= n for i, n in zip(idx, grid)):
+        return None
+    return body
+
+
+class ZarrStaticFiles(StaticFiles):
+    """StaticFiles that answers missing Zarr chunk keys with the array's fill-value chunk."""
+
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as exc:
+            if exc.status_code != 404 or self.directory is None:
+                raise
+            located = locate_chunk(Path(self.directory), path)
+            body = fill_chunk(*located) if located else None
+            if body is None:
+                raise
+            return Response(content=body, media_type="application/octet-stream")
+
+
+def read_omero(store: Path) -> Optional[dict]:
+    """
+    Parameters:
+        store (Path): OME-Zarr store directory.
+
+    Returns:
+        dict | None: The store's omero block (channel windows, histograms), or None if absent/unreadable.
+
+    Does:
+        Reads the root .zattrs directly so list endpoints avoid opening the store with zarr.
+    """
+    try:
+        return json.loads((store / ".zattrs").read_text()).get("omero")
+    except (OSError, ValueError):
+        return None
+
+
+def immutable_headers(etag: str, max_age: int = PREVIEW_CACHE_SECONDS) -> dict:
+    """Cache headers for content addressed by store digest."""
+    return {"Cache-Control": f"public, max-age={max_age}, immutable", "ETag": f'"{etag}"'}
+
+
+def cached_file_response(request: Request, path: Path, etag: str, media_type: Optional[str] = None) -> Response:
+    """
+    Parameters:
+        request (Request): Incoming request (for If-None-Match).
+        path (Path): File to serve.
+        etag (str): Strong validator, typically derived from the store digest.
+        media_type (str | None): Response content type.
+
+    Returns:
+        Response: 304 when the client copy matches, else the file with long-lived cache headers.
+
+    Does:
+        Serves derived, digest-keyed files with immutable caching.
+    """
+    headers = immutable_headers(etag)
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def find_store(root: Path, rel_path: str) -> Optional[Tuple[Path, str]]:
+    """
+    Parameters:
+        root (Path): Directory the route serves from (DATA_DIR).
+        rel_path (str): Request path relative to root.
+
+    Returns:
+        tuple[Path, str] | None: (store directory, key inside the store) when rel_path points into a *.zarr store under root.
+
+    Does:
+        Splits a request path at the outermost *.zarr component, rejecting traversal outside root.
+    """
+    root = root.resolve()
+    target = (root / rel_path).resolve()
+    if root not in target.parents:
+        return None
+    parts = target.relative_to(root).parts
+    for i, part in enumerate(parts[:-1]):
+        if part.endswith(".zarr"):
+            return root.joinpath(*parts[: i + 1]), "/".join(parts[i + 1:])
+    return None
+
+
+def store_version(store: Path) -> int:
+    """mtime_ns of the store's root metadata (rewritten whenever the store is rebuilt); 0 if absent."""
+    for name in (".zattrs", ".zgroup"):
+        try:
+            return (store / name).stat().st_mtime_ns
+        except OSError:
+            continue
+    return 0
+
+
+_layout_versions: Dict[Tuple[Path, str], Tuple[Tuple[int, int], str]] = {}
+
+
+def layout_version(store: Path, digest: Optional[str]) -> str:
+    """
+    Parameters:
+        store (Path): Zarr store directory.
+        digest (str | None): Pixel content digest recorded at ingest.
+
+    Returns:
+        str: 16-hex version token for /zarr URLs, or UNVERSIONED without a digest or readable metadata.
+
+    Does:
+        Hashes the digest together with the consolidated metadata, so re-converting the same pixels with
+        another codec, chunk shape or pyramid (or consolidating the store) also yields new URLs. The
+        result is cached per store until .zmetadata (or, without it, the root metadata) changes.
+    """
+    if not digest:
+        return UNVERSIONED
+    zmetadata = store / ".zmetadata"
+    try:
+        st = zmetadata.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = (store_version(store), -1)
+        if not stamp[0]:
+            return UNVERSIONED
+    cached = _layout_versions.get((store, digest))
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        if stamp[1] >= 0:
+            body = zmetadata.read_bytes()
+        else:
+            # Same document load_store_file serves for stores without .zmetadata
+            body = json.dumps(consolidated_metadata(store), indent=4, sort_keys=True).encode()
+    except (OSError, ValueError):
+        return UNVERSIONED
+    version = hashlib.blake2b(digest.encode() + body, digest_size=8).hexdigest()
+    _layout_versions[(store, digest)] = (stamp, version)
+    return version
+
+
+def url_version(store: Path) -> str:
+    """/zarr URL version for a store: layout_version over the pixel digest in its sidecar (UNVERSIONED without one)."""
+    return layout_version(store, sidecar_sha256(store))
+
+
+def consolidated_metadata(store: Path) -> dict:
+    """
+    Parameters:
+        store (Path): Zarr store directory.
+
+    Returns:
+        dict: Document in zarr's consolidated format ({"zarr_consolidated_format": 1, "metadata": {key: doc}}).
+
+    Does:
+        Collects every .zgroup/.zattrs/.zarray under the store without writing anything.
+    """
+    metadata = {}
+    for name in (".zgroup", ".zattrs", ".zarray"):
+        for doc in store.rglob(name):
+            metadata[doc.relative_to(store).as_posix()] = json.loads(doc.read_text())
+    return {"zarr_consolidated_format": 1, "metadata": metadata}
+
+
+def load_store_file(store: Path, key: str, version: int) -> Optional[Tuple[bytes, str]]:
+    """
+    Parameters:
+        store (Path): Zarr store directory.
+        key (str): Key inside the store, e.g. "0/.zarray" or "0/0.3.7".
+        version (int): Store version (see store_version), folded into the ETag.
+
+    Returns:
+        tuple[bytes, str] | None: (body, strong ETag), or None when the key does not exist.
+
+    Does:
+        Reads a store file from disk, substituting the encoded fill-value chunk for unwritten chunk keys
+        and an in-memory consolidated document for stores without .zmetadata.
+    """
+    try:
+        body = (store / key).read_bytes()
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        if key == ".zmetadata":
+            # Store predates write-time consolidation: build the document in memory
+            body = json.dumps(consolidated_metadata(store), indent=4, sort_keys=True).encode()
+            return body, f"{version:x}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"
+        located = locate_chunk(store.parent, f"{store.name}/{key}")
+        body = fill_chunk(*located) if located else None
+        if body is None:
+            return None
+    digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+    return body, f"{version:x}-{digest}"
+
+
+class ChunkCache:
+    """
+    Byte-bounded LRU of store files (chunks and metadata docs) with per-store hit/miss counters.
+    Entries are dropped when a store's root metadata changes; that check costs one stat per store
+    at most every `revalidate_seconds`, so hot chunk requests never touch the filesystem.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = ZARR_CACHE_MAX_BYTES,
+        max_item_bytes: int = ZARR_CACHE_MAX_ITEM_BYTES,
+        revalidate_seconds: float = ZARR_CACHE_REVALIDATE_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: "OrderedDict[Tuple[Path, str], Tuple[bytes, str]]" = OrderedDict()
+        self._versions: Dict[Path, Tuple[int, float]] = {}
+        self._url_versions: Dict[Path, Tuple[str, float]] = {}
+        self._counters: Dict[Path, Dict[str, int]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def version(self, store: Path) -> int:
+        """Current store version, re-statted at most every revalidate_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(store)
+            if cached and now - cached[1] < self.revalidate_seconds:
+                return cached[0]
+        version = store_version(store)
+        with self._lock:
+            if cached and cached[0] != version:
+                self._drop_store(store)
+            self._versions[store] = (version, now)
+        return version
+
+    def url_version(self, store: Path) -> str:
+        """url_version(store), recomputed at most every revalidate_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._url_versions.get(store)
+            if cached and now - cached[1] < self.revalidate_seconds:
+                return cached[0]
+        version = url_version(store)
+        with self._lock:
+            self._url_versions[store] = (version, now)
+        return version
+
+    def _drop_store(self, store: Path) -> None:
+        for entry_key in [k for k in self._entries if k[0] == store]:
+            self._bytes -= len(self._entries.pop(entry_key)[0])
+
+    def _count(self, store: Path, field: str) -> None:
+        counters = self._counters.setdefault(store, {"hits": 0, "misses": 0})
+        counters[field] += 1
+
+    def get(self, store: Path, key: str) -> Optional[Tuple[bytes, str]]:
+        """Cached (body, etag) or None; counts a hit or miss for the store."""
+        self.version(store)
+        with self._lock:
+            entry = self._entries.get((store, key))
+            if entry is None:
+                self._count(store, "misses")
+                return None
+            self._entries.move_to_end((store, key))
+            self._count(store, "hits")
+            return entry
+
+    def put(self, store: Path, key: str, entry: Tuple[bytes, str]) -> None:
+        """Insert (body, etag), evicting least recently used entries past max_bytes."""
+        size = len(entry[0])
+        if size > self.max_item_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((store, key), None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[(store, key)] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (body, _) = self._entries.popitem(last=False)
+                self._bytes -= len(body)
+
+    def fetch(self, store: Path, key: str) -> Optional[Tuple[bytes, str]]:
+        """Cached entry, else load_store_file() and cache the result."""
+        entry = self.get(store, key)
+        if entry is None:
+            entry = load_store_file(store, key, self.version(store))
+            if entry is not None:
+                self.put(store, key, entry)
+        return entry
+
+    def stats(self, root: Optional[Path] = None) -> Dict:
+        """Cache occupancy plus per-store hits/misses (store paths relative to root when given)."""
+        with self._lock:
+            per_store = {}
+            for store, counters in self._counters.items():
+                name = store.relative_to(root).as_posix() if root and root in store.parents else str(store)
+                cached = [e for k, e in self._entries.items() if k[0] == store]
+                per_store[name] = {
+                    **counters,
+                    "entries": len(cached),
+                    "bytes": sum(len(e[0]) for e in cached),
+                }
+            return {
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "entries": len(self._entries),
+                "stores": per_store,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._url_versions.clear()
+            self._counters.clear()
+            self._bytes = 0
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parameters:
+        header (str | None): Range request header.
+        size (int): Body length.
+
+    Returns:
+        tuple[int, int] | None: Inclusive (start, end) for a single satisfiable byte range, None to send the full body.
+
+    Raises:
+        ValueError: When the range is well-formed but unsatisfiable (caller answers 416).
+
+    Does:
+        Handles "bytes=a-b", "bytes=a-" and suffix "bytes=-n"; multi-range requests get the full body.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    start_s, end_s = match.groups()
+    if start_s == "":
+        length = int(end_s)
+        if length == 0 or size == 0:
+            raise ValueError("unsatisfiable suffix range")
+        return max(size - length, 0), size - 1
+    start = int(start_s)
+    end = int(end_s) if end_s else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def bytes_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    media_type: str = "application/octet-stream",
+    max_age: int = PREVIEW_CACHE_SECONDS,
+    immutable: bool = True,
+) -> Response:
+    """
+    Parameters:
+        request (Request): Incoming request (method, If-None-Match, Range).
+        body (bytes): Full response body.
+        etag (str): Strong validator for body.
+        media_type (str): Response content type.
+        max_age (int): Cache lifetime for the Cache-Control header.
+        immutable (bool): Mark the response immutable; False for URLs whose content may change in place.
+
+    Returns:
+        Response: 304, 206 (single range), 416, or 200; HEAD requests get headers only.
+
+    Does:
+        Serves an in-memory body with ETag/immutable caching and byte-range support.
+    """
+    headers = {**immutable_headers(etag, max_age), "Accept-Ranges": "bytes"}
+    if not immutable:
+        headers["Cache-Control"] = f"public, max-age={max_age}"
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    status = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == headers["ETag"]):
+        try:
+            span = parse_range(range_header, len(body))
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+        if span is not None:
+            start, end = span
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            body, status = body[start:end + 1], 206
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(body))
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return Response(content=body, status_code=status, headers=headers, media_type=media_type)
+
+
+_batch_pool = ThreadPoolExecutor(max_workers=ZARR_BATCH_WORKERS, thread_name_prefix="zarr-batch")
+
+
+def fetch_chunks(cache: ChunkCache, store: Path, level: str, keys: List[str]) -> List[Optional[bytes]]:
+    """
+    Parameters:
+        cache (ChunkCache): Cache to read through.
+        store (Path): Zarr store directory.
+        level (str): Array path inside the store (a multiscales dataset such as "0").
+        keys (list[str]): Chunk keys within that array.
+
+    Returns:
+        list[bytes | None]: Encoded chunks in request order; None for keys outside the chunk grid.
+
+    Does:
+        Reads the chunks concurrently (cache misses hit disk in parallel threads).
+    """
+    futures = [_batch_pool.submit(cache.fetch, store, f"{level}/{key}") for key in keys]
+    return [entry[0] if entry else None for entry in (f.result() for f in futures)]
+
+
+def pack_chunks(keys: List[str], bodies: List[Optional[bytes]]) -> bytes:
+    """
+    Parameters:
+        keys (list[str]): Chunk keys in request order.
+        bodies (list[bytes | None]): Encoded chunks (None when missing).
+
+    Returns:
+        bytes: Length-prefixed frames, one per key: uint16 key length, key (UTF-8), int32 body length
+        (-1 when missing), body. All integers are big-endian.
+
+    Does:
+        Packs a chunk batch so clients can split it without a multipart parser.
+    """
+    frames = []
+    for key, body in zip(keys, bodies):
+        encoded = key.encode()
+        frames.append(struct.pack(">H", len(encoded)) + encoded)
+        frames.append(struct.pack(">i", -1 if body is None else len(body)))
+        if body is not None:
+            frames.append(body)
+    return b"".join(frames)
+
+
+def unpack_chunks(payload: bytes) -> Dict[str, Optional[bytes]]:
+    """Inverse of pack_chunks (used by tests and Python clients)."""
+    out, pos = {}, 0
+    while pos < len(payload):
+        (key_len,) = struct.unpack_from(">H", payload, pos)
+        key = payload[pos + 2:pos + 2 + key_len].decode()
+        pos += 2 + key_len
+        (body_len,) = struct.unpack_from(">i", payload, pos)
+        pos += 4
+        if body_len < 0:
+            out[key] = None
+        else:
+            out[key] = payload[pos:pos + body_len]
+            pos += body_len
+    return out
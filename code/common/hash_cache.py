@@ -0,0 +1,99 @@
+"""
+Persistent file digest cache (SQLite) keyed by (path, size, mtime_ns, inode).
+Lets repeated ETL runs skip re-reading unchanged sources; hit/miss counters feed the ETL summary.
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from code.config import HASH_CACHE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    hashed_at REAL NOT NULL
+)
+"""
+
+
+class HashCache:
+    """SQLite-backed digest cache; safe to share between threads."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path: Path, st: os.stat_result) -> Optional[str]:
+        """Cached digest when path's size, mtime_ns and inode all match the recorded ones."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM file_digests WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                (str(path), st.st_size, st.st_mtime_ns, st.st_ino),
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def store(self, path: Path, st: os.stat_result, sha256: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_digests (path, size, mtime_ns, inode, sha256, hashed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path), st.st_size, st.st_mtime_ns, st.st_ino, sha256, time.time()),
+            )
+
+    def count(self, hits: int = 0, misses: int = 0) -> None:
+        """Record hits/misses resolved elsewhere (e.g. directory manifests)."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> Dict[str, int]:
+        return {"hash_cache_hits": self.hits, "hash_cache_misses": self.misses}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default: Optional[HashCache] = None
+_default_lock = threading.Lock()
+
+
+def get_hash_cache() -> Optional[HashCache]:
+    """Process-wide cache at HASH_CACHE_PATH, or None when disabled (empty path) or unusable."""
+    global _default
+    if not HASH_CACHE_PATH:
+        return None
+    with _default_lock:
+        if _default is None:
+            try:
+                _default = HashCache(Path(HASH_CACHE_PATH))
+            except (OSError, sqlite3.Error):
+                return None
+        return _default
+
+
+def hash_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters of the process-wide cache (zeros when disabled)."""
+    cache = get_hash_cache()
+    return cache.stats() if cache else {"hash_cache_hits": 0, "hash_cache_misses": 0}
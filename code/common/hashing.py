@@ -2,32 +2,166 @@
 Shared hashing helpers for microscopy/quant duplicate detection.
 Provides a single source for file hashes, batch hashes, and order-insensitive hex hashes.
 """
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Sequence
 import hashlib
+import json
+import os
 
+import numpy as np
 
-def file_sha256(path: Path, chunk_size: int = 1_048_576) -> str:
-    """SHA256 for a file or directory (directories hashed deterministically by walk order)."""
+from code.common.hash_cache import get_hash_cache
+from code.config import HASH_WORKERS
+
+# Sidecar key holding the pixel digest recorded at OME-Zarr write time
+SIDECAR_DIGEST_KEY = "ContentSHA256"
+# Per-directory manifest of leaf hashes, kept next to the directory as <dir>.hash-manifest.json so
+# hashing never changes the tree. Older manifests written inside the directory are still excluded
+# from its digest so recorded hashes stay stable.
+MANIFEST_NAME = ".hash-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _stream_sha256(path: Path, chunk_size: int = 1_048_576) -> str:
     h = hashlib.sha256()
-    if path.is_dir():
-        # Deterministic walk for stable hashes
-        for sub in sorted(p for p in path.rglob("*") if p.is_file()):
-            h.update(str(sub.relative_to(path)).encode())
-            with sub.open("rb") as f:
-                for chunk in iter(lambda: f.read(chunk_size), b""):
-                    if not chunk:
-                        break
-                    h.update(chunk)
-    else:
-        with path.open("rb") as f:
-            for chunk in iter(lambda: f.read(chunk_size), b""):
-                if not chunk:
-                    break
-                h.update(chunk)
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
     return h.hexdigest()
 
 
+def file_sha256(path: Path, chunk_size: int = 1_048_576, write_manifest: bool = False) -> str:
+    """
+    SHA256 for a file, served from the persistent hash cache when the file's size, mtime and inode
+    are unchanged; directories get the Merkle digest from tree_sha256 (which only writes the sibling
+    manifest when write_manifest is set).
+    """
+    if path.is_dir():
+        return tree_sha256(path, write_manifest=write_manifest)
+    cache = get_hash_cache()
+    if cache is None:
+        return _stream_sha256(path, chunk_size)
+    resolved = path.resolve()
+    st = resolved.stat()
+    digest = cache.lookup(resolved, st)
+    if digest is None:
+        digest = _stream_sha256(resolved, chunk_size)
+        cache.store(resolved, st, digest)
+    return digest
+
+
+def merkle_root(leaves: Dict[str, str]) -> str:
+    """
+    Deterministic Merkle root of {posix relative path: file sha256}. Each directory node hashes its
+    sorted entries as "<f|d> <name> <hash>" lines, so a digest only depends on names and contents.
+    """
+    tree: Dict = {}
+    for rel, digest in leaves.items():
+        node = tree
+        *dirs, name = rel.split("/")
+        for d in dirs:
+            node = node.setdefault(d, {})
+        node[name] = digest
+
+    def node_hash(node: Dict) -> str:
+        h = hashlib.sha256()
+        for name in sorted(node):
+            child = node[name]
+            kind, digest = ("d", node_hash(child)) if isinstance(child, dict) else ("f", child)
+            h.update(f"{kind} {name} {digest}\n".encode())
+        return h.hexdigest()
+
+    return node_hash(tree)
+
+
+def _walk_files(root: Path) -> Dict[str, os.stat_result]:
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            full = Path(dirpath) / name
+            rel = full.relative_to(root).as_posix()
+            if rel != MANIFEST_NAME:
+                files[rel] = full.stat()
+    return files
+
+
+def manifest_path(root: Path) -> Path:
+    """Sibling manifest location for a directory: <dir>.hash-manifest.json."""
+    return root.with_name(root.name + MANIFEST_NAME)
+
+
+def read_manifest(root: Path) -> Dict:
+    """Manifest written by tree_sha256 ({"root", "files": {rel: {size, mtime_ns, sha256}}}), or {}."""
+    try:
+        manifest = json.loads(manifest_path(root).read_text())
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def _hash_tree(root: Path, workers: int, previous: Dict) -> Dict[str, Dict]:
+    """{rel: {size, mtime_ns, sha256}} for every file, reusing `previous` entries whose stat matches."""
+    files = _walk_files(root)
+    entries, stale = {}, []
+    for rel, st in files.items():
+        known = previous.get(rel)
+        if known and known.get("size") == st.st_size and known.get("mtime_ns") == st.st_mtime_ns:
+            entries[rel] = known
+        else:
+            entries[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            stale.append(rel)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for rel, digest in zip(stale, pool.map(lambda rel: _stream_sha256(root / rel), stale)):
+            entries[rel]["sha256"] = digest
+    cache = get_hash_cache()
+    if cache is not None:
+        cache.count(hits=len(entries) - len(stale), misses=len(stale))
+    return entries
+
+
+def _write_manifest(root: Path, digest: str, entries: Dict[str, Dict]) -> None:
+    manifest = {"version": MANIFEST_VERSION, "root": digest, "files": {rel: entries[rel] for rel in sorted(entries)}}
+    try:
+        manifest_path(root).write_text(json.dumps(manifest, separators=(",", ":")))
+    except OSError:
+        pass  # read-only parent: the digest is still valid, only the shortcut is lost
+
+
+def tree_sha256(root: Path, workers: int = HASH_WORKERS, reuse_manifest: bool = True, write_manifest: bool = True) -> str:
+    """
+    Merkle digest of a directory (e.g. a Zarr store). Leaf hashes are computed in a thread pool;
+    with reuse_manifest, files whose size and mtime match the manifest keep their recorded hash,
+    so re-verifying a changed store only re-reads modified files. The sibling manifest is rewritten
+    afterwards when write_manifest is set (silently skipped when the parent is read-only).
+    """
+    previous = read_manifest(root).get("files", {}) if reuse_manifest else {}
+    entries = _hash_tree(root, workers, previous)
+    digest = merkle_root({rel: e["sha256"] for rel, e in entries.items()})
+    if write_manifest:
+        _write_manifest(root, digest, entries)
+    return digest
+
+
+def diff_tree(root: Path, workers: int = HASH_WORKERS) -> Dict:
+    """
+    Compare a directory with its manifest, re-hashing only files whose size/mtime changed.
+    Returns {"root", "previous_root", "changed", "added", "removed"}; the sibling manifest is refreshed.
+    """
+    before = read_manifest(root)
+    old = before.get("files", {})
+    entries = _hash_tree(root, workers, old)
+    digest = merkle_root({rel: e["sha256"] for rel, e in entries.items()})
+    _write_manifest(root, digest, entries)
+    return {
+        "root": digest,
+        "previous_root": before.get("root"),
+        "changed": sorted(r for r in entries if r in old and entries[r]["sha256"] != old[r]["sha256"]),
+        "added": sorted(r for r in entries if r not in old),
+        "removed": sorted(r for r in old if r not in entries),
+    }
+
+
 def combine_hex_hashes(shas: List[str]) -> str:
     """Order-insensitive hash of already-computed hex digests."""
     shas = sorted([s.strip() for s in shas if s])
@@ -41,3 +175,39 @@ def combine_hashes(paths: List[Path]) -> str:
     """Order-insensitive batch hash based on file contents."""
     shas = [file_sha256(p) for p in paths]
     return combine_hex_hashes(shas)
+
+
+class PixelDigest:
+    """
+    Incremental SHA256 over an array's dtype, shape and C-order pixel bytes.
+    Feeding consecutive blocks along axis 0 gives the same digest as hashing the whole array,
+    so writers can hash slice by slice without re-reading the store afterwards.
+    """
+
+    def __init__(self, shape: Sequence[int], dtype):
+        self.dtype = np.dtype(dtype)
+        self._h = hashlib.sha256()
+        self._h.update(f"{self.dtype.str}:{'x'.join(str(int(n)) for n in shape)}".encode())
+
+    def update(self, block: np.ndarray) -> None:
+        self._h.update(np.ascontiguousarray(block, dtype=self.dtype).data)
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+def array_sha256(data: np.ndarray) -> str:
+    """Content digest of an in-memory array (independent of chunking/compression)."""
+    digest = PixelDigest(data.shape, data.dtype)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def sidecar_sha256(store: Path) -> Optional[str]:
+    """Digest recorded in a store's BIDS sidecar JSON, or None if missing/unreadable."""
+    sidecar = store.with_suffix(store.suffix + ".json")
+    try:
+        value = json.loads(sidecar.read_text()).get(SIDECAR_DIGEST_KEY)
+    except (OSError, ValueError, AttributeError):
+        return None
+    return value if isinstance(value, str) and len(value) == 64 else None
@@ -0,0 +1,185 @@
+"""
+Intensity statistics for OME-Zarr images: per-channel and per-slice histograms plus robust
+contrast limits, computed chunk-wise with dask and stored in the image's `omero` block so
+viewers can set display contrast without sampling pixel data.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import dask
+import dask.array as da
+import numpy as np
+
+from code.config import CONTRAST_PERCENTILES, INTENSITY_HIST_BINS
+
+# Default display colors by channel count (hex RRGGBB, as used by omero.channels[].color)
+CHANNEL_COLORS = {1: ["FFFFFF"], 3: ["FF0000", "00FF00", "0000FF"]}
+
+
+def _block_histogram(block: np.ndarray, lo: float, width: float, bins: int) -> np.ndarray:
+    """Histogram every leading-axis plane of a chunk; returns lead + (1, 1, bins) counts."""
+    lead = block.shape[:-2]
+    planes = max(1, int(np.prod(lead, dtype=np.int64)))
+    flat = block.reshape(planes, -1)
+    idx = np.floor((flat.astype(np.float64) - lo) / width).astype(np.int64)
+    np.clip(idx, 0, bins - 1, out=idx)
+    idx += np.arange(planes, dtype=np.int64)[:, None] * bins
+    counts = np.bincount(idx.ravel(), minlength=planes * bins)
+    return counts.reshape(lead + (1, 1, bins))
+
+
+def histogram_edges(lo: float, hi: float, dtype, bins: int = INTENSITY_HIST_BINS) -> np.ndarray:
+    """Bin edges covering [lo, hi]; integer data gets unit-or-wider bins aligned to whole values."""
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        span = int(hi) - int(lo) + 1
+        n = max(1, min(bins, span))
+        return np.linspace(int(lo), int(lo) + span, n + 1)
+    if hi <= lo:
+        hi = lo + 1.0
+    return np.linspace(float(lo), float(hi), bins + 1)
+
+
+def histogram_percentile(counts: np.ndarray, edges: np.ndarray, q: float) -> float:
+    """Percentile `q` (0-100) from a histogram, interpolating linearly within the bin."""
+    total = counts.sum()
+    if total == 0:
+        return float(edges[0])
+    target = total * q / 100.0
+    cum = np.cumsum(counts)
+    i = int(np.searchsorted(cum, target, side="left"))
+    i = min(i, len(counts) - 1)
+    before = cum[i - 1] if i > 0 else 0
+    frac = (target - before) / counts[i] if counts[i] else 0.0
+    return float(edges[i] + frac * (edges[i + 1] - edges[i]))
+
+
+def _limits(counts: np.ndarray, edges: np.ndarray, percentiles: Sequence[float]) -> Dict:
+    lo, hi = (histogram_percentile(counts, edges, q) for q in percentiles)
+    return {"start": lo, "end": max(hi, lo)}
+
+
+def _to_cz(values: np.ndarray, lead: str, trailing: int = 0) -> np.ndarray:
+    """
+    Reorder an array whose leading dims follow `lead` (other axes already reduced or still
+    present) to (c, z, ...): extra leading axes such as t are summed and missing c/z get size 1.
+    """
+    present = [ax for ax in lead if ax in "cz"]
+    if values.ndim - trailing == len(lead) and len(present) != len(lead):
+        extra = tuple(i for i, ax in enumerate(lead) if ax not in "cz")
+        values = values.sum(axis=extra)
+    for ax in "cz":
+        if ax not in present:
+            values = np.expand_dims(values, 0)
+            present.insert(0, ax)
+    return np.moveaxis(values, [present.index("c"), present.index("z")], [0, 1])
+
+
+def compute_intensity_stats(
+    arr,
+    axes: str,
+    bins: int = INTENSITY_HIST_BINS,
+    percentiles: Sequence[float] = CONTRAST_PERCENTILES,
+) -> Dict:
+    """
+    Per-channel and per-slice histograms of a zarr/dask array. Two chunk-parallel passes: one for
+    per-channel min/max, one for block histograms that are summed over the y/x chunk grid.
+    Returns {"bins": edges, "channels": [{min, max, histogram, contrast_limits, slices}]},
+    where slices is a list of {z, min, max, histogram, contrast_limits} (empty without a z axis).
+    """
+    data = arr if isinstance(arr, da.Array) else da.from_zarr(arr)
+    if len(axes) != data.ndim:
+        raise ValueError(f"axes '{axes}' do not match array with {data.ndim} dims")
+    c_ax = axes.find("c")
+    z_ax = axes.find("z")
+    other = tuple(i for i in range(data.ndim) if i != c_ax)
+    slice_other = tuple(i for i in range(data.ndim) if i not in (c_ax, z_ax))
+
+    mins, maxs = dask.compute(data.min(axis=other), data.max(axis=other))
+    mins, maxs = np.atleast_1d(mins), np.atleast_1d(maxs)
+    edges = histogram_edges(mins.min(), maxs.max(), data.dtype, bins)
+    n_bins = len(edges) - 1
+    width = float(edges[1] - edges[0])
+
+    grid = data.numblocks
+    hist = da.map_blocks(
+        _block_histogram,
+        data,
+        float(edges[0]),
+        width,
+        n_bins,
+        dtype=np.int64,
+        chunks=data.chunks[:-2] + ((1,) * grid[-2], (1,) * grid[-1], (n_bins,)),
+        new_axis=data.ndim,
+    ).sum(axis=(-3, -2))
+    slice_mins, slice_maxs = data.min(axis=slice_other), data.max(axis=slice_other)
+    hist, slice_mins, slice_maxs = dask.compute(hist, slice_mins, slice_maxs)
+
+    hist = _to_cz(hist, axes[:-2], trailing=1)
+    slice_mins, slice_maxs = (_to_cz(np.asarray(m), axes[:-2]) for m in (slice_mins, slice_maxs))
+
+    channels = []
+    for c in range(hist.shape[0]):
+        counts = hist[c].sum(axis=0)
+        slices = []
+        if z_ax >= 0:
+            for z in range(hist.shape[1]):
+                slices.append({
+                    "z": z,
+                    "min": slice_mins[c, z].item(),
+                    "max": slice_maxs[c, z].item(),
+                    "histogram": hist[c, z].tolist(),
+                    "contrast_limits": _limits(hist[c, z], edges, percentiles),
+                })
+        channels.append({
+            "min": mins[c].item(),
+            "max": maxs[c].item(),
+            "histogram": counts.tolist(),
+            "contrast_limits": _limits(counts, edges, percentiles),
+            "slices": slices,
+        })
+    return {"bins": edges.tolist(), "percentiles": list(percentiles), "channels": channels}
+
+
+def omero_metadata(stats: Dict, labels: Optional[List[str]] = None) -> Dict:
+    """
+    OME-NGFF `omero` block from compute_intensity_stats output: channel windows carry the data
+    range (min/max) and robust contrast limits (start/end). Histograms ride along under
+    channels[].histogram / channels[].slices and the shared edges under omero.histogram_bins.
+    """
+    n = len(stats["channels"])
+    colors = CHANNEL_COLORS.get(n, ["FFFFFF"] * n)
+    channels = []
+    for i, ch in enumerate(stats["channels"]):
+        channels.append({
+            "label": labels[i] if labels else f"Channel {i}",
+            "color": colors[i],
+            "active": True,
+            "window": {"min": ch["min"], "max": ch["max"], **ch["contrast_limits"]},
+            "histogram": ch["histogram"],
+            "slices": ch["slices"],
+        })
+    return {
+        "version": "0.4",
+        "channels": channels,
+        "rdefs": {"model": "color" if n == 3 else "greyscale", "defaultZ": 0},
+        "histogram_bins": stats["bins"],
+        "contrast_percentiles": stats["percentiles"],
+    }
+
+
+def write_intensity_metadata(group, base, axes: str, **kwargs) -> Dict:
+    """Compute stats for the on-disk `base` array and store them as `omero` on `group`."""
+    omero = omero_metadata(compute_intensity_stats(base, axes, **kwargs))
+    group.attrs["omero"] = omero
+    return omero
+
+
+def contrast_summary(omero: Optional[Dict]) -> Optional[Dict]:
+    """Compact per-channel windows (no histograms) from an omero block, for list endpoints."""
+    if not omero or not omero.get("channels"):
+        return None
+    return {
+        "channels": [
+            {"label": ch.get("label"), "color": ch.get("color"), "window": ch.get("window")}
+            for ch in omero["channels"]
+        ],
+    }
@@ -0,0 +1,222 @@
+"""
+Shared OME-Zarr writing helpers for uploads and batch conversion.
+Builds multiscale pyramids with dask (no skimage dependency) and streams each level to the store.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import dask.array as da
+import numpy as np
+import zarr
+from numcodecs import Blosc
+from ome_zarr.writer import write_multiscales_metadata
+
+from code.common.intensity import write_intensity_metadata
+from code.config import (
+    PYRAMID_LEVELS,
+    PYRAMID_METHOD,
+    VIEWER_TILE_SIZE,
+    ZARR_CHUNK_MAX_BYTES,
+    ZARR_CHUNK_MIN_BYTES,
+    ZARR_CLEVEL,
+    ZARR_CODEC,
+    ZARR_SHUFFLE,
+)
+
+DOWNSAMPLE_METHODS = ("mean", "nearest", "max")
+CODECS = ("zstd", "lz4", "lz4hc", "zlib", "none")
+SHUFFLES = {"bitshuffle": Blosc.BITSHUFFLE, "shuffle": Blosc.SHUFFLE, "noshuffle": Blosc.NOSHUFFLE}
+# Interleave small channel counts (RGB) in one chunk so a tile is a single fetch
+MAX_CHUNK_CHANNELS = 4
+MIN_CHUNK_SIDE = 64
+
+
+def make_compressor(codec: str = ZARR_CODEC, clevel: int = ZARR_CLEVEL, shuffle: str = ZARR_SHUFFLE) -> Optional[Blosc]:
+    """Blosc compressor for a codec name; 'none' stores raw chunks."""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}'. Use one of {CODECS}.")
+    if shuffle not in SHUFFLES:
+        raise ValueError(f"Unknown shuffle '{shuffle}'. Use one of {tuple(SHUFFLES)}.")
+    if codec == "none":
+        return None
+    return Blosc(cname=codec, clevel=clevel, shuffle=SHUFFLES[shuffle])
+
+
+def auto_chunks(shape: Sequence[int], dtype, axes: str, tile_size: int = VIEWER_TILE_SIZE) -> tuple:
+    """
+    Chunk shape for browser viewing: one z-slice per chunk, small channel counts interleaved,
+    and a square power-of-two y/x tile starting at the viewer tile size. The tile is halved
+    while a chunk exceeds ZARR_CHUNK_MAX_BYTES, doubled while it is under ZARR_CHUNK_MIN_BYTES
+    (and the image is big enough to fill it), and never larger than the image needs.
+    """
+    if len(axes) != len(shape):
+        raise ValueError(f"axes '{axes}' do not match shape {tuple(shape)}")
+    lead = tuple(
+        int(n) if ax == "c" and n <= MAX_CHUNK_CHANNELS else 1
+        for ax, n in zip(axes[:-2], shape[:-2])
+    )
+    per_pixel = np.dtype(dtype).itemsize * int(np.prod(lead, dtype=np.int64))
+    longest = max(int(shape[-2]), int(shape[-1]), 1)
+    side = 1 << max(int(tile_size) - 1, 1).bit_length()  # round up to a power of two
+    while side > MIN_CHUNK_SIDE and side * side * per_pixel > ZARR_CHUNK_MAX_BYTES:
+        side //= 2
+    while side < longest and side * side * per_pixel < ZARR_CHUNK_MIN_BYTES and (2 * side) ** 2 * per_pixel <= ZARR_CHUNK_MAX_BYTES:
+        side *= 2
+    fit = 1 << (longest - 1).bit_length()
+    side = max(1, min(side, fit))
+    return lead + (side, side)
+
+
+def downsample(arr: da.Array, method: str = PYRAMID_METHOD) -> da.Array:
+    """2x downsample of the last two (y, x) axes; odd trailing rows/cols are trimmed."""
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'. Use one of {DOWNSAMPLE_METHODS}.")
+    y_ax, x_ax = arr.ndim - 2, arr.ndim - 1
+    if method == "nearest":
+        h, w = (arr.shape[y_ax] // 2) * 2, (arr.shape[x_ax] // 2) * 2
+        return arr[..., 0:h:2, 0:w:2]
+    if method == "max":
+        return da.coarsen(np.max, arr, {y_ax: 2, x_ax: 2}, trim_excess=True)
+    out = da.coarsen(np.mean, arr, {y_ax: 2, x_ax: 2}, trim_excess=True)
+    if np.issubdtype(arr.dtype, np.integer):
+        out = da.round(out)
+    return out.astype(arr.dtype)
+
+
+def level_chunks(chunks: Sequence[int], shape: Sequence[int]) -> tuple:
+    """Clip a chunk shape to an array shape (lower pyramid levels shrink below the base chunk)."""
+    return tuple(max(1, min(int(c), int(s))) for c, s in zip(chunks, shape))
+
+
+def create_base_array(
+    group: zarr.Group,
+    shape: Sequence[int],
+    dtype,
+    axes: str,
+    chunks: Optional[Sequence[int]] = None,
+    codec: str = ZARR_CODEC,
+    clevel: int = ZARR_CLEVEL,
+    shuffle: str = ZARR_SHUFFLE,
+    tile_size: int = VIEWER_TILE_SIZE,
+    **array_kwargs,
+) -> zarr.Array:
+    """
+    Create the full-resolution array "0" so callers can stream data into it (e.g. slice by slice).
+    `chunks` defaults to auto_chunks() for the viewer tile size; codec/clevel/shuffle pick the
+    Blosc compressor. Chunks that are entirely fill value (e.g. padded canvas borders) are not
+    written; readers and the /data mount treat missing keys as fill value.
+    Extra keyword arguments are passed through to zarr array creation.
+    """
+    if chunks is None:
+        chunks = auto_chunks(shape, dtype, axes, tile_size)
+    array_kwargs.setdefault("compressor", make_compressor(codec, clevel, shuffle))
+    array_kwargs.setdefault("fill_value", 0)
+    array_kwargs.setdefault("write_empty_chunks", False)
+    return group.create_dataset(
+        "0",
+        shape=tuple(shape),
+        chunks=level_chunks(chunks, shape),
+        dtype=dtype,
+        overwrite=True,
+        **array_kwargs,
+    )
+
+
+def build_pyramid(
+    group: zarr.Group,
+    base: zarr.Array,
+    axes: str,
+    scale: Optional[Sequence[float]] = None,
+    levels: int = PYRAMID_LEVELS,
+    method: str = PYRAMID_METHOD,
+    stats: bool = True,
+) -> List[Dict]:
+    """
+    Write up to `levels - 1` downsampled copies of the on-disk `base` array under paths "1", "2", ...
+    plus the multiscales metadata. Each level is computed chunk-parallel by dask from the level
+    already on disk, so only one level's working set is in flight at a time. Lower levels reuse
+    the base array's chunking, compressor and fill-value handling. With `stats`, per-channel and
+    per-slice intensity histograms and contrast limits are computed from the base array (also
+    chunk-parallel) and stored in the `omero` block. Metadata is consolidated into .zmetadata last.
+    Returns the datasets list written to the multiscales block.
+    """
+    if levels < 1:
+        raise ValueError("levels must be >= 1")
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'. Use one of {DOWNSAMPLE_METHODS}.")
+    base_scale = list(scale) if scale is not None else [1.0] * base.ndim
+    datasets = []
+    target = base
+    for level in range(levels):
+        path = str(level)
+        if level > 0:
+            # Next level reads back from the store rather than holding the previous graph in memory
+            current = downsample(da.from_zarr(target), method)
+            target = group.create_dataset(
+                path,
+                shape=current.shape,
+                chunks=level_chunks(base.chunks, current.shape),
+                dtype=base.dtype,
+                compressor=base.compressor,
+                filters=base.filters,
+                fill_value=base.fill_value,
+                write_empty_chunks=base.write_empty_chunks,
+                overwrite=True,
+            )
+            da.store(current, target, lock=False)
+        factor = 2 ** level
+        level_scale = base_scale[:-2] + [base_scale[-2] * factor, base_scale[-1] * factor]
+        datasets.append({"path": path, "coordinateTransformations": [{"type": "scale", "scale": level_scale}]})
+        if min(target.shape[-2:]) < 2:
+            break
+    write_multiscales_metadata(group, datasets, axes=axes)
+    if stats:
+        write_intensity_metadata(group, base, axes)
+    consolidate(group)
+    return datasets
+
+
+def write_multiscale(
+    group: zarr.Group,
+    image,
+    axes: str,
+    chunks: Optional[Sequence[int]] = None,
+    scale: Optional[Sequence[float]] = None,
+    levels: int = PYRAMID_LEVELS,
+    method: str = PYRAMID_METHOD,
+    stats: bool = True,
+    **array_kwargs,
+) -> List[Dict]:
+    """
+    Write an in-memory or dask `image` as array "0" and build its pyramid (see create_base_array
+    and build_pyramid for chunking, codec and level options).
+    Returns the datasets list written to the multiscales block.
+    """
+    if levels < 1:
+        raise ValueError("levels must be >= 1")
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'. Use one of {DOWNSAMPLE_METHODS}.")
+    base = create_base_array(group, image.shape, image.dtype, axes, chunks=chunks, **array_kwargs)
+    data = image if isinstance(image, da.Array) else da.from_array(image, chunks=base.chunks)
+    da.store(data, base, lock=False)
+    return build_pyramid(group, base, axes, scale=scale, levels=levels, method=method, stats=stats)
+
+
+def consolidate(group: zarr.Group) -> None:
+    """Write .zmetadata for the group so readers open it in one request (call after the last attrs write)."""
+    zarr.consolidate_metadata(group.store, path=group.path)
+
+
+def read_contrast_limits(group: zarr.Group) -> Optional[tuple]:
+    """(start, end) display window spanning all channels from the omero block, if present."""
+    channels = (group.attrs.get("omero") or {}).get("channels") or []
+    windows = [ch["window"] for ch in channels if "start" in ch.get("window", {})]
+    if not windows:
+        return None
+    return min(w["start"] for w in windows), max(w["end"] for w in windows)
+
+
+def read_multiscales(group: zarr.Group) -> tuple:
+    """(axes string such as 'czyx', dataset paths from full resolution down) of an OME-Zarr group."""
+    ms = group.attrs["multiscales"][0]
+    axes = "".join(a["name"] if isinstance(a, dict) else a for a in ms["axes"])
+    return axes, [d["path"] for d in ms["datasets"]]
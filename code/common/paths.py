@@ -0,0 +1,21 @@
+"""
+Path helpers shared by the API and the ETL (kept free of web-framework imports).
+"""
+from pathlib import Path
+
+from code.config import ROOT
+
+
+def resolve_store_path(path_str: str) -> Path:
+    """
+    Parameters:
+        path_str (str): microscopy_files.path value.
+
+    Returns:
+        Path: Absolute store path (relative DB paths are taken from the project root).
+
+    Does:
+        Normalizes stored paths so API handlers and ETL backfills can open stores directly.
+    """
+    path = Path(path_str)
+    return path if path.is_absolute() else ROOT / path
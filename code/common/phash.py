@@ -0,0 +1,135 @@
+"""
+Perceptual hashes (64-bit dHash and pHash) of microscopy images plus a BK-tree for Hamming-radius
+lookups. Hashes are taken from a small, contrast-normalized grayscale copy, so re-encoded, resaved
+(PNG vs TIFF, 8 vs 16 bit) or slightly cropped/rescaled exports of a slide land within a few bits.
+"""
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import zarr
+from PIL import Image
+
+from code.common.omezarr import read_multiscales
+
+HASH_BITS = 64
+PHASH_SIZE = 32       # DCT input edge; the low 8x8 frequencies form the hash
+MIN_SOURCE_EDGE = 64  # coarsest pyramid level used must still have this many pixels per edge
+
+
+def _normalized_gray(plane: np.ndarray) -> np.ndarray:
+    """(c, y, x) or (y, x) -> float32 (y, x) in [0, 1], stretched between the 1st and 99th percentiles."""
+    gray = plane.astype(np.float32)
+    if gray.ndim == 3:
+        gray = gray.mean(axis=0)
+    lo, hi = np.percentile(gray, [1, 99])
+    if hi <= lo:
+        return np.zeros_like(gray)
+    return np.clip((gray - lo) / (hi - lo), 0, 1).astype(np.float32)
+
+
+def _resize(gray: np.ndarray, width: int, height: int) -> np.ndarray:
+    return np.asarray(Image.fromarray(gray, mode="F").resize((width, height), Image.BOX), dtype=np.float64)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel().astype(np.uint8)).tobytes(), "big")
+
+
+def dhash(plane: np.ndarray) -> int:
+    """Gradient hash: sign of horizontal differences on a 9x8 thumbnail."""
+    small = _resize(_normalized_gray(plane), 9, 8)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def phash(plane: np.ndarray) -> int:
+    """DCT hash: low 8x8 frequencies of a 32x32 thumbnail compared against their median."""
+    small = _resize(_normalized_gray(plane), PHASH_SIZE, PHASH_SIZE)
+    low = (_DCT @ small @ _DCT.T)[:8, :8]
+    return _pack(low > np.median(low))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed(h: int) -> int:
+    """Unsigned 64-bit hash -> value that fits a Postgres BIGINT."""
+    return h - (1 << HASH_BITS) if h >= 1 << (HASH_BITS - 1) else h
+
+
+def to_unsigned(h: int) -> int:
+    return h + (1 << HASH_BITS) if h < 0 else h
+
+
+def store_hashes(store: Path) -> Tuple[int, int]:
+    """
+    (phash, dhash) of an OME-Zarr store, computed from the middle z slice of the coarsest pyramid
+    level that still has MIN_SOURCE_EDGE pixels per edge (so only a few small chunks are read).
+    """
+    group = zarr.open_group(str(store), mode="r")
+    axes, paths = read_multiscales(group)
+    arrays = [group[p] for p in paths]
+    arr = arrays[0]
+    for candidate in arrays:
+        if min(candidate.shape[-2:]) >= MIN_SOURCE_EDGE:
+            arr = candidate
+    sel = []
+    for i, ax in enumerate(axes[:-2]):
+        sel.append(slice(None) if ax == "c" else arr.shape[i] // 2)
+    plane = np.asarray(arr[tuple(sel)])
+    return phash(plane), dhash(plane)
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes; radius searches prune subtrees by the triangle inequality."""
+
+    def __init__(self):
+        self._root: Optional[list] = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, h: int, item) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [h, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def search(self, h: int, radius: int) -> List[Tuple[int, object]]:
+        """(distance, item) pairs within `radius` bits, nearest first."""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda pair: pair[0])
+
+    @classmethod
+    def from_items(cls, pairs: Iterable[Tuple[int, object]]) -> "BKTree":
+        tree = cls()
+        for h, item in pairs:
+            tree.add(h, item)
+        return tree
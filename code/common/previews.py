@@ -0,0 +1,110 @@
+"""
+Per-slice WebP thumbnails packed into one sprite sheet with an index JSON.
+Written inside each OME-Zarr store (previews/) so a scrubber or list preview is one small request.
+"""
+import json
+import math
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import zarr
+from PIL import Image
+
+from code.common.omezarr import read_contrast_limits, read_multiscales
+from code.config import PREVIEW_QUALITY, PREVIEW_SIZE
+
+PREVIEW_DIR = "previews"
+SPRITE_NAME = "sprite.webp"
+INDEX_NAME = "index.json"
+
+
+def to_uint8(arr: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    """Linear contrast stretch of [lo, hi] to 0..255."""
+    if hi <= lo:
+        hi = lo + 1
+    scaled = (arr.astype(np.float32) - lo) * (255.0 / (hi - lo))
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def _preview_level(group: zarr.Group, paths, size: int) -> zarr.Array:
+    """Smallest pyramid level still at least `size` pixels on its long edge."""
+    chosen = group[paths[0]]
+    for path in paths[1:]:
+        arr = group[path]
+        if max(arr.shape[-2:]) < size:
+            break
+        chosen = arr
+    return chosen
+
+
+def _slices(arr: zarr.Array, axes: str):
+    """Yield 2D (y, x) or RGB (y, x, 3) planes, one per z-slice (a single plane without z)."""
+    n_z = arr.shape[axes.index("z")] if "z" in axes else 1
+    for z in range(n_z):
+        sel = []
+        for ax in axes[:-2]:
+            if ax == "z":
+                sel.append(z)
+            elif ax == "c":
+                sel.append(slice(0, 3) if arr.shape[axes.index("c")] == 3 else 0)
+            else:
+                sel.append(0)
+        plane = np.asarray(arr[tuple(sel)])
+        yield np.moveaxis(plane, 0, -1) if plane.ndim == 3 else plane
+
+
+def write_previews(
+    store: Path,
+    size: int = PREVIEW_SIZE,
+    quality: int = PREVIEW_QUALITY,
+    contrast: Optional[tuple] = None,
+) -> Dict:
+    """
+    Render one thumbnail per z-slice from a low pyramid level, pack them into a WebP sprite
+    sheet and write an index mapping slices to sprite rectangles. `contrast` is (lo, hi);
+    defaults to the omero contrast limits, else 0.1/99.9 percentiles of the preview level.
+    Returns the index dict.
+    """
+    group = zarr.open_group(str(store), mode="r")
+    axes, paths = read_multiscales(group)
+    level = _preview_level(group, paths, size)
+    if contrast is None:
+        contrast = read_contrast_limits(group)
+    if contrast is None:
+        sample = np.asarray(level[...])
+        lo, hi = (float(v) for v in np.percentile(sample, [0.1, 99.9]))
+    else:
+        lo, hi = contrast
+
+    h, w = level.shape[-2:]
+    ratio = min(size / h, size / w, 1.0)
+    tile_w, tile_h = max(1, round(w * ratio)), max(1, round(h * ratio))
+    planes = list(_slices(level, axes))
+    cols = max(1, math.ceil(math.sqrt(len(planes))))
+    rows = math.ceil(len(planes) / cols)
+    mode = "RGB" if planes and planes[0].ndim == 3 else "L"
+    sheet = Image.new(mode, (cols * tile_w, rows * tile_h))
+    slices = []
+    for i, plane in enumerate(planes):
+        thumb = Image.fromarray(to_uint8(plane, lo, hi), mode=mode).resize((tile_w, tile_h), Image.BILINEAR)
+        x, y = (i % cols) * tile_w, (i // cols) * tile_h
+        sheet.paste(thumb, (x, y))
+        slices.append({"z": i, "x": x, "y": y})
+
+    out = store / PREVIEW_DIR
+    out.mkdir(parents=True, exist_ok=True)
+    sheet.save(out / SPRITE_NAME, format="WEBP", quality=quality)
+    index = {
+        "sprite": SPRITE_NAME,
+        "tile_width": tile_w,
+        "tile_height": tile_h,
+        "columns": cols,
+        "rows": rows,
+        "count": len(planes),
+        "source_level": level.path.rsplit("/", 1)[-1],
+        "contrast_limits": [lo, hi],
+        "slices": slices,
+    }
+    (out / INDEX_NAME).write_text(json.dumps(index, indent=2))
+    return index
@@ -26,6 +26,68 @@ DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost/murthy_db")
 # Duplication detection
 OVERLAP_THRESHOLD = 0.8
 DUPLICATE_MESSAGE = "These microscopy images were already ingested."
+HASH_INSERT_PAGE_SIZE = 5000  # rows per set-based INSERT when recording batch/file hashes
+BULK_COPY_CHUNK_ROWS = 50_000  # rows serialized per CSV block streamed into COPY FROM STDIN
+# Per-worker Bloom filter of known hashes in front of the duplicate-check endpoints
+HASH_FILTER_FP_RATE = 0.001
+HASH_FILTER_MIN_CAPACITY = 100_000
+HASH_FILTER_REFRESH_SECONDS = 30    # pull rows added by other workers/ETL this often
+HASH_FILTER_RELOAD_SECONDS = 3600   # full rebuild (also after the filter outgrows its capacity)
+# Perceptual near-duplicate detection (64-bit pHash); distances are in bits
+PHASH_MAX_DISTANCE = 6
+PHASH_BLOCK_NEAR_DUPLICATES = os.getenv("PHASH_BLOCK_NEAR_DUPLICATES", "0") == "1"  # else only warn at ingest
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # I/O-bound per-file hashing threads for directories
+# Persistent digest cache keyed by (path, size, mtime_ns, inode); set HASH_CACHE_PATH="" to disable
+HASH_CACHE_PATH = os.getenv("HASH_CACHE_PATH", str(DATA_DIR / ".hash_cache.sqlite3"))
 
 # Subject ID validation
 ALLOWED_SUBJECT_PREFIXES = ("sub-rab", "sub-dbl")
+
+# OME-Zarr pyramids (levels counts the full-resolution level)
+PYRAMID_LEVELS = 5
+PYRAMID_METHOD = "mean"  # mean | nearest | max
+
+# OME-Zarr storage: chunk codec and chunk-shape heuristic inputs
+ZARR_CODEC = "zstd"  # zstd | lz4 | lz4hc | zlib | none
+ZARR_CLEVEL = 5
+ZARR_SHUFFLE = "bitshuffle"  # bitshuffle | shuffle | noshuffle
+VIEWER_TILE_SIZE = 512  # Viv renders one square power-of-two tile per chunk
+ZARR_CHUNK_MIN_BYTES = 256 * 1024
+ZARR_CHUNK_MAX_BYTES = 4 * 1024 * 1024
+
+# Intensity statistics stored in each store's omero block (display contrast defaults)
+INTENSITY_HIST_BINS = 256
+CONTRAST_PERCENTILES = (0.1, 99.9)
+
+# Per-slice preview thumbnails (sprite sheet written inside each store under previews/)
+PREVIEW_SIZE = 128
+PREVIEW_QUALITY = 80
+PREVIEW_CACHE_SECONDS = 365 * 24 * 3600
+
+# /zarr chunk route: in-memory LRU of hot chunks and metadata docs
+ZARR_CACHE_MAX_BYTES = 256 * 1024 * 1024
+ZARR_CACHE_MAX_ITEM_BYTES = 8 * 1024 * 1024  # larger files are served from disk uncached
+ZARR_CACHE_REVALIDATE_SECONDS = 5  # how often a store's .zattrs mtime is re-checked
+ZARR_CACHE_SECONDS = 365 * 24 * 3600  # URLs carry the digest + metadata hash, so responses are immutable
+ZARR_UNVERSIONED_CACHE_SECONDS = 60  # stores without a digest are served under /zarr/_/ and may change in place
+ZARR_BATCH_MAX_KEYS = 256  # chunk keys per POST /api/v1/zarr/{file_id}/chunks
+ZARR_BATCH_WORKERS = 8  # concurrent disk reads per batch
+
+# Server-side slice rendering (rendered images cached on disk, keyed by store digest + params)
+RENDER_CACHE_DIR = Path(os.getenv("RENDER_CACHE_DIR", str(ROOT / ".cache" / "render")))
+RENDER_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+RENDER_MAX_SIZE = 4096  # largest output edge a client may request
+RENDER_QUALITY = 85  # WebP/JPEG quality
+
+# ROI extraction (npy / tiff / zarr.zip crops streamed from a pyramid level)
+ROI_MAX_CONCURRENT = 2  # extractions running at once; further requests get 503
+ROI_MAX_BYTES = 2 * 1024 * 1024 * 1024  # uncompressed crop size limit
+
+# Projections (max/mean/sum along an axis) cached with the render cache
+PROJECTION_SIZE = 1024  # default level: coarsest whose long edge still covers this
+PROJECTION_PRECOMPUTE = (("max", "z"), ("mean", "z"))  # rendered after each upload
+
+# Deep-zoom tiles (DZI/TileJSON) rendered through the slice renderer and its disk cache
+TILE_SIZE = 256
+TILE_FORMAT = "webp"
+TILE_PREGENERATE_LEVELS = 2  # finer levels after the single-tile level rendered at upload (0 disables)
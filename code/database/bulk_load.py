@@ -0,0 +1,122 @@
+"""
+Bulk loading through Postgres COPY.
+Rows are streamed as CSV into a session-scoped temp table shaped like the target, then merged
+with INSERT ... SELECT ... ON CONFLICT DO NOTHING, all on the caller's connection and transaction.
+"""
+import io
+from typing import Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+from sqlalchemy import text
+
+from code.config import BULK_COPY_CHUNK_ROWS
+
+NULL_MARKER = r"\N"
+REGION_COUNTS_CONFLICT = ("subject_id", "region_id", "hemisphere")
+INTEGER_TYPES = ("smallint", "integer", "bigint")
+
+
+class _CsvStream(io.RawIOBase):
+    """File-like over an iterator of byte blocks, so COPY pulls CSV as it is produced."""
+
+    def __init__(self, blocks: Iterator[bytes]):
+        self._blocks = blocks
+        self._block = b""
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        wanted = size
+        while wanted != 0:
+            if self._pos >= len(self._block):
+                self._block, self._pos = next(self._blocks, None), 0
+                if self._block is None:
+                    self._block = b""
+                    break
+            end = len(self._block) if wanted < 0 else min(len(self._block), self._pos + wanted)
+            parts.append(self._block[self._pos:end])
+            if wanted > 0:
+                wanted -= end - self._pos
+            self._pos = end
+        return b"".join(parts)
+
+
+def column_types(conn, table: str) -> dict:
+    """{column: SQL type} for a table (temp tables included)."""
+    rows = conn.execute(
+        text(
+            "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = CAST(:t AS regclass) AND attnum > 0 AND NOT attisdropped"
+        ),
+        {"t": table},
+    ).fetchall()
+    return {name: sql_type for name, sql_type in rows}
+
+
+def _coerce(df: pd.DataFrame, types: dict) -> pd.DataFrame:
+    """Integer target columns that pandas holds as float (because of NaN) are written without '.0'."""
+    out = df
+    for col in df.columns:
+        if types.get(col, "").startswith(INTEGER_TYPES) and pd.api.types.is_float_dtype(df[col]):
+            if out is df:
+                out = df.copy()
+            out[col] = df[col].round().astype("Int64")
+    return out
+
+
+def csv_blocks(df: pd.DataFrame, chunk_rows: int = BULK_COPY_CHUNK_ROWS) -> Iterator[bytes]:
+    for start in range(0, len(df), max(1, chunk_rows)):
+        block = df.iloc[start:start + chunk_rows].to_csv(header=False, index=False, na_rep=NULL_MARKER)
+        yield block.encode("utf-8")
+
+
+def copy_merge(
+    conn,
+    rows: Union[pd.DataFrame, Sequence[dict]],
+    target: str,
+    conflict: Sequence[str],
+    columns: Optional[List[str]] = None,
+    chunk_rows: int = BULK_COPY_CHUNK_ROWS,
+) -> int:
+    """
+    Parameters:
+        conn: SQLAlchemy Connection inside a transaction (psycopg2 driver).
+        rows (DataFrame | list[dict]): Rows to load; column names match the target's.
+        target (str): Destination table.
+        conflict (list[str]): Conflict target columns; conflicting rows are skipped.
+        columns (list[str] | None): Columns to load; defaults to the columns of `rows` that the target has.
+        chunk_rows (int): Rows serialized per streamed CSV block.
+
+    Returns:
+        int: Rows inserted into the target.
+    """
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    if df.empty:
+        return 0
+    types = column_types(conn, target)
+    # Helper columns that the target does not have are dropped, as the old explicit SELECT lists did
+    cols = list(columns or [c for c in df.columns if c in types])
+    df = _coerce(df[cols], types)
+    col_sql = ", ".join(cols)
+    stage = f"_copy_{target}"
+    conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+    conn.execute(text(f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {col_sql} FROM {target} WITH NO DATA"))
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {stage} ({col_sql}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')",
+            _CsvStream(csv_blocks(df, chunk_rows)),
+        )
+    finally:
+        cursor.close()
+    inserted = conn.execute(
+        text(
+            f"INSERT INTO {target} ({col_sql}) SELECT {col_sql} FROM {stage} "
+            f"ON CONFLICT ({', '.join(conflict)}) DO NOTHING"
+        )
+    ).rowcount
+    conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+    return inserted or 0
@@ -2,16 +2,23 @@
 Duplicate detection for microscopy file ingestion.
 Stores batch/file hashes in dedicated tables and checks for overlap.
 """
-from typing import List, Optional, Union
+from typing import Iterable, List, Optional, Sequence, Set, Tuple, Union
 
 from sqlalchemy.engine import Connection
 from sqlalchemy import text
 
-from code.config import OVERLAP_THRESHOLD, DUPLICATE_MESSAGE
+from code.config import OVERLAP_THRESHOLD, DUPLICATE_MESSAGE, HASH_INSERT_PAGE_SIZE
+from code.database.hash_filter import known_hashes
+
+# (batch_checksum, note, file hashes)
+BatchHashes = Tuple[str, Optional[str], Sequence[str]]
 
 
 def ensure_batches_table(engine_or_conn: Union["Connection", object]):
-    """Make sure the hash tables exist before we touch them."""
+    """
+    Create the hash tables, duplicate-check indexes and perceptual-hash columns if missing. New databases get them from
+    schema.sql; this upgrades older ones and is run by the ETL and once per process by the API.
+    """
     ddl = """
     CREATE TABLE IF NOT EXISTS microscopy_batches (
         batch_checksum TEXT PRIMARY KEY,
@@ -23,6 +30,13 @@ def ensure_batches_table(engine_or_conn: Union["Connection", object]):
         file_sha TEXT NOT NULL,
         PRIMARY KEY(batch_checksum, file_sha)
     );
+    CREATE INDEX IF NOT EXISTS idx_microscopy_batch_files_sha ON microscopy_batch_files(file_sha);
+    CREATE INDEX IF NOT EXISTS idx_microscopy_files_sha256 ON microscopy_files(sha256);
+    CREATE INDEX IF NOT EXISTS idx_ingest_log_checksum ON ingest_log(checksum) WHERE status = 'success';
+    ALTER TABLE microscopy_files ADD COLUMN IF NOT EXISTS phash BIGINT;
+    ALTER TABLE microscopy_files ADD COLUMN IF NOT EXISTS dhash BIGINT;
+    ALTER TABLE microscopy_files ADD COLUMN IF NOT EXISTS phash_set_at TIMESTAMPTZ;
+    CREATE INDEX IF NOT EXISTS idx_microscopy_files_phash_set_at ON microscopy_files(phash_set_at);
     """
     if isinstance(engine_or_conn, Connection):
         engine_or_conn.execute(text(ddl))
@@ -31,19 +45,87 @@ def ensure_batches_table(engine_or_conn: Union["Connection", object]):
             conn.execute(text(ddl))
 
 
+# Database URLs whose hash tables were already checked by this process
+_schema_checked: Set[str] = set()
+
+
+def ensure_schema_once(engine) -> None:
+    """Run ensure_batches_table the first time this process talks to a database."""
+    url = str(engine.url)
+    if url not in _schema_checked:
+        ensure_batches_table(engine)
+        _schema_checked.add(url)
+
+
+def _pages(rows: Sequence, size: int):
+    for start in range(0, len(rows), max(1, size)):
+        yield rows[start:start + size]
+
+
+def insert_batch_hashes(conn: Connection, batches: Iterable[BatchHashes], page_size: int = HASH_INSERT_PAGE_SIZE) -> int:
+    """
+    Record batches and their file hashes with set-based INSERTs (unnest over array parameters,
+    `page_size` rows per statement) instead of one round trip per row. Returns how many batches were new.
+    """
+    batches = list(batches)
+    inserted = 0
+    for page in _pages(batches, page_size):
+        inserted += conn.execute(
+            text(
+                "INSERT INTO microscopy_batches (batch_checksum, note) "
+                "SELECT c, n FROM unnest(CAST(:c AS text[]), CAST(:n AS text[])) AS t(c, n) "
+                "ON CONFLICT DO NOTHING"
+            ),
+            {"c": [b[0] for b in page], "n": [b[1] or "" for b in page]},
+        ).rowcount
+    # Deduplicated and sorted so concurrent writers take row locks in the same order
+    pairs = sorted({(checksum, sha) for checksum, _, shas in batches for sha in shas})
+    for page in _pages(pairs, page_size):
+        conn.execute(
+            text(
+                "INSERT INTO microscopy_batch_files (batch_checksum, file_sha) "
+                "SELECT c, s FROM unnest(CAST(:c AS text[]), CAST(:s AS text[])) AS t(c, s) "
+                "ON CONFLICT DO NOTHING"
+            ),
+            {"c": [p[0] for p in page], "s": [p[1] for p in page]},
+        )
+    return inserted
+
+
 def register_batch(engine, batch_checksum: str, file_hashes: List[str], note: Optional[str] = None):
     """Remember a batch and its file hashes after we accept an upload."""
-    ensure_batches_table(engine)
+    ensure_schema_once(engine)
     with engine.begin() as conn:
-        conn.execute(
-            text("INSERT INTO microscopy_batches (batch_checksum, note) VALUES (:c, :n) ON CONFLICT DO NOTHING"),
-            {"c": batch_checksum, "n": note or ""},
-        )
-        for sha in file_hashes:
-            conn.execute(
-                text("INSERT INTO microscopy_batch_files (batch_checksum, file_sha) VALUES (:c, :s) ON CONFLICT DO NOTHING"),
-                {"c": batch_checksum, "s": sha},
-            )
+        insert_batch_hashes(conn, [(batch_checksum, note, file_hashes)])
+    known_hashes.add(batch_checksum, *file_hashes)
+
+
+# Every duplicate rule in one round trip. CASE branches are uncorrelated subqueries, which Postgres
+# evaluates lazily, so later (costlier) rules only run when earlier ones did not match.
+# Each rule is served by an index: idx_ingest_log_checksum, the microscopy_batches primary key,
+# idx_microscopy_files_sha256 (compared as CHAR(64) so the index applies) and idx_microscopy_batch_files_sha.
+DUPLICATE_CHECK_SQL = text("""
+WITH best_overlap AS (
+    SELECT COUNT(DISTINCT file_sha) AS n
+    FROM microscopy_batch_files
+    WHERE file_sha = ANY(CAST(:shas AS text[]))
+    GROUP BY batch_checksum
+    ORDER BY n DESC
+    LIMIT 1
+)
+SELECT CASE
+    WHEN EXISTS (
+        SELECT 1 FROM ingest_log
+        WHERE checksum = :c AND status = 'success' AND message LIKE 'microscopy%'
+    ) THEN 'batch match'
+    WHEN EXISTS (SELECT 1 FROM microscopy_batches WHERE batch_checksum = :c) THEN 'batch seen'
+    WHEN EXISTS (
+        SELECT 1 FROM microscopy_files WHERE sha256 = ANY(CAST(:shas AS CHAR(64)[]))
+    ) THEN 'file hash match'
+    WHEN (SELECT n FROM best_overlap) = :n THEN 'exact set match'
+    WHEN (SELECT n FROM best_overlap) >= :k THEN 'strong overlap'
+END AS reason
+""")
 
 
 def check_microscopy_duplicate(
@@ -54,58 +136,13 @@ def check_microscopy_duplicate(
 ):
     """
         Checks ingest_log, existing batches, per-file hashes, exact set matches,
-        and strong overlap to flag duplicates.
+        and strong overlap to flag duplicates, in that order, with a single query.
     """
-    ensure_batches_table(engine)
+    ensure_schema_once(engine)
+    k = max(1, int(len(file_hashes) * overlap_threshold))
     with engine.connect() as conn:
-        dup_batch = conn.execute(
-            text("SELECT 1 FROM ingest_log WHERE checksum = :c AND status = 'success' AND message LIKE 'microscopy%' LIMIT 1"),
-            {"c": batch_checksum},
-        ).first()
-        if dup_batch:
-            return f"{DUPLICATE_MESSAGE} (batch match)."
-
-        batch_seen = conn.execute(
-            text("SELECT 1 FROM microscopy_batches WHERE batch_checksum = :c LIMIT 1"),
-            {"c": batch_checksum},
-        ).first()
-        if batch_seen:
-            return f"{DUPLICATE_MESSAGE} (batch seen)."
-
-        if file_hashes:
-            dup_file = conn.execute(
-                text("SELECT 1 FROM microscopy_files WHERE sha256 = ANY(:shas) LIMIT 1"),
-                {"shas": file_hashes},
-            ).first()
-            if dup_file:
-                return f"{DUPLICATE_MESSAGE} (file hash match)."
-
-            subset_match = conn.execute(
-                text(
-                    "SELECT batch_checksum FROM microscopy_batch_files "
-                    "WHERE file_sha = ANY(:shas) "
-                    "GROUP BY batch_checksum "
-                    "HAVING COUNT(DISTINCT file_sha) = :n "
-                    "LIMIT 1"
-                ),
-                {"shas": file_hashes, "n": len(file_hashes)},
-            ).first()
-            if subset_match:
-                return f"{DUPLICATE_MESSAGE} (exact set match)."
-
-            k = max(1, int(len(file_hashes) * overlap_threshold))
-            overlap_match = conn.execute(
-                text(
-                    "SELECT batch_checksum FROM microscopy_batch_files "
-                    "WHERE file_sha = ANY(:shas) "
-                    "GROUP BY batch_checksum "
-                    "HAVING COUNT(DISTINCT file_sha) >= :k "
-                    "ORDER BY COUNT(DISTINCT file_sha) DESC "
-                    "LIMIT 1"
-                ),
-                {"shas": file_hashes, "k": k},
-            ).first()
-            if overlap_match:
-                return f"{DUPLICATE_MESSAGE} (strong overlap)."
-
-    return None
+        reason = conn.execute(
+            DUPLICATE_CHECK_SQL,
+            {"c": batch_checksum, "shas": list(file_hashes), "n": len(file_hashes), "k": k},
+        ).scalar()
+    return f"{DUPLICATE_MESSAGE} ({reason})." if reason else None
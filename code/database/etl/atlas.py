@@ -4,7 +4,8 @@ Reason: isolated Allen atlas JSON flattening into brain_regions.
 """
 import json
 import pandas as pd
-from sqlalchemy import text, types as satypes
+from sqlalchemy import text
+from code.database.bulk_load import copy_merge
 from .paths import ATLAS_JSON
 
 
@@ -35,34 +36,7 @@ def load_atlas(engine):
     atlas_rows = flatten_atlas(root_node)
     atlas_df = pd.DataFrame(atlas_rows).drop_duplicates(subset=["region_id"])
     with engine.begin() as conn:
-        brain_stage = "_brain_regions_stage"
-        atlas_df.to_sql(
-            brain_stage,
-            con=conn,
-            if_exists="replace",
-            index=False,
-            method="multi",
-            dtype={
-                "region_id": satypes.Integer(),
-                "name": satypes.String(255),
-                "acronym": satypes.String(50),
-                "parent_id": satypes.Integer(),
-                "st_level": satypes.Integer(),
-                "atlas_id": satypes.Integer(),
-                "ontology_id": satypes.Integer(),
-            },
-        )
-        conn.execute(
-            text(
-                f"""
-                INSERT INTO brain_regions (region_id, name, acronym, parent_id, st_level, atlas_id, ontology_id)
-                SELECT region_id, name, acronym, parent_id, st_level, atlas_id, ontology_id
-                FROM {brain_stage}
-                ON CONFLICT (region_id) DO NOTHING;
-                """
-            )
-        )
-        conn.execute(text(f"DROP TABLE IF EXISTS {brain_stage};"))
+        copy_merge(conn, atlas_df, "brain_regions", ["region_id"])
         conn.execute(
             text("""
                 INSERT INTO units (name, description) VALUES
@@ -4,9 +4,11 @@ Reason: register microscopy sessions/files from raw_bids with hash dedupe.
 """
 import re
 import pandas as pd
-from sqlalchemy import text, types as satypes
+from sqlalchemy import text
+from code.database.bulk_load import copy_merge
 from .paths import BIDS_ROOT
 from .utils import file_sha256, detect_hemisphere
+from code.common.hashing import sidecar_sha256
 
 
 def load_bids_files(engine, stats: dict, existing_hashes: set | None = None, allowed_subjects: set | None = None):
@@ -57,7 +59,11 @@ def load_bids_files(engine, stats: dict, existing_hashes: set | None = None, all
         # Hemisphere not encoded in filename anymore,
         # detect from path/name hints.
         hemisphere = detect_hemisphere(zarr.parent.as_posix(), filename)
-        sha = file_sha256(zarr)
+        # Prefer the digest recorded at write time, only walk the store for legacy outputs
+        sha = sidecar_sha256(zarr)
+        if sha is None:
+            stats["microscopy_hashed_store"] = stats.get("microscopy_hashed_store", 0) + 1
+            sha = file_sha256(zarr, write_manifest=True)  # sibling manifest: later runs only re-read changed files
         if sha in existing_hashes:
             stats["microscopy_skipped_dupe"] = stats.get("microscopy_skipped_dupe", 0) + 1
             continue
@@ -115,90 +121,14 @@ def load_bids_files(engine, stats: dict, existing_hashes: set | None = None, all
     with engine.begin() as conn:
         if subjects_rows:
             df_subj = pd.DataFrame(subjects_rows).drop_duplicates(subset=["subject_id"])
-            subj_stage = "_subjects_stage"
-            df_subj.to_sql(
-                subj_stage,
-                con=conn,
-                if_exists="replace",
-                index=False,
-                method="multi",
-                dtype={
-                    "subject_id": satypes.String(50),
-                    "original_id": satypes.String(100),
-                    "sex": satypes.String(1),
-                    "experiment_type": satypes.String(50),
-                    "details": satypes.Text(),
-                },
-            )
-            conn.execute(
-                text(
-                    f"""
-                    INSERT INTO subjects (subject_id, original_id, sex, experiment_type, details)
-                    SELECT subject_id, original_id, sex, experiment_type, details
-                    FROM {subj_stage}
-                    ON CONFLICT (subject_id) DO NOTHING;
-                    """
-                )
-            )
-            conn.execute(text(f"DROP TABLE IF EXISTS {subj_stage};"))
+            copy_merge(conn, df_subj, "subjects", ["subject_id"])
         if sessions_rows:
             df_sess = pd.DataFrame(sessions_rows).drop_duplicates(subset=["session_id"])
-            sessions_stage = "_sessions_stage"
-            df_sess.to_sql(
-                sessions_stage,
-                con=conn,
-                if_exists="replace",
-                index=False,
-                method="multi",
-                dtype={
-                    "session_id": satypes.String(50),
-                    "subject_id": satypes.String(50),
-                    "modality": satypes.String(50),
-                    "session_date": satypes.Date(),
-                    "protocol": satypes.Text(),
-                    "notes": satypes.Text(),
-                },
-            )
-            conn.execute(
-                text(
-                    f"""
-                    INSERT INTO sessions (session_id, subject_id, modality, session_date, protocol, notes)
-                    SELECT session_id, subject_id, modality, session_date, protocol, notes
-                    FROM {sessions_stage}
-                    ON CONFLICT (session_id) DO NOTHING;
-                    """
-                )
-            )
-            conn.execute(text(f"DROP TABLE IF EXISTS {sessions_stage};"))
+            copy_merge(conn, df_sess, "sessions", ["session_id"])
             stats["sessions_from_bids"] = stats.get("sessions_from_bids", 0) + len(df_sess)
         if files_rows:
             df_files = pd.DataFrame(files_rows).drop_duplicates(subset=["session_id", "run", "hemisphere"])
-            files_stage = "_microscopy_files_stage"
-            df_files.to_sql(
-                files_stage,
-                con=conn,
-                if_exists="replace",
-                index=False,
-                method="multi",
-                dtype={
-                    "session_id": satypes.String(50),
-                    "run": satypes.Integer(),
-                    "hemisphere": satypes.String(20),
-                    "path": satypes.Text(),
-                    "sha256": satypes.String(64),
-                },
-            )
-            conn.execute(
-                text(
-                    f"""
-                    INSERT INTO microscopy_files (session_id, run, hemisphere, path, sha256)
-                    SELECT session_id, run, hemisphere, path, sha256
-                    FROM {files_stage}
-                    ON CONFLICT (session_id, run, hemisphere) DO NOTHING;
-                    """
-                )
-            )
-            conn.execute(text(f"DROP TABLE IF EXISTS {files_stage};"))
+            copy_merge(conn, df_files, "microscopy_files", ["session_id", "run", "hemisphere"])
             stats["microscopy_inserted"] = stats.get("microscopy_inserted", 0) + len(df_files)
 
 
@@ -0,0 +1,65 @@
+"""
+Backfill consolidated metadata (.zmetadata) for OME-Zarr stores written before it was emitted at
+write time, so viewers can open each store in one request.
+"""
+import argparse
+from pathlib import Path
+
+import zarr
+
+from .paths import BIDS_ROOT
+
+METADATA_NAMES = (".zgroup", ".zattrs", ".zarray")
+
+
+def find_stores(root: Path):
+    """Top-level *.zarr directories (holding a .zgroup) under root, sorted."""
+    return sorted(p for p in root.rglob("*.zarr") if p.is_dir() and (p / ".zgroup").is_file()
+                  and not any(parent.suffix == ".zarr" for parent in p.parents))
+
+
+def is_consolidated(store: Path) -> bool:
+    """True when .zmetadata exists and is newer than every metadata document in the store."""
+    consolidated = store / ".zmetadata"
+    if not consolidated.is_file():
+        return False
+    written = consolidated.stat().st_mtime_ns
+    for name in METADATA_NAMES:
+        for doc in store.rglob(name):
+            if doc.stat().st_mtime_ns > written:
+                return False
+    return True
+
+
+def consolidate_store(store: Path, force: bool = False) -> str:
+    """Write .zmetadata for one store; returns 'consolidated' or 'up-to-date'."""
+    if not force and is_consolidated(store):
+        return "up-to-date"
+    zarr.consolidate_metadata(zarr.DirectoryStore(str(store)))
+    return "consolidated"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Write consolidated .zmetadata for existing OME-Zarr stores.")
+    ap.add_argument("--root", type=Path, default=BIDS_ROOT, help="Directory searched for *.zarr stores")
+    ap.add_argument("--force", action="store_true", help="Rewrite .zmetadata even when it is current")
+    args = ap.parse_args()
+
+    results = {}
+    for store in find_stores(args.root):
+        try:
+            results[store] = consolidate_store(store, force=args.force)
+        except Exception as exc:
+            print(f"  Failed {store}: {exc}")
+            results[store] = "failed"
+        else:
+            print(f"  {results[store]}: {store.relative_to(args.root)}")
+    print("\nSummary:")
+    for status in sorted(set(results.values())):
+        print(f"  {status}: {sum(1 for v in results.values() if v == status)}")
+    if "failed" in results.values():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,108 @@
+import argparse
+import hashlib
+import json
 import os
 import re
 import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import dask
 import numpy as np
 import zarr
+from PIL import Image
 from skimage.io import imread
 from ome_zarr.io import parse_url
-from ome_zarr.writer import write_image
-try:
-    from ome_zarr.scale import Scaler
-except ImportError:
-    # Fallback if Scaler import fails (e.g., due to numpy/skimage version issues)
-    Scaler = None
 
 from code.database.etl.subject_map import SUBJECT_MAP
+from code.common.hashing import PixelDigest, SIDECAR_DIGEST_KEY
+from code.common.previews import write_previews
+from code.common.omezarr import CODECS, DOWNSAMPLE_METHODS, build_pyramid, create_base_array
+from code.config import PYRAMID_LEVELS, PYRAMID_METHOD, VIEWER_TILE_SIZE, ZARR_CODEC
 
 SOURCE_ROOT = os.path.join("data", "sourcedata", "images")
 BIDS_ROOT = os.path.join("data", "raw_bids")
 
+# Sidecar key recording what a store was built from (source file set + conversion options)
+SOURCE_FINGERPRINT_KEY = "SourceFingerprint"
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Slice-number suffix followed by a supported image extension
+SLICE_EXT_PATTERN = r'{}(?:\.ome)?\.(?:png|tiff?|jpe?g)$'
+
+# PIL mode -> decoded dtype (RGB/palette images are averaged to grayscale of the same dtype)
+MODE_DTYPES = {"1": np.bool_, "I;16": np.uint16, "I;16B": np.uint16, "I;16L": np.uint16, "I": np.int32, "F": np.float32}
+
 
 def extract_slice_number(filename):
     """
     Robustly finds the slice number to sort images correctly.
-    Targeting patterns like: '...s001.png' or '...s59.png'
+    Targeting patterns like: '...s001.png' or '...s59.png' (also .tif/.tiff/.jpg/.ome.tif uploads)
     """
     # Strategy 1: Look for 's' followed by digits (e.g., s001)
-    match = re.search(r's(\d+)\.png$', filename, re.IGNORECASE)
+    match = re.search(SLICE_EXT_PATTERN.format(r's(\d+)'), filename, re.IGNORECASE)
     if match:
         return int(match.group(1))
 
     # Strategy 2: Fallback to any digits at the end
-    match_fallback = re.search(r'(\d+)\.png$', filename, re.IGNORECASE)
+    match_fallback = re.search(SLICE_EXT_PATTERN.format(r'(\d+)'), filename, re.IGNORECASE)
     if match_fallback:
         return int(match_fallback.group(1))
 
     return 9999  # If no number found, push to end
 
 
-def convert_subject(folder_name, metadata):
+def read_dimensions(path):
+    """Height, width and pixel dtype from the image header, without decoding pixels."""
+    Image.MAX_IMAGE_PIXELS = None  # whole-brain slides exceed PIL's decompression-bomb guard
+    with Image.open(path) as im:
+        w, h = im.size
+        return h, w, np.dtype(MODE_DTYPES.get(im.mode, np.uint8))
+
+
+def source_fingerprint(source_dir, files, options):
+    """
+    Cheap hash of the source file set (name, size, mtime) plus conversion options.
+    Stat-only so an up-to-date check never decodes or reads the PNGs.
+    """
+    h = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    for f in sorted(files):
+        st = os.stat(os.path.join(source_dir, f))
+        h.update(f"{f}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def is_up_to_date(store_path, fingerprint):
+    """True when the store exists and its sidecar records the same source fingerprint."""
+    if not os.path.exists(os.path.join(store_path, "0", ".zarray")):
+        return False
+    try:
+        with open(store_path + ".json") as f:
+            return json.load(f).get(SOURCE_FINGERPRINT_KEY) == fingerprint
+    except (OSError, ValueError):
+        return False
+
+
+def convert_subject(folder_name, metadata, levels=PYRAMID_LEVELS, method=PYRAMID_METHOD,
+                    codec=ZARR_CODEC, tile_size=VIEWER_TILE_SIZE, force=False):
+    """Convert one raw slice folder; returns 'converted', 'up-to-date', 'missing' or 'empty'."""
     source_dir = os.path.join(SOURCE_ROOT, folder_name)
 
     # Safety Check: Does source exist?
     if not os.path.exists(source_dir):
         print(f"[SKIP] {folder_name}: Folder not found in {SOURCE_ROOT}")
-        return
-
-    print(f"\nProcessing {folder_name} -> {metadata['subject']}...")
+        return "missing"
 
     # 1. Get and Sort Files
     files = [f for f in os.listdir(source_dir) if f.endswith('.png')]
     files.sort(key=extract_slice_number)
 
     if not files:
-        print("  [ERROR] No PNGs found!")
-        return
+        print(f"  [ERROR] {folder_name}: No PNGs found!")
+        return "empty"
 
-    print(f"  Found {len(files)} slices. Range: {files[0]} ... {files[-1]}")
-
-    # 2. DEFINE OUTPUT & CLEAN UP
+    # 2. DEFINE OUTPUT, SKIP IF UP TO DATE, CLEAN UP
     # Structure: raw_bids/sub-XX/ses-XX/micr/
     output_dir = os.path.join(
         BIDS_ROOT,
@@ -64,6 +110,18 @@ def convert_subject(folder_name, metadata):
         metadata['session'],
         'micr'
     )
+    sample_label = "sample-01"
+    zarr_filename = f"{metadata['subject']}_{metadata['session']}_{sample_label}_run-01_micr.ome.zarr"
+    store_path = os.path.join(output_dir, zarr_filename)
+
+    options = {"levels": levels, "method": method, "codec": codec, "tile_size": tile_size}
+    fingerprint = source_fingerprint(source_dir, files, options)
+    if not force and is_up_to_date(store_path, fingerprint):
+        print(f"[UP-TO-DATE] {folder_name} -> {metadata['subject']}")
+        return "up-to-date"
+
+    print(f"\nProcessing {folder_name} -> {metadata['subject']}...")
+    print(f"  Found {len(files)} slices. Range: {files[0]} ... {files[-1]}")
 
     # AUTO-CLEAN: If this folder exists from a failed run, delete it first.
     if os.path.exists(output_dir):
@@ -74,19 +132,13 @@ def convert_subject(folder_name, metadata):
 
     # 3. PRE-SCAN: Find Max Dimensions (The Canvas Method)
     # We must scan all images to ensure the volume is big enough for the largest slice.
+    # Only image headers are read here; pixels are decoded once, in step 5.
     print("  Scanning dimensions to create a unified volume...")
     max_h, max_w = 0, 0
     temp_dtype = None
 
     for f in files:
-        img_path = os.path.join(source_dir, f)
-        img = imread(img_path)
-
-        # Get shape (Handle RGB vs Grayscale)
-        if len(img.shape) == 3:
-            h, w = img.shape[:2]
-        else:
-            h, w = img.shape
+        h, w, dtype = read_dimensions(os.path.join(source_dir, f))
 
         if h > max_h:
             max_h = h
@@ -94,15 +146,22 @@ def convert_subject(folder_name, metadata):
             max_w = w
 
         if temp_dtype is None:
-            temp_dtype = img.dtype
+            temp_dtype = dtype
 
     print(f"  Max Canvas Size Detected: {max_h} x {max_w}")
 
-    # 4. Create the Empty Volume (Black Canvas)
-    volume = np.zeros((len(files), max_h, max_w), dtype=temp_dtype)
+    # 4. Create the target array up front (Black Canvas on disk, never in RAM)
+    print(f"  Writing OME-Zarr to {store_path}...")
+    store = parse_url(store_path, mode="w").store
+    # zarr 2.x always writes v2 format (compatible with Viv/Vizarr)
+    root = zarr.group(store=store)
+    # Chunks are (1, tile, tile): load 1 slice at a time, in viewer-sized pixel tiles.
+    base = create_base_array(root, (len(files), max_h, max_w), temp_dtype, axes="zyx", codec=codec, tile_size=tile_size)
+    digest = PixelDigest(base.shape, base.dtype)
 
-    # 5. Load and Center Images
+    # 5. Load, Center and Write each slice as it is decoded (peak memory ~ one slice)
     print("  Stacking and Centering images...")
+    canvas = np.zeros((max_h, max_w), dtype=temp_dtype)
     for i, f in enumerate(files):
         img = imread(os.path.join(source_dir, f))
 
@@ -116,48 +175,111 @@ def convert_subject(folder_name, metadata):
         y_off = (max_h - h) // 2
         x_off = (max_w - w) // 2
 
-        # Insert image into the volume using slicing
-        volume[i, y_off:y_off + h, x_off:x_off + w] = img
-
-    # 6. Write to OME-Zarr
-    sample_label = "sample-01"
-    zarr_filename = f"{metadata['subject']}_{metadata['session']}_{sample_label}_run-01_micr.ome.zarr"
-    store_path = os.path.join(output_dir, zarr_filename)
-
-    print(f"  Writing OME-Zarr to {store_path}...")
-    store = parse_url(store_path, mode="w").store
-    # zarr 2.x always writes v2 format (compatible with Viv/Vizarr)
-    root = zarr.group(store=store)
-
-    # Create multiscale pyramid for efficient web viewing
-    # This creates multiple resolution levels (e.g., 1x, 2x, 4x downsampled)
-    # Scaler() with default settings creates a 2x downsampling pyramid
-    scaler = Scaler() if Scaler is not None else None
-    
-    if scaler is None:
-        print("  WARNING: Scaler not available (numpy/skimage version issue). Creating single-scale OME-Zarr.")
-        print("  For multiscale support, update numpy/skimage versions: pip install --upgrade numpy scikit-image")
-    
-    # Write the image with 3D chunks and multiscale pyramid.
-    # (1, 1024, 1024) means "Load 1 slice at a time, in 1024x1024 pixel tiles"
-    write_image(
-        image=volume, 
-        group=root, 
-        axes="zyx", 
-        scaler=scaler,  # Use scaler to create multiscale pyramid (required for Viv/Vizarr)
-        storage_options=dict(chunks=(1, 1024, 1024))
-    )
-    print("  Done.")
+        canvas[:] = 0
+        canvas[y_off:y_off + h, x_off:x_off + w] = img
+        base[i] = canvas
+        digest.update(canvas)
+
+    # 6. Multiscale pyramid (required for Viv/Vizarr), built from the on-disk array.
+    # Each level halves y/x and is computed in parallel by dask from the level on disk.
+    build_pyramid(root, base, axes="zyx", levels=levels, method=method)
+
+    # Per-slice thumbnails for scrubbers/list previews (one sprite sheet + index)
+    write_previews(Path(store_path))
+
+    # 7. Sidecar with the pixel digest so ETL registration never re-walks the store
+    sidecar = {
+        "BIDSVersion": "1.8.0",
+        "Modality": "micr",
+        "Subject": metadata['subject'],
+        "Session": metadata['session'],
+        "Run": 1,
+        "Sample": sample_label,
+        "SourceFolder": folder_name,
+        "GeneratedAt": datetime.utcnow().isoformat() + "Z",
+        SIDECAR_DIGEST_KEY: digest.hexdigest(),
+        SOURCE_FINGERPRINT_KEY: fingerprint,
+    }
+    with open(store_path + ".json", "w") as f:
+        json.dump(sidecar, f, indent=2)
+    print(f"  Done: {folder_name}.")
+    return "converted"
+
+
+def _convert_in_worker(folder_name, metadata, options, dask_threads):
+    # Split the cores between worker processes so dask pyramid threads don't oversubscribe
+    with dask.config.set(scheduler="threads", num_workers=dask_threads):
+        return convert_subject(folder_name, metadata, **options)
+
+
+def select_subjects(subjects=None):
+    """SUBJECT_MAP entries matching raw folder names or BIDS subject ids (all when subjects is empty)."""
+    if not subjects:
+        return dict(SUBJECT_MAP)
+    wanted = set(subjects)
+    selected = {raw: meta for raw, meta in SUBJECT_MAP.items() if raw in wanted or meta["subject"] in wanted}
+    unknown = wanted - set(selected) - {meta["subject"] for meta in selected.values()}
+    if unknown:
+        raise ValueError(f"Unknown subject(s) {sorted(unknown)}; use raw folder names or subject ids from subject_map.py")
+    return selected
+
+
+def convert_all(subjects=None, workers=DEFAULT_WORKERS, force=False, **options):
+    """Convert selected subjects, concurrently when workers > 1. Returns {raw_folder: status}."""
+    selected = select_subjects(subjects)
+    results = {}
+    if workers <= 1 or len(selected) <= 1:
+        for raw_folder, meta in selected.items():
+            results[raw_folder] = convert_subject(raw_folder, meta, force=force, **options)
+        return results
+
+    dask_threads = max(1, (os.cpu_count() or 1) // workers)
+    options = dict(options, force=force)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_convert_in_worker, raw_folder, meta, options, dask_threads): raw_folder
+            for raw_folder, meta in selected.items()
+        }
+        for fut in as_completed(futures):
+            raw_folder = futures[fut]
+            try:
+                results[raw_folder] = fut.result()
+            except Exception as exc:
+                print(f"  [ERROR] {raw_folder}: {exc}")
+                results[raw_folder] = "failed"
+    return results
 
 
 def main():
+    ap = argparse.ArgumentParser(description="Convert raw PNG slice folders to multiscale OME-Zarr.")
+    ap.add_argument("--levels", type=int, default=PYRAMID_LEVELS, help="Resolution levels including full resolution")
+    ap.add_argument("--downsample", default=PYRAMID_METHOD, choices=DOWNSAMPLE_METHODS, help="Pyramid downsampling method")
+    ap.add_argument("--codec", default=ZARR_CODEC, choices=CODECS, help="Blosc chunk codec")
+    ap.add_argument("--tile-size", type=int, default=VIEWER_TILE_SIZE, help="Viewer tile size used to pick chunk shape")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Subjects converted concurrently (1 = serial)")
+    ap.add_argument("--subjects", nargs="+", help="Only convert these raw folders / subject ids")
+    ap.add_argument("--force", action="store_true", help="Rebuild even when the source fingerprint is unchanged")
+    args = ap.parse_args()
+
     # Ensure output root exists
     if not os.path.exists(BIDS_ROOT):
         os.makedirs(BIDS_ROOT)
 
-    # Loop through every mouse defined in subject_map.py
-    for raw_folder, meta in SUBJECT_MAP.items():
-        convert_subject(raw_folder, meta)
+    # Every mouse defined in subject_map.py (or the --subjects subset)
+    results = convert_all(
+        args.subjects,
+        workers=args.workers,
+        force=args.force,
+        levels=args.levels,
+        method=args.downsample,
+        codec=args.codec,
+        tile_size=args.tile_size,
+    )
+    print("\nSummary:")
+    for status in sorted(set(results.values())):
+        print(f"  {status}: {sum(1 for v in results.values() if v == status)}")
+    if "failed" in results.values():
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
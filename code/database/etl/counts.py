@@ -6,7 +6,8 @@ Now reuses the same upload helper to avoid drift.
 import os
 from pathlib import Path
 import pandas as pd
-from sqlalchemy import text, types as satypes
+from sqlalchemy import text
+from code.database.bulk_load import REGION_COUNTS_CONFLICT, copy_merge
 from .utils import (
     detect_hemisphere,
     get_or_create_session_id,
@@ -153,103 +154,18 @@ def insert_counts(engine, count_rows, session_rows_from_counts, extra_regions):
     if not count_rows and not extra_regions and not session_rows_from_counts:
         return
     import pandas as pd
-    from sqlalchemy import text, types as satypes
 
     with engine.begin() as conn:
         if session_rows_from_counts:
             df_sess_counts = pd.DataFrame(session_rows_from_counts).drop_duplicates(subset=["session_id"])
-            sess_stage = "_sessions_counts_stage"
-            df_sess_counts.to_sql(
-                sess_stage,
-                con=conn,
-                if_exists="replace",
-                index=False,
-                method="multi",
-                dtype={
-                    "session_id": satypes.String(50),
-                    "subject_id": satypes.String(50),
-                    "modality": satypes.String(50),
-                    "session_date": satypes.Date(),
-                    "protocol": satypes.Text(),
-                    "notes": satypes.Text(),
-                },
-            )
-            conn.execute(
-                text(
-                    f"""
-                    INSERT INTO sessions (session_id, subject_id, modality, session_date, protocol, notes)
-                    SELECT session_id, subject_id, modality, session_date, protocol, notes
-                    FROM {sess_stage}
-                    ON CONFLICT (session_id) DO NOTHING;
-                    """
-                )
-            )
-            conn.execute(text(f"DROP TABLE IF EXISTS {sess_stage};"))
+            copy_merge(conn, df_sess_counts, "sessions", ["session_id"])
 
         if extra_regions:
             df_extra = pd.DataFrame(extra_regions).drop_duplicates(subset=["region_id"])
             if not df_extra.empty:
-                extra_stage = "_brain_regions_extra_stage"
-                df_extra.to_sql(
-                    extra_stage,
-                    con=conn,
-                    if_exists="replace",
-                    index=False,
-                    method="multi",
-                    dtype={
-                        "region_id": satypes.Integer(),
-                        "name": satypes.String(255),
-                        "acronym": satypes.String(50),
-                        "parent_id": satypes.Integer(),
-                        "st_level": satypes.Integer(),
-                        "atlas_id": satypes.Integer(),
-                        "ontology_id": satypes.Integer(),
-                    },
-                )
-                conn.execute(text(f"""
-                    INSERT INTO brain_regions (region_id, name, acronym, parent_id, st_level, atlas_id, ontology_id)
-                    SELECT region_id, name, acronym, parent_id, st_level, atlas_id, ontology_id
-                    FROM {extra_stage}
-                    ON CONFLICT (region_id) DO NOTHING;
-                """))
-                conn.execute(text(f"DROP TABLE IF EXISTS {extra_stage};"))
+                copy_merge(conn, df_extra, "brain_regions", ["region_id"])
 
         if count_rows:
             df_counts = pd.DataFrame(count_rows)
             df_counts = df_counts.dropna(subset=["region_pixels", "load"])
-            temp_table = "_region_counts_stage"
-            df_counts.to_sql(
-                temp_table,
-                con=conn,
-                if_exists="replace",
-                index=False,
-                method="multi",
-                dtype={
-                    "subject_id": satypes.String(50),
-                    "region_id": satypes.Integer(),
-                    "file_id": satypes.Integer(),
-                    "region_pixels": satypes.BigInteger(),
-                    "region_area_mm": satypes.Float(),
-                    "object_count": satypes.Integer(),
-                    "object_pixels": satypes.BigInteger(),
-                    "object_area_mm": satypes.Float(),
-                    "load": satypes.Float(),
-                    "norm_load": satypes.Float(),
-                    "hemisphere": satypes.String(20),
-                    "region_pixels_unit_id": satypes.Integer(),
-                    "region_area_unit_id": satypes.Integer(),
-                    "object_count_unit_id": satypes.Integer(),
-                    "object_pixels_unit_id": satypes.Integer(),
-                    "object_area_unit_id": satypes.Integer(),
-                    "load_unit_id": satypes.Integer(),
-                },
-            )
-            conn.execute(text(f"""
-                INSERT INTO region_counts (subject_id, region_id, file_id, region_pixels, region_area_mm, object_count, object_pixels, object_area_mm, load, norm_load, hemisphere,
-                                          region_pixels_unit_id, region_area_unit_id, object_count_unit_id, object_pixels_unit_id, object_area_unit_id, load_unit_id)
-                SELECT subject_id, region_id, file_id, region_pixels, region_area_mm, object_count, object_pixels, object_area_mm, load, norm_load, hemisphere,
-                       region_pixels_unit_id, region_area_unit_id, object_count_unit_id, object_pixels_unit_id, object_area_unit_id, load_unit_id
-                FROM {temp_table}
-                ON CONFLICT (subject_id, region_id, hemisphere) DO NOTHING;
-            """))
-            conn.execute(text(f"DROP TABLE IF EXISTS {temp_table};"))
+            copy_merge(conn, df_counts, "region_counts", REGION_COUNTS_CONFLICT)
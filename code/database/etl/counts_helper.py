@@ -5,10 +5,11 @@ Keeps column renames/cleaning/unit resolution in one place to prevent drift.
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import text
 
-from code.database.etl.utils import load_table, clean_numeric
+from code.database.etl.utils import load_table
 
 
 REQUIRED_COLS = {"Region ID", "Region name", "Region pixels", "Region area", "Load"}
@@ -23,6 +24,25 @@ RENAME_MAP = {
     "Load": "load",
     "Norm load": "norm_load",
 }
+# region_counts metric column -> renamed CSV column
+METRIC_COLUMNS = {
+    "region_pixels": "region_pixels",
+    "region_area_mm": "region_area",
+    "object_count": "object_count",
+    "object_pixels": "object_pixels",
+    "object_area_mm": "object_area",
+    "load": "load",
+    "norm_load": "norm_load",
+}
+# region_counts unit column -> units.name
+UNIT_COLUMNS = {
+    "region_pixels_unit_id": "pixels",
+    "region_area_unit_id": "pixels",
+    "object_count_unit_id": "count",
+    "object_pixels_unit_id": "pixels",
+    "object_area_unit_id": "pixels",
+    "load_unit_id": "pixels",
+}
 
 
 def prepare_counts_dataframe(
@@ -62,29 +82,35 @@ def prepare_counts_dataframe(
             ).first()
             file_id = file_row.file_id if file_row else None
 
-    rows = []
-    for r in df.itertuples(index=False):
-        rows.append(
-            {
-                "subject_id": subject_id,
-                "region_id": int(getattr(r, "region_id")),
-                "file_id": file_id,
-                "region_pixels": clean_numeric(getattr(r, "region_pixels")),
-                "region_area_mm": clean_numeric(getattr(r, "region_area", None)),
-                "object_count": clean_numeric(getattr(r, "object_count", None)),
-                "object_pixels": clean_numeric(getattr(r, "object_pixels", None)),
-                "object_area_mm": clean_numeric(getattr(r, "object_area", None)),
-                "load": clean_numeric(getattr(r, "load")),
-                "norm_load": clean_numeric(getattr(r, "norm_load", None)),
-                "hemisphere": hemisphere,
-                "region_pixels_unit_id": unit_map.get("pixels"),
-                "region_area_unit_id": unit_map.get("pixels"),
-                "object_count_unit_id": unit_map.get("count"),
-                "object_pixels_unit_id": unit_map.get("pixels"),
-                "object_area_unit_id": unit_map.get("pixels"),
-                "load_unit_id": unit_map.get("pixels"),
-            }
-        )
-
-    df_counts = pd.DataFrame(rows)
-    return df_counts.dropna(subset=["region_pixels", "load"])
+    return build_counts_frame(df, subject_id, hemisphere, file_id, unit_map)
+
+
+def to_float(col: pd.Series) -> pd.Series:
+    """Column-wise clean_numeric: "N/A", blanks and anything unparsable become NaN."""
+    if col.dtype == object:
+        col = col.astype(str).str.strip()
+    return pd.to_numeric(col, errors="coerce").astype("float64")
+
+
+def build_counts_frame(df: pd.DataFrame, subject_id: str, hemisphere: str, file_id: Optional[int], unit_map: dict) -> pd.DataFrame:
+    """Renamed quant columns -> region_counts rows (vectorized; constants broadcast over the index)."""
+    missing = pd.Series(np.nan, index=df.index)
+
+    def metric(name: str) -> pd.Series:
+        return to_float(df[name]) if name in df.columns else missing
+
+    def constant_id(value) -> pd.Series:
+        return pd.Series(value, index=df.index, dtype="Int64")
+
+    out = pd.DataFrame(
+        {
+            "subject_id": pd.Series(subject_id, index=df.index, dtype=object),
+            "region_id": pd.to_numeric(df["region_id"]).astype("int64"),
+            "file_id": constant_id(file_id),
+            **{target: metric(source) for target, source in METRIC_COLUMNS.items()},
+            "hemisphere": pd.Series(hemisphere, index=df.index, dtype=object),
+            **{target: constant_id(unit_map.get(unit)) for target, unit in UNIT_COLUMNS.items()},
+        },
+        index=df.index,
+    )
+    return out.dropna(subset=["region_pixels", "load"])
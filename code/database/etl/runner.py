@@ -9,8 +9,10 @@ from . import subjects, bids, atlas, counts
 from .stats import summarize
 from .atlas import load_atlas
 from code.database.etl.subject_map import SUBJECT_MAP
-from .utils import ensure_batches_table
-from code.common.hashing import combine_hashes, file_sha256
+from .utils import ensure_batches_table, insert_batch_hashes
+from code.common.hash_cache import get_hash_cache, hash_cache_stats
+from code.common.hashing import combine_hex_hashes, file_sha256
+from code.database.near_duplicates import backfill_perceptual_hashes
 
 
 def seed_batch_hashes(engine, allowed_subjects: set, stats: dict):
@@ -18,33 +20,23 @@ def seed_batch_hashes(engine, allowed_subjects: set, stats: dict):
     Seed microscopy_batches with order-insensitive hashes of raw sourcedata images, and per-file hashes.
     Uses SUBJECT_MAP to map raw folders to subjects.
     """
-    seeded = 0
+    batches = []
+    for raw_name, meta in SUBJECT_MAP.items():
+        subj = meta.get("subject")
+        if subj not in allowed_subjects:
+            continue
+        src_dir = IMAGES_ROOT / raw_name
+        if not src_dir.exists():
+            continue
+        files = sorted([p for p in src_dir.iterdir() if p.is_file()])
+        if not files:
+            continue
+        shas = [file_sha256(f) for f in files]  # once per file, so hash-cache stats count each file once
+        batches.append((combine_hex_hashes(shas), f"seeded from {raw_name}", shas))
+    # Hash first, then write every batch and per-file hash in a few set-based statements
     with engine.begin() as conn:
         ensure_batches_table(conn)
-        for raw_name, meta in SUBJECT_MAP.items():
-            subj = meta.get("subject")
-            if subj not in allowed_subjects:
-                continue
-            src_dir = IMAGES_ROOT / raw_name
-            if not src_dir.exists():
-                continue
-            files = sorted([p for p in src_dir.iterdir() if p.is_file()])
-            if not files:
-                continue
-            batch_checksum = combine_hashes(files)
-            inserted = conn.execute(
-                text("INSERT INTO microscopy_batches (batch_checksum, note) VALUES (:c, :n) ON CONFLICT DO NOTHING"),
-                {"c": batch_checksum, "n": f"seeded from {raw_name}"},
-            ).rowcount
-            # upsert per-file hashes
-            for f in files:
-                conn.execute(
-                    text(
-                        "INSERT INTO microscopy_batch_files (batch_checksum, file_sha) VALUES (:c, :s) ON CONFLICT DO NOTHING"
-                    ),
-                    {"c": batch_checksum, "s": file_sha256(f)},
-                )
-            seeded += inserted
+        seeded = insert_batch_hashes(conn, batches)
     if seeded:
         stats["batches_seeded"] = stats.get("batches_seeded", 0) + seeded
 
@@ -62,6 +54,10 @@ def run_etl():
         "counts_skipped_missing_file": 0,
     }
 
+    hash_cache = get_hash_cache()
+    if hash_cache is not None:
+        hash_cache.reset_stats()
+
     print(f"\nStarting ETL Pipeline...")
     print(f"Reading data from: {DATA_ROOT}")
 
@@ -84,6 +80,7 @@ def run_etl():
     bids.load_bids_files(engine, stats, allowed_subjects=allowed_subjects)
     file_map = bids.build_file_map(engine)
     bids.backfill_ingest_log(engine, stats)
+    backfill_perceptual_hashes(engine, stats)
 
     # Load brain atlas
     print("\nLoading Allen Atlas Regions")
@@ -104,6 +101,9 @@ def run_etl():
         conn.execute(text("INSERT INTO ingest_log (source_path, status, message) VALUES (:p, :s, :m)"),
                      {"p": str(DATA_ROOT), "s": "success", "m": "ETL complete"})
 
+    # Hits mean a digest came from the persistent cache or a store manifest instead of re-reading the file
+    stats.update(hash_cache_stats())
+
     print("\nETL Complete. Database hydrated.")
     print("\nSummary:")
     print(summarize(stats))
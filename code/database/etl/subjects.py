@@ -4,6 +4,7 @@ Reason: seed subjects and one microscopy session per subject from subject_map, r
 """
 from sqlalchemy import text
 import pandas as pd
+from code.database.bulk_load import copy_merge
 from code.database.etl.subject_map import SUBJECT_MAP
 from .paths import BIDS_ROOT
 import re
@@ -39,24 +40,7 @@ def seed_subjects_and_sessions(conn, stats: dict):
         sess_rows.append({"session_id": f"{subj}_{session_label}", "subject_id": subj, "modality": "micr"})
     if sess_rows:
         df = pd.DataFrame(sess_rows)
-        stage = "_sessions_seed_stage"
-        df.to_sql(
-            stage,
-            con=conn,
-            if_exists="replace",
-            index=False,
-            method="multi",
-        )
-        conn.execute(
-            text(
-                f"""
-                INSERT INTO sessions (session_id, subject_id, modality)
-                SELECT session_id, subject_id, modality FROM {stage}
-                ON CONFLICT (session_id) DO NOTHING;
-                """
-            )
-        )
-        conn.execute(text(f"DROP TABLE IF EXISTS {stage};"))
+        copy_merge(conn, df, "sessions", ["session_id"])
         stats["sessions_seeded"] = stats.get("sessions_seeded", 0) + len(df)
 
 
@@ -2,6 +2,7 @@
 ETL utilities.
 Reason: reusable helpers (hashing, CSV load, hemisphere detection, session id allocation).
 """
+import csv
 import os
 import re
 from pathlib import Path
@@ -9,7 +10,7 @@ import pandas as pd
 from sqlalchemy import text
 from code.database.etl.subject_map import SUBJECT_MAP
 from typing import List
-from code.database.deduplication import ensure_batches_table
+from code.database.deduplication import ensure_batches_table, insert_batch_hashes
 from code.common.hashing import file_sha256, combine_hashes
 
 
@@ -82,24 +83,69 @@ def get_or_create_session_id(conn, subject_id: str, exp_type: str, existing_sess
     return new_id
 
 
+# Declared dtypes for known quant columns. Numeric columns stay inferred: counts parse as int64
+# unless a cell is N/A, and declaring float64 would change the frame callers get.
+QUANT_DTYPES = {"Region name": str}
+SNIFF_DELIMITERS = ",;\t|"
+SNIFF_FALLBACK_LINES = 50  # sample re-sniffed when the header-only guess fails to parse
+
+
+def sniff_table_format(csv_path: Path):
+    """
+    Return (sep, skiprows, header) from the first lines of a quant export: an explicit 'sep=;'
+    line wins, otherwise the delimiter is sniffed from the header; undecidable files are read as TSV.
+    """
+    with csv_path.open("r", errors="ignore", newline="") as f:
+        first = f.readline()
+        if first.lower().startswith("sep="):
+            return first.strip().split("=", 1)[1] or ";", 1, f.readline()
+    try:
+        return csv.Sniffer().sniff(first, delimiters=SNIFF_DELIMITERS).delimiter, 0, first
+    except csv.Error:
+        return "\t", 0, first
+
+
+def fallback_delimiters(csv_path: Path, skiprows: int, tried: str):
+    """Delimiters to retry after `tried` failed: one sniffed from a larger sample, then TSV."""
+    with csv_path.open("r", errors="ignore", newline="") as f:
+        lines = [line for _, line in zip(range(skiprows + SNIFF_FALLBACK_LINES), f)][skiprows:]
+    candidates = []
+    try:
+        candidates.append(csv.Sniffer().sniff("".join(lines), delimiters=SNIFF_DELIMITERS).delimiter)
+    except csv.Error:
+        pass
+    candidates.append("\t")
+    return [sep for sep in dict.fromkeys(candidates) if sep != tried]
+
+
+def _read_quant(csv_path: Path, sep: str, skiprows: int, header: str, engine: str) -> pd.DataFrame:
+    names = next(csv.reader([header], delimiter=sep), [])
+    dtypes = {name: QUANT_DTYPES[name.strip()] for name in names if name.strip() in QUANT_DTYPES}
+    return pd.read_csv(csv_path, sep=sep, skiprows=skiprows, dtype=dtypes, engine=engine)
+
+
 def load_table(csv_path: str) -> pd.DataFrame:
     """
     Read quantification CSV with delimiter sniffing and sep=; support.
-    - Detect 'sep=;' header and skip it.
+    - Detect 'sep=;' header and skip it; otherwise sniff the delimiter once from the header line.
+    - Parse with the C engine, declaring dtypes for the known text columns.
+    - If that guess does not parse (e.g. quoted delimiters in the header), retry with a delimiter
+      sniffed from more lines, then TSV, using the python engine.
     - Drop unnamed/empty columns caused by trailing delimiters.
     """
     csv_path = Path(csv_path)
-    with csv_path.open("r", errors="ignore") as f:
-        first = f.readline()
-    skiprows = 0
-    sep = None
-    if first.lower().startswith("sep="):
-        sep = first.strip().split("=", 1)[1] or ";"
-        skiprows = 1
+    sep, skiprows, header = sniff_table_format(csv_path)
     try:
-        df = pd.read_csv(csv_path, sep=sep, engine="python", skiprows=skiprows)
-    except Exception:
-        df = pd.read_csv(csv_path, sep="\t", engine="python", skiprows=skiprows)
+        df = _read_quant(csv_path, sep, skiprows, header, engine="c")
+    except pd.errors.ParserError as exc:
+        for retry in fallback_delimiters(csv_path, skiprows, sep):
+            try:
+                df = _read_quant(csv_path, retry, skiprows, header, engine="python")
+                break
+            except pd.errors.ParserError:
+                continue
+        else:
+            raise exc
     df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
     df = df.dropna(axis=1, how="all")
     df.columns = df.columns.str.strip()
@@ -0,0 +1,143 @@
+"""
+Per-process Bloom filter of every content hash the database knows about (microscopy file digests,
+batch and per-file upload hashes, successful ingest checksums). Duplicate pre-checks consult it first:
+a definite miss means no duplicate rule can match, so only possible hits go to Postgres.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+
+from code.config import (
+    HASH_FILTER_FP_RATE,
+    HASH_FILTER_MIN_CAPACITY,
+    HASH_FILTER_REFRESH_SECONDS,
+    HASH_FILTER_RELOAD_SECONDS,
+)
+
+# Rows committed slightly after a later created_at become visible late; re-read this window on refresh
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+KNOWN_HASHES_SQL = """
+SELECT sha256 AS h, created_at FROM microscopy_files WHERE sha256 IS NOT NULL {since}
+UNION ALL
+SELECT b.batch_checksum, b.created_at FROM microscopy_batches b WHERE TRUE {since_b}
+UNION ALL
+SELECT bf.file_sha, b.created_at FROM microscopy_batch_files bf
+    JOIN microscopy_batches b USING (batch_checksum) WHERE TRUE {since_b}
+UNION ALL
+SELECT checksum, created_at FROM ingest_log WHERE status = 'success' AND checksum IS NOT NULL {since}
+"""
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity: int, fp_rate: float = HASH_FILTER_FP_RATE):
+        self.capacity = max(1, capacity)
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.strip().lower().encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key: str) -> bool:
+        """Set the key's bits; only keys that set a new bit are counted (re-adds leave count alone)."""
+        new = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class KnownHashes:
+    """
+    Bloom filter of known hashes, loaded from Postgres, extended on ingest, and refreshed
+    incrementally so hashes ingested by other workers show up within HASH_FILTER_REFRESH_SECONDS.
+    Until it has loaded, every lookup is a possible hit.
+    """
+
+    def __init__(self):
+        self._filter: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+        self._watermark: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def _fetch(self, engine, since: Optional[datetime]):
+        clause = "AND created_at >= :since" if since else ""
+        clause_b = "AND b.created_at >= :since" if since else ""
+        sql = text(KNOWN_HASHES_SQL.format(since=clause, since_b=clause_b))
+        with engine.connect() as conn:
+            return conn.execute(sql, {"since": since} if since else {}).fetchall()
+
+    def _absorb(self, bloom: BloomFilter, rows) -> None:
+        for h, created_at in rows:
+            bloom.add(h)
+            if created_at is not None and (self._watermark is None or created_at > self._watermark):
+                self._watermark = created_at
+
+    def load(self, engine) -> int:
+        """Rebuild the filter from the database; returns the number of hashes loaded."""
+        rows = self._fetch(engine, None)
+        bloom = BloomFilter(max(HASH_FILTER_MIN_CAPACITY, 2 * len(rows)))
+        with self._lock:
+            self._watermark = None
+            self._absorb(bloom, rows)
+            self._filter = bloom
+            self._loaded_at = self._refreshed_at = time.monotonic()
+        return len(rows)
+
+    def refresh(self, engine) -> None:
+        """Full reload when stale or over capacity, otherwise pull rows newer than the watermark."""
+        now = time.monotonic()
+        bloom = self._filter
+        if bloom is None or now - self._loaded_at > HASH_FILTER_RELOAD_SECONDS or bloom.count > bloom.capacity:
+            self.load(engine)
+            return
+        if now - self._refreshed_at < HASH_FILTER_REFRESH_SECONDS:
+            return
+        since = self._watermark - REFRESH_OVERLAP if self._watermark else None
+        rows = self._fetch(engine, since)
+        with self._lock:
+            self._absorb(bloom, rows)
+            self._refreshed_at = now
+
+    def add(self, *hashes: str) -> None:
+        """Record hashes written by this process so its own ingests are seen immediately."""
+        with self._lock:
+            if self._filter is None:
+                return
+            for h in hashes:
+                if h:
+                    self._filter.add(h)
+
+    def may_contain_any(self, hashes: Iterable[str]) -> bool:
+        """False only when none of the hashes can be in the database."""
+        bloom = self._filter
+        if bloom is None:
+            return True
+        return any(h in bloom for h in hashes if h)
+
+
+known_hashes = KnownHashes()
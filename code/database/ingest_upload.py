@@ -2,50 +2,66 @@
 Helper to ingest uploaded microscopy images:
 - Converts PNG/JPG/TIFF (and other imageio-readable formats) to OME-Zarr.
 - Writes into Microscopy-BIDS layout under data/raw_bids/sub-*/ses-*/micr/.
-- Registers sessions and microscopy_files in the database with SHA256 hashes.
+- Registers sessions and microscopy_files in the database with SHA256 and perceptual hashes
+  (near-duplicates of stored slides are logged, or rejected with PHASH_BLOCK_NEAR_DUPLICATES=1).
+
+- With --volume, assembles ordered slices (or the pages of a multi-page TIFF) into one zyx/czyx store.
 
 Usage (example):
   python -m code.database.ingest_upload --subject sub-DBL_A --session ses-dbl --hemisphere right \
     --pixel-size-um 0.5 path/to/image1.png path/to/image2.tif
+  python -m code.database.ingest_upload --subject sub-rab08 --session ses-01 --volume \
+    --pixel-size-um 0.5 --z-spacing-um 50 path/to/brain_s*.png
 """
 
 import argparse
 import json
+import logging
 import shutil
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
-import dask.array as da
 import warnings
 from PIL import Image, ImageFile
 import imageio.v3 as iio
 import numpy as np
+import tifffile
 import zarr
 from ome_zarr.io import parse_url
-from ome_zarr.writer import write_image
-try:
-    from ome_zarr.scale import Scaler
-except ImportError:
-    # Fallback if Scaler import fails (e.g., due to numpy/skimage version issues)
-    Scaler = None
 from sqlalchemy import text, types as satypes
 
 from code.database.connect import get_engine
-from code.common.hashing import file_sha256
+from code.common.hashing import array_sha256, PixelDigest, SIDECAR_DIGEST_KEY
+from code.common.phash import store_hashes, to_signed
+from code.common.previews import write_previews
+from code.common.omezarr import CODECS, DOWNSAMPLE_METHODS, build_pyramid, create_base_array, write_multiscale
+from code.database.etl.convert_to_zarr import extract_slice_number
+from code.config import PHASH_BLOCK_NEAR_DUPLICATES, PYRAMID_LEVELS, PYRAMID_METHOD, VIEWER_TILE_SIZE, ZARR_CODEC
+from code.database.deduplication import ensure_schema_once
+from code.database.near_duplicates import find_near_duplicates
+
+logger = logging.getLogger(__name__)
 
 ROOT = Path(__file__).resolve().parents[2]  # project root
 BIDS_ROOT = ROOT / "data" / "raw_bids"
 
+TIFF_EXT = (".tif", ".tiff")
+# PIL mode -> (channels after load_image, dtype); other modes are probed by decoding
+PIL_MODES = {
+    "L": (1, np.uint8),
+    "I;16": (1, np.uint16),
+    "I;16B": (1, np.uint16),
+    "I;16L": (1, np.uint16),
+    "I": (1, np.int32),
+    "F": (1, np.float32),
+    "RGB": (3, np.uint8),
+    "RGBA": (3, np.uint8),
+}
 
-def load_image(path: Path) -> np.ndarray:
-    # Allow large images but guard against pathological cases
-    # Suppress PIL warnings
-    Image.MAX_IMAGE_PIXELS = None
-    ImageFile.LOAD_TRUNCATED_IMAGES = True
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", category=Image.DecompressionBombWarning)
-        arr = iio.imread(path)
-    # No hard cap, callers can downsample/tile manually if memory becomes an issue
+
+def to_cyx(arr: np.ndarray, path: Path) -> np.ndarray:
+    """Normalize a decoded 2D image to (c, y, x), dropping alpha."""
     if arr.ndim == 2:
         arr = arr[np.newaxis, ...]
     elif arr.ndim == 3:
@@ -57,35 +73,155 @@ def load_image(path: Path) -> np.ndarray:
     return arr
 
 
-def write_omezarr(data: np.ndarray, dest: Path, pixel_size_um: float) -> None:
+def load_image(path: Path) -> np.ndarray:
+    # Allow large images but guard against pathological cases
+    # Suppress PIL warnings
+    Image.MAX_IMAGE_PIXELS = None
+    ImageFile.LOAD_TRUNCATED_IMAGES = True
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=Image.DecompressionBombWarning)
+        arr = iio.imread(path)
+    # No hard cap, callers can downsample/tile manually if memory becomes an issue
+    return to_cyx(arr, path)
+
+
+def volume_slices(files: list[Path]) -> list[tuple[Path, Optional[int]]]:
+    """Ordered (file, tiff page) pairs: files by slice number, multi-page TIFF pages in file order."""
+    ordered = sorted(files, key=lambda p: (extract_slice_number(p.name), p.name))
+    slices = []
+    for path in ordered:
+        if path.suffix.lower() in TIFF_EXT:
+            with tifffile.TiffFile(path) as tf:
+                slices.extend((path, i) for i in range(len(tf.pages)))
+        else:
+            slices.append((path, None))
+    return slices
+
+
+def _tiff_page_shape(page) -> tuple[int, int, int]:
+    """(c, h, w) of a TIFF page from its tags; samples beyond RGB (alpha) are dropped on read."""
+    shape = dict(zip(page.axes, page.shape))
+    return min(shape.get("S", 1), 3), shape["Y"], shape["X"]
+
+
+def slice_header(path: Path, page: Optional[int]) -> tuple[int, int, int, np.dtype]:
+    """(channels, height, width, dtype) of one slice, read from headers where possible."""
+    if page is not None:
+        with tifffile.TiffFile(path) as tf:
+            p = tf.pages[page]
+            c, h, w = _tiff_page_shape(p)
+            return c, h, w, np.dtype(p.dtype)
+    Image.MAX_IMAGE_PIXELS = None
+    with Image.open(path) as im:
+        if im.mode in PIL_MODES:
+            c, dtype = PIL_MODES[im.mode]
+            w, h = im.size
+            return c, h, w, np.dtype(dtype)
+    arr = load_image(path)
+    return arr.shape[0], arr.shape[1], arr.shape[2], arr.dtype
+
+
+def read_slice(path: Path, page: Optional[int]) -> np.ndarray:
+    """Decode one slice as (c, y, x)."""
+    if page is None:
+        return load_image(path)
+    with tifffile.TiffFile(path) as tf:
+        p = tf.pages[page]
+        arr = p.asarray()
+        # Planar (SYX) pages are already channel-first
+        return arr[:3] if p.axes.startswith("S") else to_cyx(arr, path)
+
+
+def write_omezarr(
+    data: np.ndarray,
+    dest: Path,
+    pixel_size_um: float,
+    levels: int = PYRAMID_LEVELS,
+    method: str = PYRAMID_METHOD,
+    codec: str = ZARR_CODEC,
+    tile_size: int = VIEWER_TILE_SIZE,
+) -> str:
+    """Write a cyx OME-Zarr store and return the pixel content digest (no store re-read needed)."""
     dest.parent.mkdir(parents=True, exist_ok=True)
     store = parse_url(dest, mode="w").store
     root = zarr.group(store=store)
-    darr = da.from_array(data, chunks=(data.shape[0], 512, 512))
     ps_m = pixel_size_um * 1e-6
-    
-    # Create multiscale pyramid for efficient web viewing
-    # This creates multiple resolution levels (e.g., 1x, 2x, 4x downsampled)
-    # Scaler() with default settings creates a 2x downsampling pyramid
-    scaler = Scaler() if Scaler is not None else None
-    
-    if scaler is None:
-        import warnings
-        warnings.warn(
-            "Scaler not available (numpy/skimage version issue). "
-            "Creating single-scale OME-Zarr. For multiscale support, update numpy/skimage versions.",
-            UserWarning
-        )
-    
-    write_image(
-        darr,
-        group=root,
+
+    # Multiscale pyramid for web viewing (required for Viv/Vizarr), each level halves y/x.
+    # Chunk shape is auto-tuned to the viewer tile size and dtype.
+    write_multiscale(
+        root,
+        data,
         axes="cyx",
-        scaler=scaler,  # Use scaler to create multiscale pyramid (required for Viv/Vizarr)
-        coordinate_transformations=[[{"type": "scale", "scale": [1.0, ps_m, ps_m]}]],
+        scale=[1.0, ps_m, ps_m],
+        levels=levels,
+        method=method,
+        codec=codec,
+        tile_size=tile_size,
     )
+    return array_sha256(data)
 
-def write_sidecar(dest: Path, subject: str, session: str, run: int, hemisphere: str, experiment_type: str, pixel_size_um: float, sample: str):
+
+def write_volume_omezarr(
+    files: list[Path],
+    dest: Path,
+    pixel_size_um: float,
+    z_spacing_um: Optional[float] = None,
+    levels: int = PYRAMID_LEVELS,
+    method: str = PYRAMID_METHOD,
+    codec: str = ZARR_CODEC,
+    tile_size: int = VIEWER_TILE_SIZE,
+) -> tuple[str, int]:
+    """
+    Assemble ordered slices (or TIFF pages) into one zyx (grayscale) or czyx store.
+    Slices are centered on the largest canvas and streamed one at a time into the on-disk array;
+    returns (pixel digest, slice count). The digest covers slices in z order.
+    """
+    slices = volume_slices(files)
+    if not slices:
+        raise ValueError("No slices found for volume ingest")
+    headers = [slice_header(path, page) for path, page in slices]
+    channels, _, _, dtype = headers[0]
+    for (path, page), (c, _, _, dt) in zip(slices, headers):
+        if (c, dt) != (channels, dtype):
+            where = f"{path.name}" + (f" page {page}" if page is not None else "")
+            raise ValueError(f"Slice {where} has {c} channel(s) of {dt}; expected {channels} of {dtype} like the first slice")
+    max_h = max(h for _, h, _, _ in headers)
+    max_w = max(w for _, _, w, _ in headers)
+    n = len(slices)
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    root = zarr.group(store=parse_url(dest, mode="w").store)
+    ps_m = pixel_size_um * 1e-6
+    z_m = (z_spacing_um if z_spacing_um is not None else pixel_size_um) * 1e-6
+    if channels == 1:
+        axes, shape, scale = "zyx", (n, max_h, max_w), [z_m, ps_m, ps_m]
+        digest = PixelDigest(shape, dtype)
+    else:
+        axes, shape, scale = "czyx", (channels, n, max_h, max_w), [1.0, z_m, ps_m, ps_m]
+        digest = PixelDigest((n, channels, max_h, max_w), dtype)
+    base = create_base_array(root, shape, dtype, axes, codec=codec, tile_size=tile_size)
+
+    canvas = np.zeros((channels, max_h, max_w), dtype=dtype)
+    for z, (path, page) in enumerate(slices):
+        img = read_slice(path, page)
+        _, h, w = img.shape
+        y_off, x_off = (max_h - h) // 2, (max_w - w) // 2
+        canvas[:] = 0
+        canvas[:, y_off:y_off + h, x_off:x_off + w] = img
+        if channels == 1:
+            base[z] = canvas[0]
+            digest.update(canvas[0])
+        else:
+            base[:, z] = canvas
+            digest.update(canvas)
+
+    build_pyramid(root, base, axes, scale=scale, levels=levels, method=method)
+    return digest.hexdigest(), n
+
+
+def write_sidecar(dest: Path, subject: str, session: str, run: int, hemisphere: str, experiment_type: str, pixel_size_um: float, sample: str, sha256: Optional[str] = None,
+                  slice_count: Optional[int] = None):
     sidecar = dest.with_suffix(dest.suffix + ".json")
     meta = {
         "BIDSVersion": "1.8.0",
@@ -99,6 +235,10 @@ def write_sidecar(dest: Path, subject: str, session: str, run: int, hemisphere:
         "PixelSizeMicrons": pixel_size_um,
         "GeneratedAt": datetime.utcnow().isoformat() + "Z",
     }
+    if sha256:
+        meta[SIDECAR_DIGEST_KEY] = sha256
+    if slice_count is not None:
+        meta["SliceCount"] = slice_count
     sidecar.write_text(json.dumps(meta, indent=2))
 
 def ensure_dataset_files():
@@ -125,7 +265,14 @@ def validate_outputs(dest: Path):
     if not dd.exists():
         raise FileNotFoundError(f"Missing dataset_description.json at {dd}")
 
-def ingest(subject: str, session: str, hemisphere: str, files: list[Path], pixel_size_um: float = 1.0, experiment_type: str = "double_injection"):
+def ingest(subject: str, session: str, hemisphere: str, files: list[Path], pixel_size_um: float = 1.0, experiment_type: str = "double_injection",
+           pyramid_levels: int = PYRAMID_LEVELS, downsample: str = PYRAMID_METHOD, codec: str = ZARR_CODEC,
+           volume: bool = False, z_spacing_um: Optional[float] = None):
+    """
+    Convert uploads to OME-Zarr under BIDS_ROOT and register them.
+    By default every file becomes its own run; with volume=True all files (or TIFF pages)
+    become a single z-stack store registered as run 1.
+    """
     engine = get_engine()
     staged = []
     sample_label = "sample-01"
@@ -135,21 +282,31 @@ def ingest(subject: str, session: str, hemisphere: str, files: list[Path], pixel
     if hemi_label not in {"left", "right", "bilateral"}:
         hemi_label = "bilateral"
     try:
+        ensure_schema_once(engine)
         ensure_dataset_files()
-        for idx, src in enumerate(files, start=1):
+        for src in files:
             if not src.exists():
                 raise FileNotFoundError(f"Input file not found: {src}")
-            data = load_image(src)
+        runs = [(1, list(files))] if volume else [(idx, [src]) for idx, src in enumerate(files, start=1)]
+        for idx, sources in runs:
             dest = BIDS_ROOT / subject / session_label / "micr" / f"{subject}_{session_label}_{sample_label}_run-{idx:02d}_micr.ome.zarr"
             # Clean up any stale store from prior attempts so the writer can proceed
             if dest.exists():
                 shutil.rmtree(dest, ignore_errors=True)
                 sidecar_stale = dest.with_suffix(dest.suffix + ".json")
                 sidecar_stale.unlink(missing_ok=True)
-            write_omezarr(data, dest, pixel_size_um)
-            write_sidecar(dest, subject, session_label, idx, hemi_label, experiment_type, pixel_size_um, sample_label)
+            slice_count = None
+            if volume:
+                sha, slice_count = write_volume_omezarr(
+                    sources, dest, pixel_size_um, z_spacing_um, levels=pyramid_levels, method=downsample, codec=codec
+                )
+            else:
+                data = load_image(sources[0])
+                sha = write_omezarr(data, dest, pixel_size_um, levels=pyramid_levels, method=downsample, codec=codec)
+            write_sidecar(dest, subject, session_label, idx, hemi_label, experiment_type, pixel_size_um, sample_label, sha256=sha,
+                          slice_count=slice_count)
+            write_previews(dest)
             validate_outputs(dest)
-            sha = file_sha256(dest)
             # reject duplicate content before touching DB state
             with engine.connect() as conn:
                 dup = conn.execute(
@@ -162,7 +319,19 @@ def ingest(subject: str, session: str, hemisphere: str, files: list[Path], pixel
                 raise ValueError(
                     f"Duplicate microscopy content detected (already stored for subject {dup.subject_id}, session {dup.session_id}, run {dup.run})"
                 )
-            staged.append((idx, dest, sha))
+            # Re-exports of an already stored slide (re-compressed, resaved, lightly cropped) differ in bytes only
+            ph, dh = store_hashes(dest)
+            near = find_near_duplicates(engine, ph)
+            if near:
+                match = near[0]
+                message = (f"Near-duplicate microscopy content for {sources[0].name}: {match['distance']} bits from "
+                           f"file {match['file_id']} (session {match['session_id']}, run {match['run']})")
+                if PHASH_BLOCK_NEAR_DUPLICATES:
+                    shutil.rmtree(dest, ignore_errors=True)
+                    dest.with_suffix(dest.suffix + ".json").unlink(missing_ok=True)
+                    raise ValueError(message)
+                logger.warning(message)
+            staged.append((idx, dest, sha, ph, dh))
 
         # All files are unique, register DB state now
         with engine.begin() as conn:
@@ -182,19 +351,20 @@ def ingest(subject: str, session: str, hemisphere: str, files: list[Path], pixel
                 """),
                 {"sid": session, "subj": subject, "mod": "micr"},
             )
-            for idx, dest, sha in staged:
+            for idx, dest, sha, ph, dh in staged:
                 conn.execute(
                     text("""
-                        INSERT INTO microscopy_files (session_id, run, hemisphere, path, sha256)
-                        VALUES (:sid, :run, :hemi, :path, :sha)
+                        INSERT INTO microscopy_files (session_id, run, hemisphere, path, sha256, phash, dhash, phash_set_at)
+                        VALUES (:sid, :run, :hemi, :path, :sha, :ph, :dh, now())
                         ON CONFLICT (session_id, run, hemisphere) DO NOTHING;
                     """),
-                    {"sid": session, "run": idx, "hemi": hemisphere, "path": str(dest), "sha": sha},
+                    {"sid": session, "run": idx, "hemi": hemisphere, "path": str(dest), "sha": sha,
+                     "ph": to_signed(ph), "dh": to_signed(dh)},
                 )
-        return [d for _, d, _ in staged]
+        return [dest for _, dest, *_ in staged]
     except Exception:
         # cleanup any staged files on error
-        for _, dest, _ in staged:
+        for _, dest, *_ in staged:
             shutil.rmtree(dest, ignore_errors=True)
             dest.with_suffix(dest.suffix + ".json").unlink(missing_ok=True)
         raise
@@ -207,10 +377,17 @@ def main():
     ap.add_argument("--hemisphere", default="bilateral", choices=["left", "right", "bilateral"])
     ap.add_argument("--pixel-size-um", type=float, default=1.0, help="Pixel size in micrometers")
     ap.add_argument("--experiment-type", default="double_injection", choices=["double_injection", "rabies"], help="Experiment type to satisfy subjects constraint")
+    ap.add_argument("--pyramid-levels", type=int, default=PYRAMID_LEVELS, help="Resolution levels including full resolution")
+    ap.add_argument("--downsample", default=PYRAMID_METHOD, choices=DOWNSAMPLE_METHODS, help="Pyramid downsampling method")
+    ap.add_argument("--codec", default=ZARR_CODEC, choices=CODECS, help="Blosc chunk codec")
+    ap.add_argument("--volume", action="store_true", help="Assemble all files (or TIFF pages) into one z-stack store")
+    ap.add_argument("--z-spacing-um", type=float, default=None, help="Slice spacing in micrometers (volume mode; defaults to pixel size)")
     ap.add_argument("files", nargs="+", type=Path, help="Input image files")
     args = ap.parse_args()
 
-    ingested = ingest(args.subject, args.session, args.hemisphere, args.files, args.pixel_size_um, args.experiment_type)
+    ingested = ingest(args.subject, args.session, args.hemisphere, args.files, args.pixel_size_um, args.experiment_type,
+                      pyramid_levels=args.pyramid_levels, downsample=args.downsample, codec=args.codec,
+                      volume=args.volume, z_spacing_um=args.z_spacing_um)
     print(f"Ingested {len(ingested)} file(s):")
     for p in ingested:
         print(" -", p)
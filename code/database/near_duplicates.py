@@ -0,0 +1,114 @@
+"""
+Near-duplicate lookup over the perceptual hashes stored in microscopy_files.
+Each process keeps a BK-tree of (phash -> file_id) that is filled from Postgres and topped up with
+rows whose pHash was set after the last one it has seen (phash_set_at), so hashes backfilled onto
+existing rows are picked up too and radius queries stay sublinear as the archive grows.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+from code.common.paths import resolve_store_path
+from code.common.phash import BKTree, store_hashes, to_signed, to_unsigned
+from code.config import PHASH_MAX_DISTANCE
+from code.database.deduplication import ensure_schema_once
+
+# Re-read this much before the watermark: phash_set_at is the writer's transaction time, so a slow
+# transaction can commit rows older than ones already indexed. Already indexed file_ids are skipped.
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+class PerceptualIndex:
+    """BK-tree of stored pHashes keyed to microscopy_files.file_id."""
+
+    def __init__(self):
+        self._tree = BKTree()
+        self._indexed: Set[int] = set()
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, engine) -> None:
+        """Add rows whose pHash was set since the watermark (everything with a pHash on first use)."""
+        since = self._watermark - REFRESH_OVERLAP if self._watermark else None
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT file_id, phash, phash_set_at FROM microscopy_files WHERE phash IS NOT NULL"
+                    + (" AND phash_set_at >= :since" if since else "")
+                ),
+                {"since": since},
+            ).fetchall()
+        with self._lock:
+            for file_id, h, set_at in rows:
+                if file_id not in self._indexed:
+                    self._tree.add(to_unsigned(h), file_id)
+                    self._indexed.add(file_id)
+                if set_at is not None and (self._watermark is None or set_at > self._watermark):
+                    self._watermark = set_at
+
+    def search(self, h: int, max_distance: int = PHASH_MAX_DISTANCE) -> List[tuple]:
+        with self._lock:
+            return self._tree.search(h, max_distance)
+
+
+perceptual_index = PerceptualIndex()
+
+
+def find_near_duplicates(engine, h: int, max_distance: int = PHASH_MAX_DISTANCE, exclude_file_id: Optional[int] = None) -> List[Dict]:
+    """
+    Parameters:
+        engine: SQLAlchemy engine.
+        h (int): Unsigned 64-bit pHash to match.
+        max_distance (int): Hamming radius in bits.
+        exclude_file_id (int | None): File to leave out (the query file itself).
+
+    Returns:
+        list[dict]: {file_id, session_id, run, hemisphere, path, distance} rows, nearest first.
+    """
+    ensure_schema_once(engine)
+    perceptual_index.refresh(engine)
+    hits = {file_id: d for d, file_id in perceptual_index.search(h, max_distance) if file_id != exclude_file_id}
+    if not hits:
+        return []
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT file_id, session_id, run, hemisphere, path FROM microscopy_files WHERE file_id = ANY(:ids)"),
+            {"ids": list(hits)},
+        ).fetchall()
+    # Rows deleted since they were indexed simply drop out here
+    found = [{**dict(r._mapping), "distance": hits[r.file_id]} for r in rows]
+    return sorted(found, key=lambda r: (r["distance"], r["file_id"]))
+
+
+def stored_phash(engine, file_id: int) -> Optional[int]:
+    """Unsigned pHash recorded for a file, or None when it was never hashed."""
+    ensure_schema_once(engine)
+    with engine.connect() as conn:
+        h = conn.execute(text("SELECT phash FROM microscopy_files WHERE file_id = :fid"), {"fid": file_id}).scalar()
+    return None if h is None else to_unsigned(h)
+
+
+def backfill_perceptual_hashes(engine, stats: dict) -> None:
+    """Compute pHash/dHash for registered stores that predate perceptual hashing (reads one small plane each)."""
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT file_id, path FROM microscopy_files WHERE phash IS NULL")).fetchall()
+    updates = []
+    for file_id, path in rows:
+        store = resolve_store_path(path)
+        if not store.exists():
+            continue
+        try:
+            ph, dh = store_hashes(store)
+        except (KeyError, ValueError, OSError) as exc:
+            print(f"   WARNING: No perceptual hash for {store}: {exc}")
+            continue
+        updates.append({"id": file_id, "p": to_signed(ph), "d": to_signed(dh)})
+    if updates:
+        with engine.begin() as conn:
+            conn.execute(
+                text("UPDATE microscopy_files SET phash = :p, dhash = :d, phash_set_at = now() WHERE file_id = :id"),
+                updates,
+            )
+        stats["microscopy_phash_backfilled"] = stats.get("microscopy_phash_backfilled", 0) + len(updates)
@@ -1,4 +1,6 @@
 
+DROP TABLE IF EXISTS microscopy_batch_files CASCADE;
+DROP TABLE IF EXISTS microscopy_batches CASCADE;
 DROP TABLE IF EXISTS region_counts CASCADE;
 DROP TABLE IF EXISTS ingest_log CASCADE;
 DROP TABLE IF EXISTS units CASCADE;
@@ -48,6 +50,9 @@ CREATE TABLE microscopy_files (
     hemisphere VARCHAR(20) CHECK (hemisphere IN ('left','right','bilateral')),
     path TEXT NOT NULL,
     sha256 CHAR(64),
+    phash BIGINT,                       -- 64-bit perceptual hashes (signed), see code/common/phash.py
+    dhash BIGINT,
+    phash_set_at TIMESTAMPTZ,           -- when phash was written; watermark for near_duplicates refresh
     created_at TIMESTAMPTZ DEFAULT now(),
     UNIQUE(session_id, run, hemisphere)
 );
@@ -98,9 +103,27 @@ CREATE TABLE ingest_log (
     created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- 6. Duplicate detection: accepted upload/source batches and their per-file hashes
+CREATE TABLE microscopy_batches (
+    batch_checksum TEXT PRIMARY KEY,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    note TEXT
+);
+
+CREATE TABLE microscopy_batch_files (
+    batch_checksum TEXT REFERENCES microscopy_batches(batch_checksum) ON DELETE CASCADE,
+    file_sha TEXT NOT NULL,
+    PRIMARY KEY(batch_checksum, file_sha)
+);
+
 -- Indexes
 CREATE INDEX idx_region_counts_subject ON region_counts(subject_id);
 CREATE INDEX idx_region_counts_region ON region_counts(region_id);
 CREATE INDEX idx_region_counts_hemi ON region_counts(hemisphere);
 CREATE INDEX idx_brain_regions_parent ON brain_regions(parent_id);
 CREATE INDEX idx_microscopy_files_session ON microscopy_files(session_id);
+-- Duplicate-check lookups (see code/database/deduplication.py)
+CREATE INDEX idx_microscopy_files_sha256 ON microscopy_files(sha256);
+CREATE INDEX idx_microscopy_files_phash_set_at ON microscopy_files(phash_set_at);
+CREATE INDEX idx_microscopy_batch_files_sha ON microscopy_batch_files(file_sha);
+CREATE INDEX idx_ingest_log_checksum ON ingest_log(checksum) WHERE status = 'success';
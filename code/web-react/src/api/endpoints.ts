@@ -72,7 +72,13 @@ export interface MicroscopyStack {
   hemisphere: string | null;
   name: string;
   url: string;
+  data_url: string;
   path: string;
+  preview_url: string;
+  preview_index_url: string;
+  contrast: {
+    channels: { label: string | null; color: string | null; window: { min: number; max: number; start: number; end: number } | null }[];
+  } | null;
 }
 
 export const microscopyStacksAPI = {
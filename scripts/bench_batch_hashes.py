@@ -0,0 +1,90 @@
+"""
+Benchmark recording duplicate-detection hashes: one INSERT per row vs. the set-based
+insert_batch_hashes path. Runs inside transactions that are rolled back, so the database is untouched.
+
+Usage:
+  python scripts/bench_batch_hashes.py                     # 10k file hashes in batches of 500
+  python scripts/bench_batch_hashes.py --hashes 50000 --batch-size 1000 --repeats 5
+"""
+import argparse
+import hashlib
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import text
+
+from code.database.connect import get_engine
+from code.database.deduplication import ensure_batches_table, insert_batch_hashes
+
+
+def synthetic_batches(n_hashes: int, batch_size: int, seed: int):
+    """Random-looking batch checksums and file hashes (distinct per seed so runs never collide)."""
+    def sha(*parts) -> str:
+        return hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()
+
+    batches = []
+    for b in range(0, n_hashes, batch_size):
+        files = [sha(seed, "file", i) for i in range(b, min(b + batch_size, n_hashes))]
+        batches.append((sha(seed, "batch", b), "bench", files))
+    return batches
+
+
+def insert_per_row(conn, batches) -> None:
+    """The previous path: one statement per batch and per file hash."""
+    for checksum, note, shas in batches:
+        conn.execute(
+            text("INSERT INTO microscopy_batches (batch_checksum, note) VALUES (:c, :n) ON CONFLICT DO NOTHING"),
+            {"c": checksum, "n": note},
+        )
+        for sha in shas:
+            conn.execute(
+                text("INSERT INTO microscopy_batch_files (batch_checksum, file_sha) VALUES (:c, :s) ON CONFLICT DO NOTHING"),
+                {"c": checksum, "s": sha},
+            )
+
+
+def timed(engine, fn, batches) -> float:
+    conn = engine.connect()
+    tx = conn.begin()
+    try:
+        start = time.perf_counter()
+        fn(conn, batches)
+        return time.perf_counter() - start
+    finally:
+        tx.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hashes", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    ensure_batches_table(engine)
+    methods = {"per-row": insert_per_row, "bulk": insert_batch_hashes}
+    results = {name: [] for name in methods}
+    for r in range(args.repeats):
+        batches = synthetic_batches(args.hashes, args.batch_size, seed=r)
+        for name, fn in methods.items():
+            results[name].append(timed(engine, fn, batches))
+
+    n_batches = -(-args.hashes // args.batch_size)
+    print(f"{args.hashes} file hashes in {n_batches} batches, median of {args.repeats} runs")
+    print(f"{'method':<10}{'seconds':>10}{'rows/s':>12}")
+    for name, times in results.items():
+        t = statistics.median(times)
+        print(f"{name:<10}{t:>10.3f}{(args.hashes + n_batches) / t:>12.0f}")
+    print(f"speedup: {statistics.median(results['per-row']) / statistics.median(results['bulk']):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark loading region_counts rows: DataFrame.to_sql(method="multi") staging (the previous ETL
+path) vs. COPY FROM STDIN through code.database.bulk_load.copy_merge. Both merge into a temp copy of
+region_counts (same columns and conflict key, no foreign keys) inside a rolled-back transaction.
+
+Usage:
+  python scripts/bench_bulk_load.py                    # 1M rows
+  python scripts/bench_bulk_load.py --rows 200000 --skip-legacy
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from code.database.bulk_load import REGION_COUNTS_CONFLICT, copy_merge
+from code.database.connect import get_engine
+
+TARGET = "bench_region_counts"
+COLUMNS = [
+    "subject_id", "region_id", "file_id", "region_pixels", "region_area_mm", "object_count", "object_pixels",
+    "object_area_mm", "load", "norm_load", "hemisphere", "region_pixels_unit_id", "region_area_unit_id",
+    "object_count_unit_id", "object_pixels_unit_id", "object_area_unit_id", "load_unit_id",
+]
+
+
+def synthetic_counts(n: int) -> pd.DataFrame:
+    """Unique (subject, region, hemisphere) rows with realistic NULLs in the optional metrics."""
+    rng = np.random.default_rng(0)
+    idx = np.arange(n)
+    df = pd.DataFrame({
+        "subject_id": [f"sub-bench{i:05d}" for i in idx // 1000],
+        "region_id": (idx // 2) % 500 + 1,
+        "file_id": np.nan,
+        "region_pixels": rng.integers(1, 10_000_000, n),
+        "region_area_mm": rng.random(n) * 10,
+        "object_count": np.where(rng.random(n) < 0.1, np.nan, rng.integers(0, 5000, n)),
+        "object_pixels": rng.integers(0, 100_000, n),
+        "object_area_mm": rng.random(n),
+        "load": rng.random(n),
+        "norm_load": rng.random(n),
+        "hemisphere": np.where(idx % 2, "left", "right"),
+    })
+    for col in COLUMNS[11:]:
+        df[col] = 1
+    return df
+
+
+def create_target(conn) -> None:
+    conn.execute(text(f"CREATE TEMP TABLE {TARGET} AS SELECT {', '.join(COLUMNS)} FROM region_counts WITH NO DATA"))
+    conn.execute(text(f"ALTER TABLE {TARGET} ADD UNIQUE ({', '.join(REGION_COUNTS_CONFLICT)})"))
+
+
+def load_legacy(conn, df: pd.DataFrame) -> int:
+    stage = "_bench_region_counts_stage"
+    df.to_sql(stage, con=conn, if_exists="replace", index=False, method="multi")
+    cols = ", ".join(COLUMNS)
+    inserted = conn.execute(text(
+        f"INSERT INTO {TARGET} ({cols}) SELECT {cols} FROM {stage} "
+        f"ON CONFLICT ({', '.join(REGION_COUNTS_CONFLICT)}) DO NOTHING"
+    )).rowcount
+    conn.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+    return inserted
+
+
+def load_copy(conn, df: pd.DataFrame) -> int:
+    return copy_merge(conn, df, TARGET, REGION_COUNTS_CONFLICT)
+
+
+def timed(engine, fn, df) -> tuple:
+    conn = engine.connect()
+    tx = conn.begin()
+    try:
+        create_target(conn)
+        start = time.perf_counter()
+        inserted = fn(conn, df)
+        return time.perf_counter() - start, inserted
+    finally:
+        tx.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the COPY path")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    df = synthetic_counts(args.rows)
+    methods = {"copy": load_copy} if args.skip_legacy else {"to_sql multi": load_legacy, "copy": load_copy}
+    print(f"{args.rows} region_counts rows")
+    print(f"{'method':<14}{'seconds':>10}{'rows/s':>12}{'inserted':>10}")
+    results = {}
+    for name, fn in methods.items():
+        seconds, inserted = timed(engine, fn, df)
+        results[name] = seconds
+        print(f"{name:<14}{seconds:>10.2f}{args.rows / seconds:>12.0f}{inserted:>10}")
+    if len(results) == 2:
+        print(f"speedup: {results['to_sql multi'] / results['copy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
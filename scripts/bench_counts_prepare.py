@@ -0,0 +1,111 @@
+"""
+Benchmark quant CSV normalization: the previous per-cell loop (itertuples + clean_numeric) vs. the
+vectorized build_counts_frame used by prepare_counts_dataframe. No database needed.
+
+Usage:
+  python scripts/bench_counts_prepare.py                  # synthetic 100k-row quant export
+  python scripts/bench_counts_prepare.py path/to/quant.csv --repeats 5
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+
+from code.database.etl.counts_helper import RENAME_MAP, UNIT_COLUMNS, build_counts_frame
+from code.database.etl.utils import clean_numeric, load_table
+
+UNITS = {"pixels": 1, "mm2": 2, "count": 3}
+
+
+def synthetic_export(path: Path, rows: int) -> None:
+    """QuPath-style export with 'sep=;' header, N/A cells and a trailing delimiter."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "Region ID": np.arange(rows) + 1,
+        "Region name": [f"Region {i}" for i in range(rows)],
+        "Region pixels": rng.integers(1, 10_000_000, rows),
+        "Region area": rng.random(rows) * 10,
+        "Object count": np.where(rng.random(rows) < 0.2, "N/A", rng.integers(0, 5000, rows).astype(str)),
+        "Object pixels": rng.integers(0, 100_000, rows),
+        "Object area": rng.random(rows),
+        "Load": np.where(rng.random(rows) < 0.01, "N/A", rng.random(rows).round(6).astype(str)),
+        "Norm load": rng.random(rows),
+    })
+    with path.open("w") as f:
+        f.write("sep=;\n")
+        df.to_csv(f, sep=";", index=False)
+
+
+def legacy_frame(df: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for r in df.itertuples(index=False):
+        row = {
+            "subject_id": "sub-bench",
+            "region_id": int(getattr(r, "region_id")),
+            "file_id": None,
+            "region_pixels": clean_numeric(getattr(r, "region_pixels")),
+            "region_area_mm": clean_numeric(getattr(r, "region_area", None)),
+            "object_count": clean_numeric(getattr(r, "object_count", None)),
+            "object_pixels": clean_numeric(getattr(r, "object_pixels", None)),
+            "object_area_mm": clean_numeric(getattr(r, "object_area", None)),
+            "load": clean_numeric(getattr(r, "load")),
+            "norm_load": clean_numeric(getattr(r, "norm_load", None)),
+            "hemisphere": "left",
+        }
+        row.update({col: UNITS.get(unit) for col, unit in UNIT_COLUMNS.items()})
+        rows.append(row)
+    return pd.DataFrame(rows).dropna(subset=["region_pixels", "load"])
+
+
+def vectorized_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return build_counts_frame(df, "sub-bench", "left", None, UNITS)
+
+
+def median_seconds(fn, df, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(df)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="?", type=Path, help="Quant CSV (default: synthetic export)")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            path = Path(tmp) / "quant.csv"
+            synthetic_export(path, args.rows)
+        start = time.perf_counter()
+        df = load_table(path).rename(columns=RENAME_MAP)
+        read_s = time.perf_counter() - start
+
+    old = legacy_frame(df)
+    new = vectorized_frame(df)
+    same = old.astype(object).where(old.notna(), None).equals(new.astype(object).where(new.notna(), None))
+    legacy_s = median_seconds(legacy_frame, df, args.repeats)
+    vector_s = median_seconds(vectorized_frame, df, args.repeats)
+    print(f"{len(df)} rows (load_table {read_s:.2f}s), median of {args.repeats} runs, identical output: {same}")
+    print(f"{'method':<12}{'seconds':>10}{'rows/s':>14}")
+    for name, seconds in (("per-cell", legacy_s), ("vectorized", vector_s)):
+        print(f"{name:<12}{seconds:>10.3f}{len(df) / seconds:>14.0f}")
+    print(f"speedup: {legacy_s / vector_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark quant CSV reading: the previous load_table (python engine with sep=None sniffing and a
+TSV retry) vs. the current one (delimiter sniffed once, C engine). Also checks both return the same frame.
+
+Usage:
+  python scripts/bench_load_table.py                       # the 5 largest CSVs under the ETL data root
+  python scripts/bench_load_table.py --synthetic 100000 1000000
+  python scripts/bench_load_table.py path/to/a.csv path/to/b.csv --repeats 5
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import pandas as pd
+
+from bench_counts_prepare import synthetic_export
+from code.database.etl.paths import DATA_ROOT
+from code.database.etl.utils import load_table
+
+
+def legacy_load_table(csv_path) -> pd.DataFrame:
+    csv_path = Path(csv_path)
+    with csv_path.open("r", errors="ignore") as f:
+        first = f.readline()
+    skiprows = 0
+    sep = None
+    if first.lower().startswith("sep="):
+        sep = first.strip().split("=", 1)[1] or ";"
+        skiprows = 1
+    try:
+        df = pd.read_csv(csv_path, sep=sep, engine="python", skiprows=skiprows)
+    except Exception:
+        df = pd.read_csv(csv_path, sep="\t", engine="python", skiprows=skiprows)
+    df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
+    df = df.dropna(axis=1, how="all")
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def median_seconds(fn, path: Path, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(path)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def largest_exports(root: Path, n: int):
+    files = [p for p in root.rglob("*.csv") if p.is_file()] if root.exists() else []
+    return sorted(files, key=lambda p: p.stat().st_size, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="*", type=Path, help="Quant CSVs (default: largest under the data root)")
+    parser.add_argument("--largest", type=int, default=5)
+    parser.add_argument("--synthetic", type=int, nargs="*", help="Row counts of synthetic exports to generate")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = list(args.csv) or ([] if args.synthetic else largest_exports(DATA_ROOT, args.largest))
+        for rows in args.synthetic or ([] if paths else [100_000, 1_000_000]):
+            path = Path(tmp) / f"synthetic_{rows}.csv"
+            synthetic_export(path, rows)
+            paths.append(path)
+
+        print(f"median of {args.repeats} runs")
+        print(f"{'file':<40}{'MB':>8}{'rows':>10}{'python':>10}{'c':>10}{'speedup':>9}  same")
+        for path in paths:
+            old, new = legacy_load_table(path), load_table(path)
+            legacy_s = median_seconds(legacy_load_table, path, args.repeats)
+            fast_s = median_seconds(load_table, path, args.repeats)
+            size_mb = path.stat().st_size / 1e6
+            print(f"{path.name[:39]:<40}{size_mb:>8.1f}{len(new):>10}{legacy_s:>10.3f}{fast_s:>10.3f}"
+                  f"{legacy_s / fast_s:>8.1f}x  {old.equals(new)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark OME-Zarr chunk codecs and chunk shapes.
+Reports bytes on disk, chunk file count, write time and single-tile read latency per configuration.
+
+Usage:
+  python scripts/bench_zarr_codecs.py                       # synthetic 2-channel 4096x4096 uint16
+  python scripts/bench_zarr_codecs.py path/to/slide.tif --tile-sizes 256 512 1024
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import zarr
+
+from code.common.omezarr import CODECS, auto_chunks, write_multiscale
+
+
+def synthetic_image(channels: int, size: int, dtype=np.uint16) -> np.ndarray:
+    """Smooth background + sparse bright cells + noise, with a black border like our padded slices."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    img = np.empty((channels, size, size), dtype=np.float32)
+    for c in range(channels):
+        base = 400 + 300 * np.sin(6 * xx + c) * np.cos(4 * yy)
+        cells = np.zeros((size, size), dtype=np.float32)
+        ys, xs = rng.integers(0, size, 2000), rng.integers(0, size, 2000)
+        cells[ys, xs] = 20000
+        img[c] = base + cells + rng.normal(0, 30, (size, size))
+    pad = size // 8
+    img[:, :pad, :] = 0
+    img[:, -pad:, :] = 0
+    info = np.iinfo(dtype)
+    return np.clip(img, info.min, info.max).astype(dtype)
+
+
+def store_size(path: Path):
+    files = [p for p in path.rglob("*") if p.is_file()]
+    return sum(p.stat().st_size for p in files), len(files)
+
+
+def tile_latency_ms(path: Path, reads: int) -> float:
+    """Median time to open level 0 and read one random chunk-aligned tile."""
+    arr = zarr.open(str(path / "0"), mode="r")
+    rng = np.random.default_rng(1)
+    grid = [max(1, -(-s // c)) for s, c in zip(arr.shape, arr.chunks)]
+    times = []
+    for _ in range(reads):
+        idx = tuple(
+            slice(int(g) * c, int(g) * c + c)
+            for g, c in zip((rng.integers(0, n) for n in grid), arr.chunks)
+        )
+        start = time.perf_counter()
+        zarr.open(str(path / "0"), mode="r")[idx]
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark OME-Zarr codecs and chunk shapes.")
+    ap.add_argument("image", nargs="?", type=Path, help="Optional image to benchmark (defaults to synthetic data)")
+    ap.add_argument("--codecs", nargs="+", default=list(CODECS), choices=CODECS)
+    ap.add_argument("--tile-sizes", nargs="+", type=int, default=[256, 512, 1024])
+    ap.add_argument("--size", type=int, default=4096, help="Synthetic image edge length")
+    ap.add_argument("--channels", type=int, default=2, help="Synthetic channel count")
+    ap.add_argument("--levels", type=int, default=1, help="Pyramid levels to write per configuration")
+    ap.add_argument("--reads", type=int, default=50, help="Tile reads per configuration")
+    args = ap.parse_args()
+
+    if args.image:
+        from code.database.ingest_upload import load_image
+        data = load_image(args.image)
+    else:
+        data = synthetic_image(args.channels, args.size)
+    print(f"Image: shape={data.shape} dtype={data.dtype} raw={data.nbytes / 1e6:.1f} MB")
+    print(f"{'codec':<8} {'chunks':<18} {'MB on disk':>10} {'files':>6} {'write s':>8} {'tile ms':>8}")
+
+    workdir = Path(tempfile.mkdtemp(prefix="zarr-bench-"))
+    try:
+        for codec in args.codecs:
+            for tile in args.tile_sizes:
+                chunks = auto_chunks(data.shape, data.dtype, "cyx", tile_size=tile)
+                dest = workdir / f"{codec}-{tile}.ome.zarr"
+                start = time.perf_counter()
+                root = zarr.group(store=zarr.DirectoryStore(str(dest)))
+                write_multiscale(root, data, axes="cyx", chunks=chunks, levels=args.levels, codec=codec)
+                write_s = time.perf_counter() - start
+                size, files = store_size(dest)
+                latency = tile_latency_ms(dest, args.reads)
+                print(f"{codec:<8} {str(chunks):<18} {size / 1e6:>10.1f} {files:>6} {write_s:>8.2f} {latency:>8.2f}")
+                shutil.rmtree(dest, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+import os
 import sys
 from pathlib import Path
 
+# Keep the persistent hash cache out of the repo's data/ during tests; tests opt in per case
+os.environ.setdefault("HASH_CACHE_PATH", "")
+
 # Ensure project root is on sys.path so `import code.database...` works in tests
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+import zarr
+from PIL import Image
+
+from code.common.hashing import array_sha256, SIDECAR_DIGEST_KEY
+from code.database.etl import convert_to_zarr
+
+
+def make_slices(folder, sizes):
+    folder.mkdir(parents=True)
+    slices = []
+    for i, (h, w) in enumerate(sizes, start=1):
+        img = np.full((h, w), 10 * i, dtype=np.uint8)
+        Image.fromarray(img).save(folder / f"brain_s{i:03d}.png")
+        slices.append(img)
+    return slices
+
+
+def test_convert_subject_centers_and_streams(tmp_path, monkeypatch):
+    slices = make_slices(tmp_path / "src" / "RabiesX", [(40, 60), (80, 100), (20, 30)])
+    monkeypatch.setattr(convert_to_zarr, "SOURCE_ROOT", str(tmp_path / "src"))
+    monkeypatch.setattr(convert_to_zarr, "BIDS_ROOT", str(tmp_path / "bids"))
+
+    assert convert_to_zarr.read_dimensions(tmp_path / "src" / "RabiesX" / "brain_s002.png") == (80, 100, np.dtype("uint8"))
+
+    convert_to_zarr.convert_subject("RabiesX", {"subject": "sub-rab99", "session": "ses-01"}, levels=2)
+
+    store = tmp_path / "bids" / "sub-rab99" / "ses-01" / "micr" / "sub-rab99_ses-01_sample-01_run-01_micr.ome.zarr"
+    expected = np.zeros((3, 80, 100), dtype=np.uint8)
+    for i, img in enumerate(slices):
+        h, w = img.shape
+        y, x = (80 - h) // 2, (100 - w) // 2
+        expected[i, y:y + h, x:x + w] = img
+
+    root = zarr.open_group(str(store), mode="r")
+    np.testing.assert_array_equal(root["0"][:], expected)
+    assert root["1"].shape == (3, 40, 50)
+    sidecar = json.loads((store.parent / (store.name + ".json")).read_text())
+    assert sidecar[SIDECAR_DIGEST_KEY] == array_sha256(expected)
+
+
+def test_convert_subject_skips_unchanged_sources(tmp_path, monkeypatch):
+    make_slices(tmp_path / "src" / "RabiesX", [(16, 16), (16, 16)])
+    monkeypatch.setattr(convert_to_zarr, "SOURCE_ROOT", str(tmp_path / "src"))
+    monkeypatch.setattr(convert_to_zarr, "BIDS_ROOT", str(tmp_path / "bids"))
+    meta = {"subject": "sub-rab99", "session": "ses-01"}
+
+    assert convert_to_zarr.convert_subject("RabiesX", meta, levels=1) == "converted"
+    assert convert_to_zarr.convert_subject("RabiesX", meta, levels=1) == "up-to-date"
+    # Option changes and forced runs rebuild
+    assert convert_to_zarr.convert_subject("RabiesX", meta, levels=2) == "converted"
+    assert convert_to_zarr.convert_subject("RabiesX", meta, levels=2, force=True) == "converted"
+    # New source slice rebuilds
+    Image.fromarray(np.zeros((16, 16), dtype=np.uint8)).save(tmp_path / "src" / "RabiesX" / "brain_s003.png")
+    assert convert_to_zarr.convert_subject("RabiesX", meta, levels=2) == "converted"
+
+
+def test_select_subjects():
+    assert set(convert_to_zarr.select_subjects(["DBL_A", "sub-rab01"])) == {"DBL_A", "RabiesA_Vglut1"}
+    assert len(convert_to_zarr.select_subjects()) == len(convert_to_zarr.SUBJECT_MAP)
+    try:
+        convert_to_zarr.select_subjects(["sub-nope"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown subject accepted")
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from code.database.etl import counts_helper
+from code.database.etl.utils import clean_numeric
+
+UNITS = {"pixels": 1, "count": 3}
+
+
+def _legacy_rows(df, subject_id, hemisphere, file_id, unit_map):
+    """The previous per-cell implementation, kept here as the reference output."""
+    rows = []
+    for r in df.itertuples(index=False):
+        rows.append({
+            "subject_id": subject_id,
+            "region_id": int(getattr(r, "region_id")),
+            "file_id": file_id,
+            "region_pixels": clean_numeric(getattr(r, "region_pixels")),
+            "region_area_mm": clean_numeric(getattr(r, "region_area", None)),
+            "object_count": clean_numeric(getattr(r, "object_count", None)),
+            "object_pixels": clean_numeric(getattr(r, "object_pixels", None)),
+            "object_area_mm": clean_numeric(getattr(r, "object_area", None)),
+            "load": clean_numeric(getattr(r, "load")),
+            "norm_load": clean_numeric(getattr(r, "norm_load", None)),
+            "hemisphere": hemisphere,
+            "region_pixels_unit_id": unit_map.get("pixels"),
+            "region_area_unit_id": unit_map.get("pixels"),
+            "object_count_unit_id": unit_map.get("count"),
+            "object_pixels_unit_id": unit_map.get("pixels"),
+            "object_area_unit_id": unit_map.get("pixels"),
+            "load_unit_id": unit_map.get("pixels"),
+        })
+    return pd.DataFrame(rows).dropna(subset=["region_pixels", "load"])
+
+
+def test_vectorized_counts_frame_matches_per_cell_version():
+    raw = pd.DataFrame({
+        "Region ID": [10, 20, 30, 40, 50],
+        "Region name": ["a", "b", "c", "d", "e"],
+        "Region pixels": ["100", " 250 ", "N/A", "7", "n/a"],
+        "Region area": [1.5, np.nan, 2.0, 3.0, 4.0],
+        "Object count": ["N/A", "3", "junk", "", "5"],
+        "Load": [0.1, 0.2, 0.3, np.nan, 0.5],
+    }).rename(columns=counts_helper.RENAME_MAP)
+
+    for file_id in (7, None):
+        new = counts_helper.build_counts_frame(raw, "sub-x", "left", file_id, UNITS)
+        old = _legacy_rows(raw, "sub-x", "left", file_id, UNITS)
+        assert list(new.columns) == list(old.columns) and list(new.index) == [0, 1]
+        assert_frame_equal(new.astype(object).where(new.notna(), None),
+                           old.astype(object).where(old.notna(), None), check_dtype=False)
+    assert new["region_id"].dtype == np.int64 and new["region_pixels"].dtype == np.float64
+    assert np.isnan(new["object_count"].iloc[0])  # "N/A" -> NaN
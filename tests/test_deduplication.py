@@ -0,0 +1,75 @@
+from code.database import deduplication
+
+
+class _Result:
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+
+
+class RecordingConn:
+    """Stands in for a Connection; records (sql, params) and reports every row as inserted."""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, stmt, params):
+        self.calls.append((str(stmt), params))
+        return _Result(len(next(iter(params.values()))))
+
+
+def test_insert_batch_hashes_uses_paged_set_based_statements():
+    batches = [(f"batch{b}", None, [f"sha{b}-{i}" for i in range(500)]) for b in range(20)]
+    batches.append(("batch0", "dup", ["sha0-0", "sha0-0"]))
+    conn = RecordingConn()
+
+    inserted = deduplication.insert_batch_hashes(conn, batches, page_size=4000)
+
+    batch_calls = [c for c in conn.calls if "microscopy_batches" in c[0]]
+    file_calls = [c for c in conn.calls if "microscopy_batch_files" in c[0]]
+    assert len(batch_calls) == 1 and inserted == 21
+    assert batch_calls[0][1]["n"][0] == ""
+    # 10k distinct (batch, sha) pairs in 3 statements rather than one per hash
+    assert [len(p["s"]) for _, p in file_calls] == [4000, 4000, 2000]
+    pairs = [pair for _, p in file_calls for pair in zip(p["c"], p["s"])]
+    assert len(pairs) == len(set(pairs)) == 10_000 and pairs == sorted(pairs)
+    assert all("unnest" in sql for sql, _ in conn.calls)
+
+
+class FakeEngine:
+    """Engine stand-in whose connections answer the duplicate check with a fixed reason."""
+
+    url = "postgresql://fake/dedup"
+
+    def __init__(self, reason):
+        self.conn = RecordingConn()
+        self.reason = reason
+
+    def connect(self):
+        engine = self
+
+        class _Ctx:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, stmt, params):
+                engine.conn.calls.append((str(stmt), params))
+                return type("R", (), {"scalar": lambda _self: engine.reason})()
+
+        return _Ctx()
+
+
+def test_duplicate_check_is_one_query(monkeypatch):
+    monkeypatch.setattr(deduplication, "_schema_checked", {FakeEngine.url})
+    shas = [f"{i:064x}" for i in range(10)]
+
+    engine = FakeEngine("strong overlap")
+    reason = deduplication.check_microscopy_duplicate(engine, "b" * 64, shas, overlap_threshold=0.8)
+    assert reason == f"{deduplication.DUPLICATE_MESSAGE} (strong overlap)."
+    [(sql, params)] = engine.conn.calls
+    assert params == {"c": "b" * 64, "shas": shas, "n": 10, "k": 8}
+    assert sql.index("batch match") < sql.index("batch seen") < sql.index("file hash match") < sql.index("exact set match")
+
+    assert deduplication.check_microscopy_duplicate(FakeEngine(None), "b" * 64, []) is None
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 
+import pandas as pd
 import pytest
 
 from code.database.etl import utils
@@ -46,3 +47,31 @@ def test_file_sha256_directory(tmp_path: Path):
     h3 = utils.file_sha256(tmp_path)
     assert h3 != h1
 
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "sep=;\nRegion ID;Region name;Region pixels;Load;\n1;Root, all;100;0.1;\n2;B;N/A;0.2;\n",
+        "Region ID,Region name,Region pixels,Load\n1,\"Root, all\",100,0.1\n2,B,N/A,0.2\n",
+        " Region ID \tRegion name\tRegion pixels\tLoad\n1\tRoot, all\t100\t0.1\n2\tB\tN/A\t0.2\n",
+    ],
+)
+def test_load_table_sniffs_delimiter_once(tmp_path: Path, text: str):
+    path = tmp_path / "quant.csv"
+    path.write_text(text)
+    df = utils.load_table(path)
+    assert list(df.columns) == ["Region ID", "Region name", "Region pixels", "Load"]
+    assert df["Region ID"].tolist() == [1, 2] and df["Region ID"].dtype == "int64"
+    assert df["Region name"].tolist() == ["Root, all", "B"]
+    assert df["Region pixels"].iloc[0] == 100 and pd.isna(df["Region pixels"].iloc[1])
+
+
+def test_load_table_falls_back_when_header_misleads_sniffer(tmp_path: Path):
+    # The header alone sniffs as ',' and the C engine then trips over the quoted row
+    path = tmp_path / "quant.csv"
+    path.write_text('Region ID;Region name, full;Count\n1;Olfactory bulb;5\n2;"Piriform, anterior, right";7\n')
+    df = utils.load_table(path)
+    assert list(df.columns) == ["Region ID", "Region name, full", "Count"]
+    assert df["Region name, full"].tolist() == ["Olfactory bulb", "Piriform, anterior, right"]
+    assert df["Count"].tolist() == [5, 7]
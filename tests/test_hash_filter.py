@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from code.api.services import uploads
+from code.database import hash_filter
+
+
+class FakeEngine:
+    """Serves (hash, created_at) rows; records the `since` each fetch asked for."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def connect(self):
+        engine = self
+
+        class _Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, stmt, params):
+                since = params.get("since")
+                engine.queries.append(since)
+                rows = [r for r in engine.rows if since is None or r[1] >= since]
+                return type("R", (), {"fetchall": lambda _self: rows})()
+
+        return _Conn()
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = hash_filter.BloomFilter(10_000, fp_rate=0.01)
+    known = [f"{i:064x}" for i in range(10_000)]
+    for h in known:
+        bloom.add(h)
+    assert all(h in bloom for h in known)
+    assert known[0].upper() in bloom
+    false_pos = sum(f"{i:064x}" in bloom for i in range(10_000, 30_000))
+    assert false_pos < 20_000 * 0.02
+
+
+def test_known_hashes_short_circuits_new_uploads(monkeypatch):
+    t0 = datetime(2026, 1, 1)
+    engine = FakeEngine([("a" * 64, t0), ("b" * 64, t0)])
+    known = hash_filter.KnownHashes()
+    monkeypatch.setattr(uploads, "known_hashes", known)
+    assert known.may_contain_any(["c" * 64])  # not loaded yet: everything is a possible hit
+
+    calls = []
+    monkeypatch.setattr(uploads, "check_microscopy_duplicate", lambda *a: calls.append(a) or "dup")
+    assert uploads.check_dup_by_hashes(engine, ["c" * 64, "d" * 64]) is None
+    assert calls == [] and engine.queries == [None]
+    assert uploads.check_dup_by_hashes(engine, ["a" * 64]) == "dup"
+
+    # Own ingests are visible at once; other workers' rows arrive with the incremental refresh
+    known.add("c" * 64)
+    assert known.may_contain_any(["c" * 64])
+    engine.rows.append(("e" * 64, t0 + timedelta(hours=1)))
+    monkeypatch.setattr(hash_filter, "HASH_FILTER_REFRESH_SECONDS", 0)
+    known.refresh(engine)
+    assert engine.queries[-1] == t0 - hash_filter.REFRESH_OVERLAP
+    assert known.may_contain_any(["e" * 64])
+
+    # The overlap window re-reads rows already in the filter without inflating its element count
+    count = known._filter.count
+    known.refresh(engine)
+    known.add("a" * 64)
+    assert known._filter.count == count == 4
@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from code.common import hash_cache, hashing
+
+
+def test_pixel_digest_streaming_matches_full_array():
+    vol = np.arange(3 * 4 * 5, dtype=np.uint16).reshape(3, 4, 5)
+    digest = hashing.PixelDigest(vol.shape, vol.dtype)
+    for z in range(vol.shape[0]):
+        digest.update(vol[z])
+    assert digest.hexdigest() == hashing.array_sha256(vol)
+
+    # Same bytes with a different shape/dtype must not collide
+    assert hashing.array_sha256(vol.reshape(4, 3, 5)) != hashing.array_sha256(vol)
+    assert hashing.array_sha256(vol.view(np.int16)) != hashing.array_sha256(vol)
+
+
+def test_sidecar_sha256(tmp_path: Path):
+    store = tmp_path / "sub-foo_ses-01_run-01_micr.ome.zarr"
+    store.mkdir()
+    assert hashing.sidecar_sha256(store) is None
+
+    sidecar = store.with_suffix(store.suffix + ".json")
+    sidecar.write_text(json.dumps({hashing.SIDECAR_DIGEST_KEY: "a" * 64}))
+    assert hashing.sidecar_sha256(store) == "a" * 64
+
+    sidecar.write_text("{not json")
+    assert hashing.sidecar_sha256(store) is None
+
+
+def test_tree_sha256_is_merkle_and_incremental(tmp_path: Path, monkeypatch):
+    store = tmp_path / "img.zarr"
+    (store / "0").mkdir(parents=True)
+    (store / ".zgroup").write_text("{}")
+    (store / "0" / "0.0").write_bytes(b"a" * 100)
+    (store / "0" / "0.1").write_bytes(b"b" * 100)
+
+    before = sorted(p.relative_to(store).as_posix() for p in store.rglob("*"))
+    digest = hashing.file_sha256(store)
+    assert not hashing.manifest_path(store).exists()
+    assert digest == hashing.tree_sha256(store, workers=1, reuse_manifest=False)
+    # The manifest lives next to the store; hashing never adds files inside it
+    assert sorted(p.relative_to(store).as_posix() for p in store.rglob("*")) == before
+    assert hashing.manifest_path(store) == tmp_path / "img.zarr.hash-manifest.json"
+    manifest = hashing.read_manifest(store)
+    assert manifest["root"] == digest and set(manifest["files"]) == {".zgroup", "0/0.0", "0/0.1"}
+
+    # The root only depends on names and contents, not on where the tree lives
+    other = tmp_path / "copy.zarr"
+    (other / "0").mkdir(parents=True)
+    for rel in (".zgroup", "0/0.0", "0/0.1"):
+        (other / rel).write_bytes((store / rel).read_bytes())
+    assert hashing.tree_sha256(other, write_manifest=False) == digest
+
+    # Re-verification only re-reads modified files
+    (store / "0" / "0.1").write_bytes(b"c" * 100)
+    (store / "0" / "0.2").write_bytes(b"d")
+    read = []
+    original = hashing._stream_sha256
+    monkeypatch.setattr(hashing, "_stream_sha256", lambda p, *a: read.append(p.name) or original(p, *a))
+    diff = hashing.diff_tree(store)
+    assert sorted(read) == ["0.1", "0.2"]
+    assert diff["changed"] == ["0/0.1"] and diff["added"] == ["0/0.2"] and diff["removed"] == []
+    assert diff["previous_root"] == digest != diff["root"]
+
+
+def test_hash_cache_skips_unchanged_files(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(hash_cache, "HASH_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(hash_cache, "_default", None)
+    src = tmp_path / "counts.csv"
+    src.write_text("region,count\nA,1\n")
+
+    digest = hashing.file_sha256(src)
+    read = []
+    original = hashing._stream_sha256
+    monkeypatch.setattr(hashing, "_stream_sha256", lambda p, *a: read.append(p.name) or original(p, *a))
+    assert hashing.file_sha256(src) == digest
+    assert read == []
+    assert hash_cache.hash_cache_stats() == {"hash_cache_hits": 1, "hash_cache_misses": 1}
+
+    # Any change to size/mtime/inode invalidates the entry; the cache persists across instances
+    src.write_text("region,count\nA,2\n")
+    assert hashing.file_sha256(src) != digest and read == ["counts.csv"]
+    hash_cache.get_hash_cache().close()
+    reopened = hash_cache.HashCache(tmp_path / "cache.sqlite3")
+    assert reopened.lookup(src.resolve(), src.stat()) == hashing._stream_sha256(src)
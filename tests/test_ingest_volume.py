@@ -0,0 +1,42 @@
+import numpy as np
+import tifffile
+import zarr
+from PIL import Image
+
+from code.common.hashing import array_sha256
+from code.database import ingest_upload
+
+
+def test_volume_from_png_slices_is_ordered_and_centered(tmp_path):
+    sizes = {3: (10, 12), 1: (20, 24), 2: (16, 16)}
+    files = []
+    for n, (h, w) in sizes.items():
+        path = tmp_path / f"brain_s{n:03d}.png"
+        Image.fromarray(np.full((h, w), n, dtype=np.uint8)).save(path)
+        files.append(path)
+
+    dest = tmp_path / "out" / "vol.ome.zarr"
+    sha, count = ingest_upload.write_volume_omezarr(files, dest, pixel_size_um=0.5, z_spacing_um=50, levels=2)
+
+    root = zarr.open_group(str(dest), mode="r")
+    vol = root["0"][:]
+    assert count == 3 and vol.shape == (3, 20, 24)
+    assert [int(vol[z].max()) for z in range(3)] == [1, 2, 3]
+    assert vol[2, 5:15, 6:18].min() == 3 and vol[2, :5].max() == 0
+    assert sha == array_sha256(vol)
+    scale = root.attrs["multiscales"][0]["datasets"][0]["coordinateTransformations"][0]["scale"]
+    np.testing.assert_allclose(scale, [50e-6, 0.5e-6, 0.5e-6])
+
+
+def test_volume_from_multipage_rgb_tiff(tmp_path):
+    pages = np.random.default_rng(0).integers(0, 255, size=(4, 8, 9, 3), dtype=np.uint8)
+    path = tmp_path / "stack.tif"
+    tifffile.imwrite(path, pages, photometric="rgb")
+
+    dest = tmp_path / "stack.ome.zarr"
+    _, count = ingest_upload.write_volume_omezarr([path], dest, pixel_size_um=1.0, levels=1)
+
+    root = zarr.open_group(str(dest), mode="r")
+    assert count == 4
+    assert [a["name"] for a in root.attrs["multiscales"][0]["axes"]] == ["c", "z", "y", "x"]
+    np.testing.assert_array_equal(root["0"][:], np.moveaxis(pages, -1, 0))
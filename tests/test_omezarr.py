@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+import zarr
+
+from code.common import omezarr
+
+
+def test_downsample_methods():
+    import dask.array as da
+
+    img = da.from_array(np.array([[1, 3, 5], [7, 9, 11]], dtype=np.uint8)[np.newaxis], chunks=(1, 2, 3))
+    assert omezarr.downsample(img, "mean").compute().tolist() == [[[5]]]
+    assert omezarr.downsample(img, "max").compute().tolist() == [[[9]]]
+    assert omezarr.downsample(img, "nearest").compute().tolist() == [[[1]]]
+    assert omezarr.downsample(img, "mean").dtype == np.uint8
+    with pytest.raises(ValueError):
+        omezarr.downsample(img, "bicubic")
+
+
+def test_write_multiscale_levels(tmp_path):
+    vol = np.random.default_rng(0).integers(0, 255, size=(2, 100, 70), dtype=np.uint8)
+    root = zarr.group(store=zarr.DirectoryStore(str(tmp_path / "img.ome.zarr")))
+    datasets = omezarr.write_multiscale(root, vol, axes="zyx", chunks=(1, 32, 32), levels=3)
+
+    assert [d["path"] for d in datasets] == ["0", "1", "2"]
+    assert root["0"].shape == (2, 100, 70)
+    assert root["1"].shape == (2, 50, 35)
+    assert root["2"].shape == (2, 25, 17)
+    np.testing.assert_array_equal(root["0"][:], vol)
+    assert datasets[2]["coordinateTransformations"][0]["scale"] == [1.0, 4.0, 4.0]
+    assert root.attrs["multiscales"][0]["axes"][0]["name"] == "z"
+
+
+def test_auto_chunks_follows_tile_size_and_dtype():
+    assert omezarr.auto_chunks((3, 8000, 9000), np.uint8, "cyx") == (3, 512, 512)
+    assert omezarr.auto_chunks((200, 8000, 9000), np.uint16, "zyx", tile_size=1024) == (1, 1024, 1024)
+    # Wide dtypes shrink the tile to stay under the byte ceiling
+    assert omezarr.auto_chunks((1, 8000, 8000), np.float64, "zyx", tile_size=2048) == (1, 512, 512)
+    # Small images never get chunks bigger than the next power of two
+    assert omezarr.auto_chunks((1, 300, 200), np.uint8, "cyx") == (1, 512, 512)
+    assert omezarr.auto_chunks((1, 100, 60), np.uint8, "cyx") == (1, 128, 128)
+
+
+def test_make_compressor():
+    comp = omezarr.make_compressor("zstd", 3, "bitshuffle")
+    assert comp.cname == "zstd" and comp.clevel == 3
+    assert omezarr.make_compressor("none") is None
+    with pytest.raises(ValueError):
+        omezarr.make_compressor("brotli")
+
+
+def test_fill_value_chunks_are_not_written(tmp_path):
+    vol = np.zeros((2, 128, 128), dtype=np.uint8)
+    vol[:, 40:60, 40:60] = 7  # content only in the top-left 64x64 chunk
+    root = zarr.group(store=zarr.DirectoryStore(str(tmp_path / "img.ome.zarr")))
+    omezarr.write_multiscale(root, vol, axes="zyx", chunks=(1, 64, 64), levels=2)
+
+    level0 = sorted(p.name for p in (tmp_path / "img.ome.zarr" / "0").iterdir() if not p.name.startswith("."))
+    assert level0 == ["0.0.0", "1.0.0"]
+    np.testing.assert_array_equal(root["0"][:], vol)
+
+
+def test_intensity_stats_in_omero_block(tmp_path):
+    from code.common.intensity import histogram_percentile
+
+    vol = np.zeros((3, 64, 64), dtype=np.uint16)
+    vol[0] = 100
+    vol[1, :32] = 1000
+    vol[2] = np.arange(64 * 64, dtype=np.uint16).reshape(64, 64)
+    root = zarr.group(store=zarr.DirectoryStore(str(tmp_path / "img.ome.zarr")))
+    omezarr.write_multiscale(root, vol, axes="zyx", chunks=(1, 32, 32), levels=2)
+
+    omero = root.attrs["omero"]
+    (channel,) = omero["channels"]
+    assert channel["window"]["min"] == 0 and channel["window"]["max"] == 4095
+    assert sum(channel["histogram"]) == vol.size
+    assert [s["max"] for s in channel["slices"]] == [100, 1000, 4095]
+    assert sum(channel["slices"][1]["histogram"]) == 64 * 64
+    assert channel["slices"][0]["contrast_limits"]["start"] >= 96
+    lo, hi = omezarr.read_contrast_limits(root)
+    assert 0 <= lo < hi <= 4096
+
+    counts = np.array([0, 10, 0, 10])
+    edges = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+    assert histogram_percentile(counts, edges, 50) == 2.0
+    assert histogram_percentile(counts, edges, 100) == 4.0
+
+
+def test_intensity_stats_per_channel(tmp_path):
+    import dask.array as da
+
+    from code.common.intensity import compute_intensity_stats
+
+    img = np.zeros((3, 2, 16, 16), dtype=np.uint8)  # czyx
+    img[0] = 10
+    img[2, 1] = 200
+    stats = compute_intensity_stats(da.from_array(img, chunks=(1, 1, 8, 8)), "czyx")
+    assert [c["max"] for c in stats["channels"]] == [10, 0, 200]
+    assert [s["max"] for s in stats["channels"][2]["slices"]] == [0, 200]
+    assert len(stats["channels"][0]["slices"]) == 2
+
@@ -0,0 +1,99 @@
+import io
+
+import numpy as np
+import zarr
+from PIL import Image
+
+from code.common import omezarr, phash
+
+
+def _slide(seed: int, size: int = 512) -> np.ndarray:
+    """Blobby 16-bit 'tissue' so hashes see structure rather than noise."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size] / size
+    img = np.zeros((size, size))
+    for cy, cx, r in rng.uniform(0.1, 0.9, size=(12, 3)):
+        img += np.exp(-((yy - cy) ** 2 + (xx - cx) ** 2) / (0.02 * r))
+    return (img / img.max() * 30000 + rng.normal(0, 300, img.shape)).clip(0, 65535).astype(np.uint16)
+
+
+def test_perceptual_hash_survives_reencoding_and_crop():
+    slide = _slide(0)
+    ref = phash.phash(slide)
+
+    # 8-bit JPEG re-export of the same slide
+    buf = io.BytesIO()
+    Image.fromarray((slide >> 8).astype(np.uint8)).save(buf, format="JPEG", quality=60)
+    jpeg = np.asarray(Image.open(io.BytesIO(buf.getvalue())))
+    assert phash.hamming(ref, phash.phash(jpeg)) <= 4
+    assert phash.hamming(phash.dhash(slide), phash.dhash(jpeg)) <= 6
+
+    cropped = slide[8:-8, 8:-8]
+    assert phash.hamming(ref, phash.phash(cropped)) <= 6
+    assert phash.hamming(ref, phash.phash(_slide(1))) > 12
+
+    assert phash.to_unsigned(phash.to_signed(2 ** 64 - 1)) == 2 ** 64 - 1
+    assert -(2 ** 63) <= phash.to_signed(2 ** 64 - 1) < 2 ** 63
+
+
+def test_bk_tree_matches_brute_force():
+    rng = np.random.default_rng(3)
+    hashes = [int(h) for h in rng.integers(0, 2 ** 63, size=2000, dtype=np.int64)]
+    tree = phash.BKTree.from_items((h, i) for i, h in enumerate(hashes))
+    query = hashes[17] ^ 0b1011  # 3 bits away from item 17
+    expected = sorted((phash.hamming(query, h), i) for i, h in enumerate(hashes) if phash.hamming(query, h) <= 8)
+    assert sorted(tree.search(query, 8)) == expected
+    assert tree.search(query, 3)[0] == (3, 17)
+
+
+def test_store_hashes_reads_a_coarse_level(tmp_path):
+    store = tmp_path / "img.ome.zarr"
+    vol = np.stack([_slide(0), _slide(0)])
+    root = zarr.group(store=zarr.DirectoryStore(str(store)))
+    omezarr.write_multiscale(root, vol, axes="zyx", chunks=(1, 128, 128), levels=4, stats=False)
+
+    ph, dh = phash.store_hashes(store)
+    assert phash.hamming(ph, phash.phash(vol[1])) <= 4
+    assert phash.hamming(dh, phash.dhash(vol[1])) <= 6
+
+
+def test_perceptual_index_picks_up_backfilled_rows():
+    from datetime import datetime, timedelta
+
+    from code.database import near_duplicates
+
+    class FakeEngine:
+        """Serves (file_id, phash, phash_set_at) rows at or after the requested `since`."""
+
+        def __init__(self, rows):
+            self.rows = rows
+
+        def connect(self):
+            engine = self
+
+            class _Conn:
+                def __enter__(self):
+                    return self
+
+                def __exit__(self, *exc):
+                    return False
+
+                def execute(self, stmt, params):
+                    since = params.get("since")
+                    rows = [r for r in engine.rows if since is None or (r[2] is not None and r[2] >= since)]
+                    return type("R", (), {"fetchall": lambda _self: rows})()
+
+            return _Conn()
+
+    t0 = datetime(2026, 1, 1)
+    engine = FakeEngine([(1, phash.to_signed(0b1111), t0), (2, phash.to_signed(2 ** 63), None)])
+    index = near_duplicates.PerceptualIndex()
+    index.refresh(engine)
+    assert sorted(index.search(0b1111, 0)) == [(0, 1)]
+    assert index.search(2 ** 63, 0) == [(0, 2)]  # legacy row without phash_set_at, seen on first load
+
+    # File 0 was registered before file 1 (lower id) but only got its hash from the backfill now
+    engine.rows.append((0, phash.to_signed(0b1110), t0 + timedelta(hours=1)))
+    index.refresh(engine)
+    index.refresh(engine)  # overlap window re-reads rows without indexing them twice
+    assert index.search(0b1111, 1) == [(0, 1), (1, 0)]
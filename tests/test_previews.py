@@ -0,0 +1,26 @@
+import json
+
+import numpy as np
+import zarr
+from PIL import Image
+
+from code.common import omezarr
+from code.common.previews import INDEX_NAME, PREVIEW_DIR, SPRITE_NAME, write_previews
+
+
+def test_write_previews_packs_one_tile_per_slice(tmp_path):
+    store = tmp_path / "img.ome.zarr"
+    vol = np.random.default_rng(0).integers(0, 4000, size=(5, 400, 200), dtype=np.uint16)
+    root = zarr.group(store=zarr.DirectoryStore(str(store)))
+    omezarr.write_multiscale(root, vol, axes="zyx", chunks=(1, 64, 64), levels=4)
+
+    index = write_previews(store, size=64)
+
+    # Level 2 (100x50) is the smallest level whose long edge still covers 64px
+    assert index["source_level"] == "2"
+    assert (index["tile_width"], index["tile_height"]) == (32, 64)
+    assert index["count"] == 5 and index["columns"] == 3 and index["rows"] == 2
+    assert index["slices"][4] == {"z": 4, "x": 32, "y": 64}
+    assert json.loads((store / PREVIEW_DIR / INDEX_NAME).read_text()) == index
+    with Image.open(store / PREVIEW_DIR / SPRITE_NAME) as sprite:
+        assert sprite.size == (96, 128)
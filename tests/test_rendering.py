@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+import zarr
+from PIL import Image
+
+from code.api.services import rendering
+from code.api.services.disk_cache import DiskLRU
+from code.common import omezarr
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(rendering, "render_cache", DiskLRU(tmp_path / "cache", 10 * 1024 * 1024))
+    path = tmp_path / "img.ome.zarr"
+    vol = np.zeros((2, 256, 512), dtype=np.uint16)
+    vol[1, :, 256:] = 1000
+    root = zarr.group(store=zarr.DirectoryStore(str(path)))
+    omezarr.write_multiscale(root, vol, axes="zyx", chunks=(1, 64, 64), levels=3)
+    return path
+
+
+def test_choose_level():
+    shapes = [(1024, 2048), (512, 1024), (256, 512)]
+    assert rendering.choose_level(shapes, rendering.Region(0, 0, 2048, 1024), 512) == 2
+    assert rendering.choose_level(shapes, rendering.Region(0, 0, 2048, 1024), 1500) == 0
+    assert rendering.choose_level(shapes, rendering.Region(0, 0, 200, 200), 512) == 0
+
+
+def test_render_slice_uses_pyramid_and_cache(store):
+    path, key = rendering.render_slice(store, "digest", 1, size=128, fmt="png")
+    with Image.open(path) as img:
+        assert img.size == (128, 64) and img.mode == "L"
+        pixels = np.asarray(img)
+    assert pixels[:, :60].max() == 0 and pixels[:, 68:].min() >= 250
+
+    again, again_key = rendering.render_slice(store, "digest", 1, size=128, fmt="png")
+    assert (again, again_key) == (path, key)
+    region_path, _ = rendering.render_slice(store, "digest", 1, region=rendering.Region(256, 0, 64, 64), fmt="webp")
+    with Image.open(region_path) as img:
+        assert img.size == (64, 64)
+
+    with pytest.raises(ValueError):
+        rendering.render_slice(store, "digest", 5)
+    with pytest.raises(ValueError):
+        rendering.render_slice(store, "digest", 0, region=rendering.Region(600, 0, 10, 10))
+
+
+def test_disk_lru_evicts_oldest(tmp_path):
+    import os
+
+    cache = DiskLRU(tmp_path, max_bytes=25)
+    for i, name in enumerate(["a", "b", "c"]):
+        path = cache.put(f"{name}{name}key", b"x" * 10)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    assert cache.get("aakey") is None
+    assert cache.get("cckey") is not None
+
+
+def test_deep_zoom_tiles(store):
+    from code.api.services import tiles
+
+    # 256x512 image: top level 9, whole image in one 256px tile at level 8
+    assert tiles.max_level(256, 512) == 9
+    assert tiles.single_tile_level(256, 512) == 8
+    assert tiles.level_grid(256, 512, 9) == (256, 512, 2, 1)
+
+    path, _ = tiles.render_tile(store, "digest", 1, 9, 1, 0, "png")
+    with Image.open(path) as img:
+        assert img.size == (256, 256)
+        assert np.asarray(img).min() >= 250
+    path, _ = tiles.render_tile(store, "digest", 1, 8, 0, 0, "png")
+    with Image.open(path) as img:
+        assert img.size == (256, 128)
+    with pytest.raises(ValueError):
+        tiles.render_tile(store, "digest", 1, 9, 2, 0)
+
+    assert tiles.pregenerate_tiles(store, "digest", levels=1) == 2 * (1 + 2)
+    assert 'TileSize="256"' in tiles.dzi_descriptor(256, 512)
+    assert tiles.tilejson_descriptor(256, 512, "/t/{z}/{x}/{y}.webp")["minzoom"] == 8
+
+
+def test_projections_cached_by_digest(store):
+    from code.api.services import projections
+
+    proj, axes, level = projections.compute_projection(store, "max", "z", level=0)
+    assert axes == "yx" and level == 0 and proj.shape == (256, 512)
+    assert proj[:, 256:].min() == 1000 and proj[:, :256].max() == 0
+    mean, _, _ = projections.compute_projection(store, "mean", "z", level=1)
+    assert mean.shape == (128, 256) and mean[0, -1] == pytest.approx(500.0)
+    side, axes, _ = projections.compute_projection(store, "sum", "y", level=0)
+    assert axes == "zx" and side.shape == (2, 512) and side[1, -1] == 256 * 1000
+
+    raw_path, _ = projections.get_projection(store, "digest", "max", "z", level=0, fmt="npy")
+    np.testing.assert_array_equal(np.load(raw_path), proj)
+    png_path, key = projections.get_projection(store, "digest", "max", "z", level=0, fmt="png")
+    with Image.open(png_path) as img:
+        assert img.size == (512, 256)
+    assert projections.get_projection(store, "digest", "max", "z", level=0, fmt="png") == (png_path, key)
+    assert projections.precompute_projections(store, "digest") == 2
+    with pytest.raises(ValueError):
+        projections.compute_projection(store, "max", "c")
+
+
+def test_warm_store_caches_logs_failures(store, tmp_path, caplog):
+    from code.api.services import uploads
+
+    missing = tmp_path / "missing.ome.zarr"
+    uploads.warm_store_caches([missing, store])
+    assert "Tile pregeneration failed" in caplog.text
+    assert "Projection precompute failed" in caplog.text
+    assert rendering.render_cache._files()
+
+
+def test_explicit_level_read_is_capped(store, monkeypatch):
+    monkeypatch.setattr(rendering, "RENDER_MAX_SIZE", 300)
+    with pytest.raises(ValueError, match="coarser level"):
+        rendering.render_slice(store, "digest", 0, level=0, fmt="png")
+    rendering.render_slice(store, "digest", 0, level=1, fmt="png")
+    rendering.render_slice(store, "digest", 0, region=rendering.Region(0, 0, 256, 256), level=0, fmt="png")
@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pytest
+import tifffile
+import zarr
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from code.api.routes import microscopy
+from code.api.services import roi, uploads
+from code.common import omezarr
+
+
+@pytest.fixture
+def volume(tmp_path, monkeypatch):
+    vol = np.random.default_rng(1).integers(0, 1000, size=(3, 4, 100, 90), dtype=np.uint16)
+    store = tmp_path / "sub-x_run-01_micr.ome.zarr"
+    omezarr.write_multiscale(zarr.group(store=zarr.DirectoryStore(str(store))), vol, axes="czyx", levels=2, stats=False)
+    monkeypatch.setattr(microscopy, "get_engine", lambda: None)
+    monkeypatch.setattr(uploads, "get_microscopy_file", lambda engine, fid: {"path": str(store)} if fid == 1 else None)
+    app = FastAPI()
+    app.include_router(microscopy.router)
+    return vol, store, TestClient(app)
+
+
+def test_roi_formats(volume, tmp_path):
+    vol, _, client = volume
+    expected = vol[:, 1:3, 10:50, :30]
+    params = {"z0": 1, "z1": 3, "y0": 10, "y1": 50, "x1": 30}
+
+    resp = client.get("/api/v1/microscopy/1/roi", params={**params, "format": "npy"})
+    assert resp.status_code == 200 and resp.headers["x-roi-shape"] == "3,2,40,30"
+    np.testing.assert_array_equal(np.load(io.BytesIO(resp.content)), expected)
+
+    resp = client.get("/api/v1/microscopy/1/roi", params={**params, "format": "tiff"})
+    np.testing.assert_array_equal(tifffile.imread(io.BytesIO(resp.content)).reshape(expected.shape), expected)
+
+    resp = client.get("/api/v1/microscopy/1/roi", params={**params, "format": "zarr.zip"})
+    (tmp_path / "out.zip").write_bytes(resp.content)
+    np.testing.assert_array_equal(zarr.open(zarr.ZipStore(str(tmp_path / "out.zip"), mode="r"))[:], expected)
+
+    # Level 1 halves y/x; bounds stay in full-resolution pixels
+    resp = client.get("/api/v1/microscopy/1/roi", params={"level": 1, "y0": 10, "y1": 50})
+    assert resp.headers["x-roi-shape"] == "3,4,20,45"
+
+
+def test_roi_limits(volume, monkeypatch):
+    _, _, client = volume
+    assert client.get("/api/v1/microscopy/1/roi", params={"y0": 200}).status_code == 400
+    assert client.get("/api/v1/microscopy/1/roi", params={"level": 5}).status_code == 400
+    assert client.get("/api/v1/microscopy/1/roi", params={"format": "hdf5"}).status_code == 422
+
+    slots = roi.extraction_slots
+    held = 0
+    while slots.acquire(blocking=False):
+        held += 1
+    try:
+        assert client.get("/api/v1/microscopy/1/roi", params={"level": 1}).status_code == 503
+    finally:
+        for _ in range(held):
+            slots.release()
+
+    monkeypatch.setattr(roi, "ROI_MAX_BYTES", 100)
+    assert client.get("/api/v1/microscopy/1/roi").status_code == 413
+
+
+def test_slot_lease_released_once():
+    import threading
+
+    slots = threading.BoundedSemaphore(1)
+    lease = roi.acquire_slot(slots)
+    assert lease is not None and roi.acquire_slot(slots) is None
+    # Never-started stream: only the response's background task releases, and a second release is a no-op
+    roi.stream_roi(None, "npy", release=lease)
+    lease.release()
+    lease.release()
+    assert roi.acquire_slot(slots) is not None
+
+
+def test_roi_request_frees_slot(volume):
+    _, _, client = volume
+    assert client.get("/api/v1/microscopy/1/roi", params={"level": 1}).status_code == 200
+    leases = [roi.acquire_slot() for _ in range(roi.ROI_MAX_CONCURRENT)]
+    try:
+        assert all(leases)
+    finally:
+        for lease in leases:
+            if lease:
+                lease.release()
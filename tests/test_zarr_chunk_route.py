@@ -0,0 +1,139 @@
+import json
+import numpy as np
+import pytest
+import zarr
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from code.api.routes import zarr as zarr_routes
+from code.api.services import zarr_store
+from code.common import hashing, omezarr
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    vol = np.zeros((1, 128, 128), dtype=np.uint8)
+    vol[0, :64, :64] = 9
+    root = zarr.group(store=zarr.DirectoryStore(str(tmp_path / "sub-x" / "img.ome.zarr")))
+    omezarr.write_multiscale(root, vol, axes="zyx", chunks=(1, 64, 64), levels=1, stats=False)
+    sidecar = tmp_path / "sub-x" / "img.ome.zarr.json"
+    sidecar.write_text(json.dumps({hashing.SIDECAR_DIGEST_KEY: "a" * 64}))
+    monkeypatch.setattr(zarr_routes, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(zarr_routes, "chunk_cache", zarr_store.ChunkCache())
+    app = FastAPI()
+    app.include_router(zarr_routes.router)
+    return TestClient(app)
+
+
+def test_chunk_route_caches_and_validates(client, tmp_path):
+    version = zarr_store.url_version(tmp_path / "sub-x" / "img.ome.zarr")
+    url = f"/zarr/{version}/sub-x/img.ome.zarr/0/0.0.0"
+    first = client.get(url)
+    assert first.status_code == 200
+    assert "immutable" in first.headers["cache-control"]
+    etag = first.headers["etag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    head = client.head(url)
+    assert head.status_code == 200 and head.headers["content-length"] == str(len(first.content))
+
+    part = client.get(url, headers={"Range": "bytes=0-3"})
+    assert part.status_code == 206 and part.content == first.content[:4]
+    assert part.headers["content-range"] == f"bytes 0-3/{len(first.content)}"
+    assert client.get(url, headers={"Range": f"bytes={len(first.content)}-"}).status_code == 416
+
+    # Unwritten chunk key is served as the fill chunk; outside the grid or outside a store is 404
+    assert client.get("/zarr/abc/sub-x/img.ome.zarr/0/0.1.1").status_code == 200
+    assert client.get("/zarr/abc/sub-x/img.ome.zarr/0/0.5.5").status_code == 404
+    assert client.get("/zarr/abc/sub-x/other.txt").status_code == 404
+
+    meta = client.get("/zarr/abc/sub-x/img.ome.zarr/.zattrs")
+    assert meta.headers["content-type"] == "application/json"
+
+    stats = client.get("/api/v1/zarr-cache/stats").json()
+    store = stats["stores"]["sub-x/img.ome.zarr"]
+    assert store["misses"] == 4  # 0.0.0, 0.1.1, 0.5.5 and .zattrs
+    assert store["hits"] == 4  # revalidation, HEAD and both range requests
+
+
+def test_chunk_cache_evicts_by_bytes(tmp_path):
+    cache = zarr_store.ChunkCache(max_bytes=10, max_item_bytes=8)
+    store = tmp_path / "a.zarr"
+    cache.put(store, "k1", (b"12345", "e1"))
+    cache.put(store, "k2", (b"12345", "e2"))
+    cache.put(store, "big", (b"123456789", "e3"))  # over max_item_bytes: not cached
+    assert cache.get(store, "k1") is not None
+    cache.put(store, "k3", (b"123", "e4"))  # evicts k2, the least recently used
+    assert cache.get(store, "k2") is None
+    assert cache.stats()["bytes"] == 8
+
+
+def test_consolidated_metadata_served_and_backfilled(client, tmp_path):
+    from code.database.etl import consolidate_zarr
+
+    store = tmp_path / "sub-x" / "img.ome.zarr"
+    written = client.get("/zarr/abc/sub-x/img.ome.zarr/.zmetadata").json()
+    assert set(written["metadata"]) == {".zattrs", ".zgroup", "0/.zarray"}
+
+    # Stores without .zmetadata get the same document built in memory, then the backfill writes it
+    (store / ".zmetadata").unlink()
+    assert zarr_store.consolidated_metadata(store) == written
+    assert consolidate_zarr.find_stores(tmp_path) == [store]
+    assert consolidate_zarr.consolidate_store(store) == "consolidated"
+    assert consolidate_zarr.consolidate_store(store) == "up-to-date"
+    assert zarr.open_consolidated(str(store))["0"].shape == (1, 128, 128)
+
+
+def test_chunk_batch_endpoint(client, tmp_path, monkeypatch):
+    from code.api.services import uploads
+
+    store = tmp_path / "sub-x" / "img.ome.zarr"
+    monkeypatch.setattr(zarr_routes, "get_engine", lambda: None)
+    monkeypatch.setattr(uploads, "get_microscopy_file", lambda engine, fid: {"path": str(store)} if fid == 1 else None)
+
+    resp = client.post("/api/v1/zarr/1/chunks", json={"level": "0", "keys": ["0.0.0", "0.1.1", "0.9.9"]})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == zarr_store.CHUNK_BATCH_MEDIA_TYPE
+    chunks = zarr_store.unpack_chunks(resp.content)
+    assert list(chunks) == ["0.0.0", "0.1.1", "0.9.9"]
+    assert chunks["0.0.0"] == (store / "0" / "0.0.0").read_bytes()
+    assert chunks["0.1.1"] is not None and chunks["0.9.9"] is None
+
+    assert client.post("/api/v1/zarr/1/chunks", json={"level": "7", "keys": ["0.0.0"]}).status_code == 404
+    assert client.post("/api/v1/zarr/1/chunks", json={"keys": ["../x"]}).status_code == 400
+    assert client.post("/api/v1/zarr/2/chunks", json={"keys": ["0.0.0"]}).status_code == 404
+
+
+def test_layout_version_tracks_metadata(client, tmp_path):
+    store = tmp_path / "sub-x" / "img.ome.zarr"
+    assert zarr_store.layout_version(store, None) == zarr_store.UNVERSIONED
+    assert zarr_store.layout_version(tmp_path / "missing.zarr", "abc") == zarr_store.UNVERSIONED
+    first = zarr_store.layout_version(store, "abc")
+    assert first == zarr_store.layout_version(store, "abc") != zarr_store.layout_version(store, "abd")
+
+    # Same pixels re-chunked: .zmetadata changes, so the URL version does too
+    doc = json.loads((store / ".zmetadata").read_text())
+    doc["metadata"]["0/.zarray"]["chunks"] = [1, 128, 128]
+    (store / ".zmetadata").write_text(json.dumps(doc))
+    assert zarr_store.layout_version(store, "abc") != first
+
+    unversioned = client.get("/zarr/_/sub-x/img.ome.zarr/0/0.0.0")
+    assert unversioned.status_code == 200
+    assert "immutable" not in unversioned.headers["cache-control"]
+
+
+def test_chunk_route_only_trusts_the_current_version(client, tmp_path):
+    store = tmp_path / "sub-x" / "img.ome.zarr"
+    current = client.get(f"/zarr/{zarr_store.url_version(store)}/sub-x/img.ome.zarr/0/0.0.0")
+    assert "immutable" in current.headers["cache-control"]
+
+    # Made-up or stale tokens get the current bytes, but only with a short, revalidatable lifetime
+    for version in ("abc", "0" * 16):
+        resp = client.get(f"/zarr/{version}/sub-x/img.ome.zarr/0/0.0.0")
+        assert resp.status_code == 200 and resp.content == current.content
+        assert "immutable" not in resp.headers["cache-control"]
+        assert resp.headers["cache-control"] == f"public, max-age={zarr_routes.ZARR_UNVERSIONED_CACHE_SECONDS}"
+
+    # A store without a sidecar digest has no trustworthy version at all
+    (tmp_path / "sub-x" / "img.ome.zarr.json").unlink()
+    assert zarr_store.url_version(store) == zarr_store.UNVERSIONED
@@ -0,0 +1,40 @@
+import numpy as np
+import zarr
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from code.api.services import zarr_store
+
+
+def make_store(tmp_path):
+    arr = zarr.open(
+        str(tmp_path / "raw_bids" / "img.ome.zarr" / "0"),
+        mode="w",
+        shape=(2, 64, 64),
+        chunks=(1, 32, 32),
+        dtype="u2",
+        fill_value=0,
+        write_empty_chunks=False,
+    )
+    arr[0, :32, :32] = 5
+    return arr
+
+
+def test_missing_chunk_served_as_fill_value(tmp_path):
+    arr = make_store(tmp_path)
+    app = FastAPI()
+    app.mount("/data", zarr_store.ZarrStaticFiles(directory=tmp_path, check_dir=False), name="data")
+    client = TestClient(app)
+
+    written = client.get("/data/raw_bids/img.ome.zarr/0/0.0.0")
+    assert written.status_code == 200
+
+    missing = client.get("/data/raw_bids/img.ome.zarr/0/1.1.1")
+    assert missing.status_code == 200
+    decoded = np.frombuffer(arr.compressor.decode(missing.content), dtype="u2")
+    assert decoded.shape == (32 * 32,) and not decoded.any()
+
+    # Out-of-grid keys and non-chunk paths still 404
+    assert client.get("/data/raw_bids/img.ome.zarr/0/2.0.0").status_code == 404
+    assert client.get("/data/raw_bids/img.ome.zarr/0/notes.txt").status_code == 404
+    assert client.get("/data/raw_bids/other.txt").status_code == 404